@@ -0,0 +1,89 @@
+"""Compact storage: `data` clustered on integer station keys and days
+
+Revision ID: a3e9c7b5d1f8
+Revises: 7c3e1a9b4d52
+Create Date: 2026-10-19 18:22:40.118305
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from utils.compact import (
+    DATA_COMPACT_DDL,
+    DATA_VIEW_DDL,
+    INFO_KEY_DDL,
+    data_compact_table,
+    data_table,
+    from_compact_select,
+    is_compact,
+    to_compact_select,
+)
+from utils.migrations import backfill, copy_rows
+from utils.schema import DATA_DDL, has_table, table_columns
+
+# revision identifiers, used by Alembic.
+revision: str = "a3e9c7b5d1f8"
+down_revision: Union[str, None] = "7c3e1a9b4d52"
+branch_labels: Union[str, Sequence[str], None] = ("compact",)
+depends_on: Union[str, Sequence[str], None] = None
+
+_info = sa.table("info", sa.column("station_int", sa.Integer))
+
+
+def upgrade() -> None:
+    # Every step is skipped or repeated safely when resuming an interrupted upgrade
+    bind = op.get_bind()
+    if "station_int" not in table_columns(bind, "info"):
+        op.add_column("info", sa.Column("station_int", sa.Integer, nullable=True))
+    backfill(
+        _info,
+        {"station_int": sa.literal_column("rowid")},
+        name=f"{revision}.info",
+        where=(_info.c.station_int.is_(None),),
+    )
+    for statement in INFO_KEY_DDL:
+        op.execute(statement)
+    if has_table(bind, "data"):
+        op.execute(DATA_COMPACT_DDL)
+        copy_rows(
+            data_compact_table,
+            to_compact_select(),
+            name=f"{revision}.data",
+            source=data_table,
+        )
+        op.drop_table("data")
+    for statement in DATA_VIEW_DDL:
+        op.execute(statement)
+    # The pages of the old `data` only leave the file when it is rebuilt
+    with op.get_context().autocommit_block():
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if is_compact(bind):
+        # Its triggers are dropped with it
+        op.execute("DROP VIEW data")
+    if has_table(bind, "data_compact"):
+        if not has_table(bind, "data"):
+            op.execute(DATA_DDL)
+        copy_rows(
+            data_table,
+            from_compact_select(),
+            name=f"{revision}.downgrade",
+            source=data_compact_table,
+            key=data_compact_table.c.station_int,
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_data_station_date_wdsp ON data "
+            "(station, date) WHERE wdsp IS NOT NULL"
+        )
+        op.drop_table("data_compact")
+    op.execute("DROP TRIGGER IF EXISTS info_station_int")
+    op.execute("DROP INDEX IF EXISTS ix_info_station_int")
+    if "station_int" in table_columns(bind, "info"):
+        op.drop_column("info", "station_int")
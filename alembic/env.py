@@ -16,7 +16,12 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-config.set_main_option("sqlalchemy.url", CONFIG.db_url)
+x_arguments = context.get_x_argument(as_dictionary=True)
+# `alembic -x db_url=sqlite:///other.db upgrade head` migrates another database
+config.set_main_option("sqlalchemy.url", x_arguments.get("db_url", CONFIG.db_url))
+# `-x chunk_size=N` sets the rows per commit of `utils.migrations.backfill`
+if "chunk_size" in x_arguments:
+    config.attributes["backfill_chunk_size"] = int(x_arguments["chunk_size"])
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -0,0 +1,35 @@
+"""Add partial `(station, date)` index on `Data` with non-null `wdsp`
+
+Revision ID: 2c7e9b40d5a1
+Revises: 8e5d2a7c1f60
+Create Date: 2026-10-18 21:32:08.412577
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2c7e9b40d5a1"
+down_revision: Union[str, None] = "8e5d2a7c1f60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The primary key already serves `--include-null-wdsp`; this one serves the
+    # default nearest-date seeks, which always filter on `wdsp IS NOT NULL`
+    op.create_index(
+        "ix_data_station_date_wdsp",
+        "data",
+        ["station", "date"],
+        sqlite_where=sa.text("wdsp IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_data_station_date_wdsp", "data")
@@ -0,0 +1,63 @@
+"""Add `StationInfo.unit_x/y/z` and latitude/longitude indexes
+
+Revision ID: 4b1f3c9e7a2d
+Revises: d0689ffa3032
+Create Date: 2026-10-18 20:41:12.503118
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy import func as f
+
+from alembic import op
+from utils.migrations import backfill
+from utils.schema import table_columns
+
+# revision identifiers, used by Alembic.
+revision: str = "4b1f3c9e7a2d"
+down_revision: Union[str, None] = "d0689ffa3032"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_info = sa.table(
+    "info",
+    sa.column("latitude", sa.Float),
+    sa.column("longitude", sa.Float),
+    sa.column("unit_x", sa.Float),
+    sa.column("unit_y", sa.Float),
+    sa.column("unit_z", sa.Float),
+)
+
+
+def upgrade() -> None:
+    # Already added when resuming an interrupted backfill
+    if "unit_x" not in table_columns(op.get_bind(), "info"):
+        op.add_column("info", sa.Column("unit_x", sa.Float, nullable=True))
+        op.add_column("info", sa.Column("unit_y", sa.Float, nullable=True))
+        op.add_column("info", sa.Column("unit_z", sa.Float, nullable=True))
+        op.create_index("ix_info_latitude", "info", ["latitude"])
+        op.create_index("ix_info_longitude", "info", ["longitude"])
+
+    lat_rad = f.radians(_info.c.latitude)
+    lon_rad = f.radians(_info.c.longitude)
+    backfill(
+        _info,
+        {
+            "unit_x": f.cos(lat_rad) * f.cos(lon_rad),
+            "unit_y": f.cos(lat_rad) * f.sin(lon_rad),
+            "unit_z": f.sin(lat_rad),
+        },
+        name=f"{revision}.upgrade",
+        where=(_info.c.latitude.is_not(None), _info.c.longitude.is_not(None)),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_info_longitude", "info")
+    op.drop_index("ix_info_latitude", "info")
+    op.drop_column("info", "unit_z")
+    op.drop_column("info", "unit_y")
+    op.drop_column("info", "unit_x")
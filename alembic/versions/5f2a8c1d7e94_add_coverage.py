@@ -0,0 +1,53 @@
+"""Add `coverage`, the first and last dates and row counts of every station
+
+Revision ID: 5f2a8c1d7e94
+Revises: 9d4e6b2f8a13
+Create Date: 2026-10-19 09:12:27.604318
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5f2a8c1d7e94"
+down_revision: Union[str, None] = "9d4e6b2f8a13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Lets the engines skip stations without usable rows before ranking them; the
+    # `wdsp_` columns only count rows with a `wdsp`
+    op.create_table(
+        "coverage",
+        sa.Column(
+            "station",
+            sa.String(12),
+            sa.ForeignKey("info.station_id"),
+            nullable=False,
+            primary_key=True,
+        ),
+        sa.Column("first_date", sa.Date, nullable=False),
+        sa.Column("last_date", sa.Date, nullable=False),
+        sa.Column("data_rows", sa.Integer, nullable=False),
+        sa.Column("wdsp_first_date", sa.Date, nullable=True),
+        sa.Column("wdsp_last_date", sa.Date, nullable=True),
+        sa.Column("wdsp_rows", sa.Integer, nullable=False),
+        sqlite_with_rowid=False,
+    )
+    op.execute(
+        "INSERT INTO coverage "
+        "SELECT station, MIN(date), MAX(date), COUNT(*), "
+        "MIN(CASE WHEN wdsp IS NOT NULL THEN date END), "
+        "MAX(CASE WHEN wdsp IS NOT NULL THEN date END), "
+        "COUNT(wdsp) FROM data GROUP BY station"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("coverage")
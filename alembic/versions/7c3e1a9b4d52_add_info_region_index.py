@@ -0,0 +1,39 @@
+"""Add partial `(country, province)` index on `StationInfo` with coordinates
+
+Revision ID: 7c3e1a9b4d52
+Revises: 5f2a8c1d7e94
+Create Date: 2026-10-19 14:06:51.238904
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3e1a9b4d52"
+down_revision: Union[str, None] = "5f2a8c1d7e94"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Serves the region filters, a country or a country and provinces, and only
+    # holds the stations the engines can rank at all
+    op.create_index(
+        "ix_info_region",
+        "info",
+        ["country", "province"],
+        sqlite_where=sa.text("latitude IS NOT NULL AND longitude IS NOT NULL"),
+    )
+    # Without statistics the planner prefers this equality over the latitude and
+    # longitude ranges of the bounding box searches, even for a region holding most
+    # stations
+    op.execute("ANALYZE info")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_info_region", "info")
@@ -0,0 +1,58 @@
+"""Add spatial index on `StationInfo.geom`
+
+Revision ID: 8e5d2a7c1f60
+Revises: 4b1f3c9e7a2d
+Create Date: 2026-10-18 21:05:37.184920
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.sql import functions
+
+from alembic import op
+from utils.migrations import backfill
+from utils.models_gis import StationInfoGis
+
+# revision identifiers, used by Alembic.
+revision: str = "8e5d2a7c1f60"
+down_revision: Union[str, None] = "4b1f3c9e7a2d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_info = StationInfoGis.__table__
+
+
+def _is_spatial_index_enabled() -> bool:
+    bind = op.get_bind()
+    enabled = bind.scalar(
+        sa.text(
+            "SELECT spatial_index_enabled FROM geometry_columns "
+            "WHERE f_table_name = 'info' AND f_geometry_column = 'geom'"
+        )
+    )
+    return bool(enabled)
+
+
+def upgrade() -> None:
+    # Databases migrated before `d0689ffa3032` populated anything still lack `geom`
+    backfill(
+        _info,
+        {"geom": functions.func.MakePoint(_info.c.longitude, _info.c.latitude, 4326)},
+        name=f"{revision}.upgrade",
+        where=(
+            _info.c.latitude.is_not(None),
+            _info.c.longitude.is_not(None),
+            _info.c.geom.is_(None),
+        ),
+    )
+    if not _is_spatial_index_enabled():
+        op.execute(sa.select(functions.func.CreateSpatialIndex("info", "geom")))
+
+
+def downgrade() -> None:
+    if _is_spatial_index_enabled():
+        op.execute(sa.select(functions.func.DisableSpatialIndex("info", "geom")))
+        op.execute("DROP TABLE IF EXISTS idx_info_geom")
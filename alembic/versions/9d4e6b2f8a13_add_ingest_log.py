@@ -0,0 +1,38 @@
+"""Add `ingest_log` of the GSOD station-years loaded by `noaa_ingest.py`
+
+Revision ID: 9d4e6b2f8a13
+Revises: 2c7e9b40d5a1
+Create Date: 2026-10-18 22:05:41.237914
+
+"""
+# pyright: reportMissingTypeStubs=false
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4e6b2f8a13"
+down_revision: Union[str, None] = "2c7e9b40d5a1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Size and modification time of the source CSV, so that a re-run only reloads
+    # the station-years NOAA has updated since
+    op.create_table(
+        "ingest_log",
+        sa.Column("station", sa.String(12), nullable=False, primary_key=True),
+        sa.Column("year", sa.Integer, nullable=False, primary_key=True),
+        sa.Column("size", sa.Integer, nullable=False),
+        sa.Column("mtime", sa.Integer, nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+        sa.Column("loaded_at", sa.DateTime, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ingest_log")
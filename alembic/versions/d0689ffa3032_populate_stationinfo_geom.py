@@ -9,11 +9,9 @@ Create Date: 2023-09-10 14:44:00.231247
 
 from typing import Sequence, Union
 
-import geoalchemy2 as ga
-from sqlalchemy.orm import Session
 from sqlalchemy.sql import functions
 
-from alembic import op
+from utils.migrations import backfill
 from utils.models_gis import StationInfoGis
 
 # revision identifiers, used by Alembic.
@@ -22,23 +20,18 @@ down_revision: Union[str, None] = "06689123a38f"
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+_info = StationInfoGis.__table__
+_located = (_info.c.latitude.is_not(None), _info.c.longitude.is_not(None))
+
 
 def upgrade() -> None:
-    bind = op.get_bind()
-    with Session(bind=bind) as session:
-        stations = session.query(StationInfoGis).filter(
-            StationInfoGis.latitude.is_not(None), StationInfoGis.longitude.is_not(None)
-        )
+    backfill(
+        _info,
+        {"geom": functions.func.MakePoint(_info.c.longitude, _info.c.latitude, 4326)},
+        name=f"{revision}.upgrade",
+        where=_located,
+    )
 
 
 def downgrade() -> None:
-    bind = op.get_bind()
-    with Session(bind=bind) as session:
-        (
-            session.query(StationInfoGis)
-            .filter(
-                StationInfoGis.latitude.is_not(None),
-                StationInfoGis.longitude.is_not(None),
-            )
-            .update({"geom": None})
-        )
+    backfill(_info, {"geom": None}, name=f"{revision}.downgrade", where=_located)
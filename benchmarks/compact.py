@@ -0,0 +1,121 @@
+"""
+Generate a synthetic database, convert a copy to the compact schema of
+`alembic -n compact upgrade head`, and compare file and B-tree sizes, pages read per
+`(station, date)` seek and the latency of the trig engine on each.
+
+    python -m benchmarks.compact bench/compact --stations 2000 --years 5 \\
+        -o bench/compact.json
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import shutil
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine
+
+from benchmarks.suite import _bench_engine
+from benchmarks.synthetic import generate_database
+from utils.compact import convert_to_compact
+
+if TYPE_CHECKING:
+    from typing import Any
+
+# B-trees read by a seek on the primary key of `data`: the standard table looks up
+# the rowid in its key index, then the row in the table itself
+_SEEK_TREES = {
+    "standard": ("sqlite_autoindex_data_1", "data"),
+    "compact": ("data_compact",),
+}
+
+
+def _describe_file(path: Path) -> dict[str, Any]:
+    """
+    Size of the file and pages and depth of every table and index, from `dbstat`
+    """
+    engine = create_engine(f"sqlite:///{path.resolve()}")
+    with engine.connect() as connection:
+        (page_size,) = connection.exec_driver_sql("PRAGMA page_size").one()
+        trees = {
+            name: {"pages": pages, "depth": depth}
+            for name, pages, depth in connection.exec_driver_sql(
+                "SELECT name, COUNT(*), "
+                "MAX(LENGTH(path) - LENGTH(REPLACE(path, '/', ''))) "
+                "FROM dbstat GROUP BY name ORDER BY COUNT(*) DESC"
+            )
+        }
+    engine.dispose()
+    return {"bytes": path.stat().st_size, "page_size": page_size, "trees": trees}
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("directory", type=Path, help="New folder for both databases")
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=Path, help="JSON file, default stdout")
+    args = parser.parse_args()
+
+    paths = {
+        "standard": args.directory / "standard.db",
+        "compact": args.directory / "compact.db",
+    }
+    print("Generating the database", file=sys.stderr)
+    generated = generate_database(
+        paths["standard"],
+        stations=args.stations,
+        years=args.years,
+        end=datetime.date(2023, 12, 31),
+        seed=args.seed,
+    )
+    shutil.copyfile(paths["standard"], paths["compact"])
+    print("Converting to the compact schema", file=sys.stderr)
+    for name, path in paths.items():
+        engine = create_engine(f"sqlite:///{path.resolve()}")
+        with engine.connect() as connection:
+            if name == "compact":
+                convert_to_compact(connection)
+                connection.commit()
+            connection.exec_driver_sql("VACUUM")
+        engine.dispose()
+
+    results: dict[str, Any] = {
+        "stations": generated["stations"],
+        "rows": generated["rows"],
+        "lookups": args.lookups,
+        "seed": args.seed,
+    }
+    for name, path in paths.items():
+        print(f"Benchmarking the {name} schema", file=sys.stderr)
+        described = _describe_file(path)
+        described["pages_per_seek"] = sum(
+            described["trees"][tree]["depth"] for tree in _SEEK_TREES[name]
+        )
+        engine_name = "compact" if name == "compact" else "trig"
+        described["engine"] = engine_name
+        described["latency"] = _bench_engine(
+            engine_name, f"sqlite:///{path.resolve()}", args.lookups, args.seed
+        )
+        results[name] = described
+    results["size_ratio"] = round(
+        results["compact"]["bytes"] / results["standard"]["bytes"], 3
+    )
+
+    content = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output is None:
+        print(content)
+    else:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(content + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
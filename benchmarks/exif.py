@@ -0,0 +1,64 @@
+"""
+Compare the fast GPS/datetime-only Exif reader with full `exifread.process_file`
+parsing on sample pictures, and check that both read the same position and time.
+
+    python -m benchmarks.exif ./photos
+"""
+
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+from typing import TYPE_CHECKING
+
+from utils.batch import iter_photo_paths
+from utils.exif import Exif
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Any
+
+
+def _read(path: Path, *, fast: bool) -> tuple[Any, ...]:
+    """"""
+    exif = Exif(path, fast=fast)
+    try:
+        return exif.lat, exif.lon, exif.datetime
+    except ValueError as err:
+        return (str(err),)
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="Picture paths, directories or globs")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = list(iter_photo_paths(args.paths))
+    if not paths:
+        raise SystemExit("No picture found")
+    results: dict[bool, list[tuple[Any, ...]]] = {}
+    for fast in (False, True):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[fast] = [_read(path, fast=fast) for path in paths]
+            best = min(best, time.perf_counter() - start)
+        mode = "fast" if fast else "full"
+        print(f"{mode}: {best / len(paths) * 1e6:,.1f} µs per picture")
+
+    mismatches = [
+        path
+        for path, full, fast in zip(paths, results[False], results[True])
+        if full != fast
+    ]
+    for path in mismatches:
+        print(f"Mismatch: {path}")
+    print(f"{len(mismatches)} of {len(paths)} pictures differ")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the import time of the entry points with `python -X importtime`, and fail
+when one exceeds its budget or loads a module that only other code paths need.
+
+    python -m benchmarks.importtime --runs 5 --scale 1.5
+"""
+
+from __future__ import annotations
+
+import statistics
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+from utils.config import BASE_DIR
+
+# Cumulative import time budget in milliseconds, and modules that must stay unloaded
+_TARGETS: dict[str, tuple[float, tuple[str, ...]]] = {
+    "noaa_client": (100, ("sqlalchemy", "yaml", "exifread", "utils")),
+    "utils.config": (80, ("yaml",)),
+    "utils.exif": (80, ("exifread", "yaml")),
+    "utils.base": (
+        120,
+        (
+            "sqlalchemy",
+            "exifread",
+            "yaml",
+            "numpy",
+            "utils.batch",
+            "utils.pipeline",
+            "utils.coverage",
+            "utils.engine",
+        ),
+    ),
+    "noaa_trig": (600, ("exifread", "yaml", "numpy", "utils.pipeline", "geoalchemy2")),
+    "noaa_index": (600, ("exifread", "yaml", "numpy", "utils.pipeline", "geoalchemy2")),
+}
+
+
+def _measure(module: str) -> tuple[float, set[str]]:
+    """
+    Cumulative import time of `module` in milliseconds, and every module it loaded
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us = 0
+    loaded: set[str] = set()
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        loaded.add(name)
+        if name == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000, loaded
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply every budget, for slow hosts"
+    )
+    args = parser.parse_args()
+
+    failures: list[str] = []
+    for module, (budget_ms, forbidden) in _TARGETS.items():
+        timings: list[float] = []
+        loaded: set[str] = set()
+        for _ in range(args.runs):
+            elapsed_ms, loaded = _measure(module)
+            timings.append(elapsed_ms)
+        median_ms = statistics.median(timings)
+        limit_ms = budget_ms * args.scale
+        print(f"{module}: {median_ms:,.1f} ms (budget {limit_ms:,.0f} ms)")
+        if median_ms > limit_ms:
+            failures.append(f"{module} takes {median_ms:,.1f} ms")
+        for name in forbidden:
+            if name in loaded:
+                failures.append(f"{module} imports {name}")
+    for failure in failures:
+        print(f"Over budget: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare nearest-station lookups of the SQL trig engine, the in-memory index engine and
+the raster engine against the configured database, and check that all pick the same
+station.
+
+    python -m benchmarks.search --lookups 200
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from argparse import ArgumentParser
+
+from noaa_index import _IndexSearchEngine
+from noaa_raster import _RasterSearchEngine
+from noaa_trig import _TrigSearchEngine
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    points = [
+        (rng.uniform(18.0, 54.0), rng.uniform(73.0, 135.0)) for _ in range(args.lookups)
+    ]
+    results: dict[str, list[str]] = {}
+    for SearchEngineClass in (
+        _TrigSearchEngine,
+        _IndexSearchEngine,
+        _RasterSearchEngine,
+    ):
+        name = SearchEngineClass.__name__
+        engine = SearchEngineClass(lat=0, lon=0)
+        with engine.get_session() as session:
+            start = time.perf_counter()
+            engine.search_station(session)
+            print(f"{name}: first lookup {(time.perf_counter() - start) * 1e3:.3f} ms")
+            start = time.perf_counter()
+            found: list[str] = []
+            for lat, lon in points:
+                engine.lat, engine.lon = lat, lon
+                found.append(engine.search_station(session))
+            elapsed = time.perf_counter() - start
+        results[name] = found
+        print(f"{name}: {elapsed / len(points) * 1e6:,.1f} µs per lookup")
+
+    trig, *others = results.values()
+    mismatches = sum(
+        any(found[i] != station for found in others) for i, station in enumerate(trig)
+    )
+    print(f"{mismatches} of {len(points)} lookups differ")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
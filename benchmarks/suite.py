@@ -0,0 +1,304 @@
+"""
+Benchmark station search and data search of every engine, Exif parsing and the
+command line end to end against one database, typically made by
+`benchmarks.synthetic`, and write the results as JSON to track regressions.
+
+    python -m benchmarks.suite bench/noaa.db --photos bench/photos -o bench/result.json
+
+Each engine runs in its own process, since the trig and GIS models cannot be loaded
+together; engines that cannot run here, such as GIS without SpatiaLite, are reported
+with their error instead.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine, func, select
+
+from utils.config import BASE_DIR, DB_URL_ENV
+
+if TYPE_CHECKING:
+    from typing import Any
+
+RESULT_VERSION = 1
+_ENGINES = {
+    "trig": ("noaa_trig", "_TrigSearchEngine"),
+    "index": ("noaa_index", "_IndexSearchEngine"),
+    "gis": ("noaa_gis", "_GisSearchEngine"),
+    "snapshot": ("noaa_snapshot", "_SnapshotSearchEngine"),
+    "raster": ("noaa_raster", "_RasterSearchEngine"),
+    "compact": ("noaa_compact", "_CompactSearchEngine"),
+}
+# Lookups are drawn over the area the engines search
+_SOUTH, _NORTH, _WEST, _EAST = 18.0, 53.5, 73.5, 134.8
+
+
+def _summarize(timings: list[float]) -> dict[str, Any]:
+    """
+    Latency summary in microseconds
+    """
+    if not timings:
+        return {"count": 0}
+    timings_us = sorted(t * 1e6 for t in timings)
+    return {
+        "count": len(timings_us),
+        "mean_us": round(statistics.fmean(timings_us), 1),
+        "p50_us": round(timings_us[len(timings_us) // 2], 1),
+        "p95_us": round(
+            timings_us[min(int(len(timings_us) * 0.95), len(timings_us) - 1)], 1
+        ),
+        "max_us": round(timings_us[-1], 1),
+    }
+
+
+def _run_engine(name: str, lookups: int, seed: int) -> dict[str, Any]:
+    """
+    Run in a worker process whose `CONFIG.db_url` is the benchmarked database
+    """
+    import importlib
+
+    module_name, class_name = _ENGINES[name]
+    SearchEngineClass = getattr(importlib.import_module(module_name), class_name)
+    search_engine = SearchEngineClass(lat=0, lon=0)
+    with search_engine.get_session() as session:
+        first, last = session.execute(
+            select(
+                func.min(SearchEngineClass.DataModel.date),
+                func.max(SearchEngineClass.DataModel.date),
+            )
+        ).one()
+    rng = random.Random(seed)
+    span = (last - first).days
+    points = [
+        (
+            rng.uniform(_SOUTH, _NORTH),
+            rng.uniform(_WEST, _EAST),
+            first + datetime.timedelta(days=rng.randint(0, span)),
+        )
+        for _ in range(lookups)
+    ]
+
+    station_timings: list[float] = []
+    data_timings: list[float] = []
+    lookup_timings: list[float] = []
+    stations: list[str] = []
+    with search_engine.get_session() as session:
+        # Connections, statements and in-memory indexes are built on first use
+        start = time.perf_counter()
+        search_engine.search_station(session)
+        cold = time.perf_counter() - start
+        for lat, lon, _ in points:
+            search_engine.lat, search_engine.lon = lat, lon
+            start = time.perf_counter()
+            stations.append(search_engine.search_station(session))
+            station_timings.append(time.perf_counter() - start)
+        for station_id, (_, _, date) in zip(stations, points):
+            search_engine.date = date
+            start = time.perf_counter()
+            try:
+                search_engine.search_data(session, station_id)
+            except ValueError:
+                pass
+            data_timings.append(time.perf_counter() - start)
+    with search_engine.get_connection() as connection:
+        for lat, lon, date in points:
+            search_engine.lat, search_engine.lon = lat, lon
+            search_engine.date = date
+            start = time.perf_counter()
+            try:
+                search_engine.lookup(connection)
+            except ValueError:
+                pass
+            lookup_timings.append(time.perf_counter() - start)
+    return {
+        "first_station_search_ms": round(cold * 1e3, 3),
+        "station_search": _summarize(station_timings),
+        "data_search": _summarize(data_timings),
+        "lookup": _summarize(lookup_timings),
+    }
+
+
+def _bench_engine(name: str, db_url: str, lookups: int, seed: int) -> dict[str, Any]:
+    """"""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.suite",
+            "--worker",
+            name,
+            "--lookups",
+            str(lookups),
+            "--seed",
+            str(seed),
+        ],
+        cwd=BASE_DIR,
+        env={**os.environ, DB_URL_ENV: db_url},
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit {completed.returncode}"}
+    return json.loads(completed.stdout)
+
+
+def _bench_exif(photos: list[Path]) -> dict[str, Any]:
+    """
+    Pictures parsed per second by the fast reader and by full `exifread` parsing
+    """
+    from utils.exif import Exif
+
+    results: dict[str, Any] = {"photos": len(photos)}
+    for name, fast in (("fast", True), ("full", False)):
+        start = time.perf_counter()
+        for path in photos:
+            try:
+                Exif(path, fast=fast).record
+            except Exception:
+                pass
+        elapsed = time.perf_counter() - start
+        results[f"{name}_photos_per_s"] = round(len(photos) / elapsed, 1)
+    return results
+
+
+def _bench_cli(
+    engines: list[str], db_url: str, photos: list[Path], runs: int
+) -> dict[str, Any]:
+    """
+    Median wall time of one-picture and whole-folder runs, caches disabled
+    """
+    env = {**os.environ, DB_URL_ENV: db_url}
+    flags = ["--no-exif-cache", "--no-lookup-cache"]
+    results: dict[str, Any] = {}
+    for name in engines:
+        script = f"{_ENGINES[name][0]}.py"
+        commands = {
+            "single_s": [sys.executable, script, str(photos[0]), *flags],
+            "batch_s": [
+                sys.executable,
+                script,
+                str(photos[0].parent),
+                *flags,
+                "-o",
+                os.devnull,
+            ],
+        }
+        engine_results: dict[str, Any] = {}
+        for key, command in commands.items():
+            timings: list[float] = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                completed = subprocess.run(
+                    command, cwd=BASE_DIR, env=env, capture_output=True, text=True
+                )
+                timings.append(time.perf_counter() - start)
+                if completed.returncode != 0:
+                    lines = completed.stderr.strip().splitlines()
+                    engine_results["error"] = lines[-1] if lines else "failed"
+                    break
+            engine_results[key] = round(statistics.median(timings), 3)
+        results[name] = engine_results
+    return results
+
+
+def _describe_database(db_url: str) -> dict[str, Any]:
+    """"""
+    engine = create_engine(db_url)
+    with engine.connect() as connection:
+        (stations,) = connection.exec_driver_sql("SELECT COUNT(*) FROM info").one()
+        (rows,) = connection.exec_driver_sql("SELECT COUNT(*) FROM data").one()
+    engine.dispose()
+    return {"db_url": db_url, "stations": stations, "rows": rows}
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("database", nargs="?", type=Path, help="SQLite file")
+    parser.add_argument("--photos", type=Path, help="Folder of pictures")
+    parser.add_argument(
+        "--photo-count",
+        type=int,
+        default=200,
+        help="Pictures generated when --photos is not given",
+    )
+    parser.add_argument(
+        "--engines",
+        default="trig,index,gis,raster",
+        help="Comma-separated; snapshot needs an export of the same database",
+    )
+    parser.add_argument(
+        "--cli-engines", default="index", help="Engines timed from the command line"
+    )
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--cli-runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=Path, help="JSON file, default stdout")
+    parser.add_argument("--worker", choices=tuple(_ENGINES), help="Internal")
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(_run_engine(args.worker, args.lookups, args.seed)))
+        return
+    if args.database is None:
+        parser.error("the database is required")
+
+    db_url = f"sqlite:///{args.database.resolve()}"
+    results: dict[str, Any] = {
+        "version": RESULT_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": _describe_database(db_url),
+        "lookups": args.lookups,
+        "seed": args.seed,
+        "engines": {},
+    }
+    for name in args.engines.split(","):
+        print(f"Benchmarking the {name} engine", file=sys.stderr)
+        results["engines"][name] = _bench_engine(name, db_url, args.lookups, args.seed)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.photos is None:
+            from benchmarks.synthetic import generate_photos
+
+            photos = generate_photos(
+                Path(temp_dir),
+                count=args.photo_count,
+                start=datetime.date(2015, 1, 1),
+                end=datetime.date(2023, 12, 31),
+                seed=args.seed,
+            )
+        else:
+            photos = sorted(p for p in args.photos.iterdir() if p.is_file())
+        print("Benchmarking Exif parsing", file=sys.stderr)
+        results["exif"] = _bench_exif(photos)
+        print("Benchmarking the command line", file=sys.stderr)
+        results["cli"] = _bench_cli(
+            args.cli_engines.split(","), db_url, photos, args.cli_runs
+        )
+
+    content = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output is None:
+        print(content)
+    else:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(content + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Generate a database with the `info` and `data` tables of `noaa.db`, filled with
+synthetic stations and daily rows, and optionally pictures with matching Exif.
+
+    python -m benchmarks.synthetic bench/noaa.db --stations 2000 --years 5 \\
+        --photos bench/photos --photo-count 500
+
+Without `--migrate`, the columns and indexes of the non-spatial migrations are added
+directly, which is enough for the trig, index and snapshot engines. `--migrate` runs
+`alembic upgrade head` instead, which needs SpatiaLite.
+"""
+
+from __future__ import annotations
+
+import datetime
+import math as m
+import struct
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from utils.config import DB_URL_ENV
+from utils.schema import (
+    FLOAT_COLUMNS,
+    apply_non_spatial_migrations,
+    create_tables,
+    upgrade_database,
+)
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from numpy.typing import NDArray
+
+# Country, weight, (south, north, west, east)
+_COUNTRIES = (
+    ("中国", 0.6, (18.0, 53.5, 73.5, 134.8)),
+    ("蒙古", 0.08, (41.6, 52.1, 87.8, 119.9)),
+    ("俄罗斯", 0.12, (42.5, 60.0, 120.0, 150.0)),
+    ("日本", 0.1, (30.0, 45.5, 129.5, 145.8)),
+    ("韩国", 0.04, (33.1, 38.6, 125.0, 129.6)),
+    ("越南", 0.06, (8.6, 23.4, 102.1, 109.5)),
+)
+# Share of NULL per `data` column, roughly those of the GSOD daily summaries
+_NULL_RATES = {
+    "temp": 0.0,
+    "dewp": 0.02,
+    "slp": 0.25,
+    "stp": 0.35,
+    "visib": 0.1,
+    "wdsp": 0.05,
+    "mxspd": 0.06,
+    "gust": 0.7,
+    "max": 0.01,
+    "min": 0.01,
+    "prcp": 0.12,
+    "sndp": 0.95,
+}
+_NULL_COORDINATES_RATE = 0.005
+
+
+class _Station(NamedTuple):
+    """"""
+
+    station_id: str
+    name: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    country: str
+
+
+def generate_stations(rng: np.random.Generator, count: int) -> list[_Station]:
+    """
+    Stations spread uniformly over the bounding box of a country picked by weight,
+    with GSOD-like USAF+WBAN ids
+    """
+    weights = np.array([weight for _, weight, _ in _COUNTRIES])
+    countries = rng.choice(len(_COUNTRIES), size=count, p=weights / weights.sum())
+    usaf = rng.choice(900_000, size=count, replace=False) + 100_000
+    stations: list[_Station] = []
+    for i, (country_index, usaf_id) in enumerate(zip(countries, usaf)):
+        country, _, (south, north, west, east) = _COUNTRIES[country_index]
+        latitude: Optional[float] = round(float(rng.uniform(south, north)), 3)
+        longitude: Optional[float] = round(float(rng.uniform(west, east)), 3)
+        if rng.random() < _NULL_COORDINATES_RATE:
+            latitude = longitude = None
+        stations.append(
+            _Station(
+                f"{usaf_id:06d}99999", f"STATION {i:05d}", latitude, longitude, country
+            )
+        )
+    return stations
+
+
+def _with_nulls(
+    rng: np.random.Generator, values: NDArray[np.float64], rate: float
+) -> list[Optional[float]]:
+    """"""
+    rounded = np.round(values, 1).astype(object)
+    rounded[rng.random(len(values)) < rate] = None
+    return rounded.tolist()
+
+
+def generate_rows(
+    rng: np.random.Generator, station: _Station, start: datetime.date, days: int
+) -> list[tuple[Any, ...]]:
+    """
+    Daily rows of one station over part of the period, with missing days, seasonal
+    values depending on the latitude and per-column NULL rates
+    """
+    # Stations open and close at different times and miss some days
+    first = int(rng.integers(0, max(days // 4, 1)))
+    last = days - int(rng.integers(0, max(days // 8, 1)))
+    day_numbers = np.arange(first, last)
+    day_numbers = day_numbers[rng.random(len(day_numbers)) < rng.uniform(0.7, 1.0)]
+    count = len(day_numbers)
+    if count == 0:
+        return []
+    latitude = 35.0 if station.latitude is None else station.latitude
+    season = np.cos(2 * m.pi * (day_numbers - 15) / 365.25)
+    temp = 75 - 0.9 * latitude - 20 * season + rng.normal(0, 6, count)
+    dewp = temp - rng.gamma(2.0, 5.0, count)
+    slp = rng.normal(1013, 8, count)
+    wdsp = rng.gamma(2.0, 2.5, count)
+    mxspd = wdsp + rng.gamma(2.0, 2.0, count)
+    columns: dict[str, NDArray[np.float64]] = {
+        "temp": temp,
+        "dewp": dewp,
+        "slp": slp,
+        "stp": slp - rng.uniform(0, 100, count),
+        "visib": np.minimum(rng.gamma(6.0, 2.0, count), 999.9),
+        "wdsp": wdsp,
+        "mxspd": mxspd,
+        "gust": mxspd + rng.gamma(2.0, 3.0, count),
+        "max": temp + rng.uniform(3, 15, count),
+        "min": temp - rng.uniform(3, 15, count),
+        "prcp": rng.exponential(0.1, count) * (rng.random(count) < 0.3),
+        "sndp": rng.exponential(2.0, count),
+    }
+    dates = [
+        (start + datetime.timedelta(days=int(day))).isoformat() for day in day_numbers
+    ]
+    values = [
+        _with_nulls(rng, columns[column], _NULL_RATES[column])
+        for column in FLOAT_COLUMNS
+    ]
+    rain = rng.random(count) < 0.25
+    frshtt = np.where(rain, 10000, 0).tolist()
+    return list(zip([station.station_id] * count, dates, *values, frshtt))
+
+
+def generate_database(
+    path: Path,
+    *,
+    stations: int,
+    years: int,
+    end: datetime.date,
+    seed: int,
+    migrate: bool = False,
+) -> dict[str, Any]:
+    """
+    Write a new database at `path` and return what was generated
+    """
+    if path.exists():
+        raise FileExistsError(f"{path} already exists")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    start = end - datetime.timedelta(days=round(years * 365.25))
+    days = (end - start).days + 1
+    url = f"sqlite:///{path.resolve()}"
+    engine = create_engine(url)
+    generated = generate_stations(rng, stations)
+    row_count = 0
+    with engine.connect() as connection:
+        # Nothing to protect while the file is being created
+        connection.exec_driver_sql("PRAGMA journal_mode = OFF")
+        connection.exec_driver_sql("PRAGMA synchronous = OFF")
+        create_tables(connection)
+        connection.exec_driver_sql(
+            "INSERT INTO info (station_id, name, latitude, longitude, country) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (s.station_id, s.name, s.latitude, s.longitude, s.country)
+                for s in generated
+            ],
+        )
+        insert_data = (
+            f"INSERT INTO data (station, date, {', '.join(FLOAT_COLUMNS)}, frshtt) "
+            f"VALUES ({', '.join('?' * (len(FLOAT_COLUMNS) + 3))})"
+        )
+        # Primary key order, so every insert appends to the B-tree
+        for station in sorted(generated, key=lambda s: s.station_id):
+            rows = generate_rows(rng, station, start, days)
+            if rows:
+                connection.exec_driver_sql(insert_data, rows)
+            row_count += len(rows)
+        if not migrate:
+            apply_non_spatial_migrations(connection)
+        connection.commit()
+    engine.dispose()
+    if migrate:
+        upgrade_database(url)
+    return {
+        "path": str(path),
+        "db_url": url,
+        "stations": stations,
+        "rows": row_count,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "seed": seed,
+        "migrated": migrate,
+    }
+
+
+def _ifd(entries: list[tuple[int, int, int, bytes]], offset: int) -> bytes:
+    """
+    Big-endian TIFF IFD at `offset`, values longer than 4 bytes stored right after it
+    """
+    head = struct.pack(">H", len(entries))
+    body = b""
+    data = b""
+    data_offset = offset + 2 + 12 * len(entries) + 4
+    for tag, type_, count, value in entries:
+        if len(value) <= 4:
+            body += struct.pack(">HHI", tag, type_, count) + value.ljust(4, b"\0")
+        else:
+            body += struct.pack(">HHII", tag, type_, count, data_offset + len(data))
+            data += value + b"\0" * (len(value) % 2)
+    return head + body + struct.pack(">I", 0) + data
+
+
+def _ascii(value: str) -> tuple[int, int, bytes]:
+    """"""
+    encoded = value.encode("ascii") + b"\0"
+    return 2, len(encoded), encoded
+
+
+def _dms(value: float) -> tuple[int, int, bytes]:
+    """"""
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    milliseconds = round(((value - degrees) * 60 - minutes) * 60 * 1000)
+    rationals = ((degrees, 1), (minutes, 1), (milliseconds, 1000))
+    return 5, 3, b"".join(struct.pack(">II", n, d) for n, d in rationals)
+
+
+def make_photo(lat: float, lon: float, taken_at: datetime.datetime) -> bytes:
+    """
+    Smallest JPEG carrying the Exif read by `utils.exif`: GPS position, original
+    datetime and its UTC offset. There is no image data
+    """
+    ifd0_offset = 8
+    exif_offset = ifd0_offset + 2 + 12 * 2 + 4
+    offset = taken_at.strftime("%z")
+    exif = _ifd(
+        [
+            (0x9003, *_ascii(f"{taken_at:%Y:%m:%d %H:%M:%S}")),
+            (0x9011, *_ascii(f"{offset[:3]}:{offset[3:]}" if offset else "+00:00")),
+        ],
+        exif_offset,
+    )
+    gps_offset = exif_offset + len(exif)
+    gps = _ifd(
+        [
+            (1, *_ascii("N" if lat >= 0 else "S")),
+            (2, *_dms(lat)),
+            (3, *_ascii("E" if lon >= 0 else "W")),
+            (4, *_dms(lon)),
+        ],
+        gps_offset,
+    )
+    ifd0 = _ifd(
+        [
+            (0x8769, 4, 1, struct.pack(">I", exif_offset)),
+            (0x8825, 4, 1, struct.pack(">I", gps_offset)),
+        ],
+        ifd0_offset,
+    )
+    app1 = b"Exif\0\0" + b"MM\0*" + struct.pack(">I", ifd0_offset) + ifd0 + exif + gps
+    return b"\xff\xd8\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + b"\xff\xd9"
+
+
+def generate_photos(
+    directory: Path,
+    *,
+    count: int,
+    start: datetime.date,
+    end: datetime.date,
+    seed: int,
+) -> list[Path]:
+    """
+    `count` pictures taken at noon China time somewhere in China between `start`
+    and `end`
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    _, _, (south, north, west, east) = _COUNTRIES[0]
+    tz = datetime.timezone(datetime.timedelta(hours=8))
+    days = (end - start).days
+    paths: list[Path] = []
+    for i in range(count):
+        taken_at = datetime.datetime.combine(
+            start + datetime.timedelta(days=int(rng.integers(0, days + 1))),
+            datetime.time(12, tzinfo=tz),
+        )
+        path = directory / f"synthetic_{i:05d}.jpg"
+        path.write_bytes(
+            make_photo(
+                float(rng.uniform(south, north)),
+                float(rng.uniform(west, east)),
+                taken_at,
+            )
+        )
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("path", type=Path, help="Database file to create")
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument(
+        "--end",
+        type=datetime.date.fromisoformat,
+        default=datetime.date(2023, 12, 31),
+        help="Last day of data",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="Run `alembic upgrade head` on the new database (needs SpatiaLite)",
+    )
+    parser.add_argument("--photos", type=Path, help="Also write pictures here")
+    parser.add_argument("--photo-count", type=int, default=200)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    generated = generate_database(
+        args.path,
+        stations=args.stations,
+        years=args.years,
+        end=args.end,
+        seed=args.seed,
+        migrate=args.migrate,
+    )
+    print(
+        f"{generated['stations']:,} stations and {generated['rows']:,} rows written "
+        f"to {args.path} in {time.perf_counter() - start_time:,.1f} s"
+    )
+    if args.photos is not None:
+        generate_photos(
+            args.photos,
+            count=args.photo_count,
+            start=datetime.date.fromisoformat(generated["start"]),
+            end=args.end,
+            seed=args.seed,
+        )
+        print(f"{args.photo_count:,} pictures written to {args.photos}")
+    print(f"Use it with {DB_URL_ENV}={generated['db_url']}")
+
+
+if __name__ == "__main__":
+    main()
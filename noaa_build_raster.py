@@ -0,0 +1,57 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import shutil
+import time
+from argparse import ArgumentParser
+from typing import TYPE_CHECKING
+
+from noaa_raster import _RasterSearchEngine
+from utils.config import BASE_DIR, CONFIG
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser(
+        description="Build the nearest-station rasters read by `noaa_raster.py` for "
+        "the region of `config.yml`, if its stations changed since the last build"
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Then delete every other raster, such as those of older station lists",
+    )
+    args = parser.parse_args()
+
+    search_engine = _RasterSearchEngine(lat=0, lon=0)
+    kept: set[Path] = set()
+    with search_engine.get_connection() as connection:
+        # Stations without `wdsp` only drop out of the default one with `coverage`
+        for include_null_wdsp in (False, True) if CONFIG.coverage.enabled else (False,):
+            start = time.perf_counter()
+            raster = search_engine.get_raster(
+                connection, include_null_wdsp=include_null_wdsp
+            )
+            meta = raster.meta
+            cells = meta["rows"] * meta["cols"]
+            print(
+                f"{raster.directory.name}: {meta['stations']:,} stations over "
+                f"{meta['rows']:,} x {meta['cols']:,} cells of {meta['cell_degrees']}°, "
+                f"{meta['single_candidate_cells'] / max(cells, 1):.1%} with one "
+                f"candidate and at most {meta['max_candidates']}, "
+                f"ready in {time.perf_counter() - start:,.1f} s"
+            )
+            kept.add(raster.directory)
+    if args.prune:
+        for path in (BASE_DIR / CONFIG.raster.path).iterdir():
+            if path.is_dir() and path not in kept:
+                shutil.rmtree(path)
+                print(f"Deleted {path.name}")
+
+
+if __name__ == "__main__":
+    main()
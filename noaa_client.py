@@ -0,0 +1,129 @@
+"""
+Thin client of `noaa_server.py`. Only uses the standard library, so that it starts
+without importing SQLAlchemy or exifread
+
+    python noaa_client.py lookup 31.8 114.77 2020-09-15
+    python noaa_client.py --socket noaa.sock photo ./a.heic ./b.heic
+    find ./photos -name "*.heic" | python noaa_client.py photo -
+"""
+
+from __future__ import annotations
+
+import http.client
+import os
+import socket
+import sys
+from argparse import ArgumentParser, Namespace
+from typing import TYPE_CHECKING
+from urllib.parse import urlencode
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from typing import Any, Optional
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """"""
+
+    socket_path: str
+
+    def __init__(self, socket_path: str) -> None:
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        """"""
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class _Args(Namespace):
+    host: str
+    port: int
+    socket: Optional[str]
+    include_null_wdsp: bool
+    k: int
+    max_days_gap: Optional[int]
+    command: str
+    lat: float
+    lon: float
+    date: Optional[str]
+    paths: list[str]
+
+
+def _parse_argv() -> _Args:
+    """"""
+    parser = ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Unix socket of the server instead of TCP")
+    parser.add_argument("--include-null-wdsp", action="store_true")
+    parser.add_argument("-k", "--stations", dest="k", type=int, default=1)
+    parser.add_argument("--max-days-gap", type=int)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    lookup = commands.add_parser("lookup", help="Look up a position and date")
+    lookup.add_argument("lat", type=float)
+    lookup.add_argument("lon", type=float)
+    lookup.add_argument("date", nargs="?", help="YYYY-MM-DD (default today)")
+
+    photo = commands.add_parser("photo", help="Look up pictures read by the server")
+    photo.add_argument(
+        "paths", nargs="+", help='Picture paths, or "-" to read them from stdin'
+    )
+
+    commands.add_parser("stats", help="Show the server cache counters")
+
+    return parser.parse_args(namespace=_Args())
+
+
+def _iter_requests(args: _Args) -> Iterator[str]:
+    """"""
+    flags: dict[str, Any] = {"include_null_wdsp": 1} if args.include_null_wdsp else {}
+    if args.k != 1:
+        flags["k"] = args.k
+    if args.max_days_gap is not None:
+        flags["max_days_gap"] = args.max_days_gap
+    if args.command == "lookup":
+        params: dict[str, Any] = {"lat": args.lat, "lon": args.lon, **flags}
+        if args.date is not None:
+            params["date"] = args.date
+        yield f"/lookup?{urlencode(params)}"
+    elif args.command == "photo":
+        for path in args.paths:
+            if path != "-":
+                yield f"/photo?{urlencode({'path': os.path.abspath(path), **flags})}"
+                continue
+            for line in sys.stdin:
+                if line := line.strip():
+                    yield f"/photo?{urlencode({'path': os.path.abspath(line), **flags})}"
+    else:
+        yield "/stats"
+
+
+def main() -> None:
+    """"""
+    args = _parse_argv()
+    connection = (
+        http.client.HTTPConnection(args.host, args.port)
+        if args.socket is None
+        else _UnixHTTPConnection(args.socket)
+    )
+    failed = False
+    try:
+        # One kept-alive connection for every request
+        for url in _iter_requests(args):
+            connection.request("GET", url)
+            response = connection.getresponse()
+            body = response.read().decode("utf-8")
+            if response.status != http.client.OK:
+                failed = True
+            print(body, flush=True)
+    finally:
+        connection.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
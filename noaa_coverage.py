@@ -0,0 +1,37 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+
+from sqlalchemy import create_engine
+
+from utils.config import BASE_DIR, CONFIG
+from utils.coverage import build_coverage
+from utils.shards import ShardSet
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser(
+        description="Rebuild `coverage`, the first and last dates and row counts of "
+        "every station, from `data` or from the shards of `config.yml`. "
+        "`noaa_ingest.py` keeps it up to date for the stations it loads"
+    )
+    parser.parse_args()
+
+    start = time.perf_counter()
+    # A plain engine: the `immutable` and preload settings are meant for reading
+    engine = create_engine(CONFIG.db_url)
+    with engine.connect() as connection:
+        stations = build_coverage(connection, ShardSet.from_config())
+    engine.dispose()
+    # Remembered stations may have changed
+    if CONFIG.lookup_cache.path is not None:
+        (BASE_DIR / CONFIG.lookup_cache.path).unlink(missing_ok=True)
+    print(f"Covered {stations:,} stations in {time.perf_counter() - start:,.1f} s")
+
+
+if __name__ == "__main__":
+    main()
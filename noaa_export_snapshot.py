@@ -0,0 +1,40 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from utils.config import BASE_DIR, CONFIG
+from utils.engine import get_engine
+from utils.snapshot import export_snapshot
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser(
+        description="Export the database as the memory-mapped columns read by "
+        "`noaa_snapshot.py`"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=BASE_DIR / CONFIG.snapshot.path,
+        help="Snapshot folder (default from `config.yml`)",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with get_engine().connect() as connection:
+        meta = export_snapshot(connection, args.output)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Exported {meta['stations']:,} stations and {meta['rows']:,} rows "
+        f"to {args.output} in {elapsed:,.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,38 @@
 
 from __future__ import annotations
 
+import math as m
 from typing import TYPE_CHECKING
 
 from geoalchemy2 import load_spatialite  # pyright: ignore
+from sqlalchemy import bindparam, column
+from sqlalchemy import func as f
+from sqlalchemy import literal, literal_column, select, table
 
 from utils.base import BaseRunner, BaseSearchEngine
+from utils.config import CONFIG
+from utils.engine import get_engine
 from utils.models_gis import DataGis, StationInfoGis
 
 if TYPE_CHECKING:
-    from typing import Optional
+    import datetime
+    from typing import Optional, Union
 
-    from sqlalchemy.sql.elements import SQLCoreOperations
+    from sqlalchemy.engine.base import Connection, Engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.sql.elements import ColumnElement, SQLCoreOperations
+
+_SRID = 4326
+# Ellipsoidal distances may be up to ~0.5% shorter than spherical arcs of the box
+_BOX_MARGIN = 0.99
+
+_spatial_index = table(
+    "SpatialIndex",
+    column("rowid"),
+    column("f_table_name"),
+    column("f_geometry_column"),
+    column("search_frame"),
+)
 
 
 class _GisSearchEngine(BaseSearchEngine[DataGis, StationInfoGis]):
@@ -21,9 +42,81 @@ class _GisSearchEngine(BaseSearchEngine[DataGis, StationInfoGis]):
     DataModel = DataGis
     StationInfoModel = StationInfoGis
 
+    @classmethod
+    def get_engine(cls) -> Engine:
+        """"""
+        return get_engine(on_connect=(load_spatialite,))
+
+    @classmethod
+    def get_station_filters(
+        cls,
+        *,
+        include_null_wdsp: bool = False,
+        date: Optional[ColumnElement[datetime.date]] = None,
+        max_days_gap: Optional[ColumnElement[Optional[int]]] = None,
+    ) -> tuple[ColumnElement[bool], ...]:
+        """"""
+        return (
+            *super().get_station_filters(
+                include_null_wdsp=include_null_wdsp,
+                date=date,
+                max_days_gap=max_days_gap,
+            ),
+            cls.StationInfoModel.geom.is_not(None),
+        )
+
     def get_distance_comp(self) -> SQLCoreOperations[Optional[float]]:
         """"""
-        raise NotImplementedError
+        return self.get_batch_distance_comp(
+            lat=literal(self.lat), lon=literal(self.lon)
+        )
+
+    @classmethod
+    def get_batch_distance_comp(
+        cls, *, lat: ColumnElement[float], lon: ColumnElement[float]
+    ) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        point = f.MakePoint(lon, lat, _SRID)
+        return f.ST_Distance(cls.StationInfoModel.geom, point, 1) / 1000
+
+    def search_station(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> str:
+        """"""
+        # Let the R*Tree on `geom` narrow the candidates to a bounding box, growing
+        # it until the best hit is provably closer than anything outside of it
+        frame_stmt = select(_spatial_index.c.rowid).where(
+            _spatial_index.c.f_table_name == self.StationInfoModel.__tablename__,
+            _spatial_index.c.f_geometry_column == "geom",
+            _spatial_index.c.search_frame
+            == f.BuildMbr(
+                bindparam("lon_min"),
+                bindparam("lat_min"),
+                bindparam("lon_max"),
+                bindparam("lat_max"),
+                _SRID,
+            ),
+        )
+        distance_comp = self.get_distance_comp().label("distance")
+        station_stmt = (
+            select(self.StationInfoModel.station_id, distance_comp)
+            .where(
+                *self.get_station_filters(include_null_wdsp=include_null_wdsp),
+                literal_column(f"{self.StationInfoModel.__tablename__}.rowid").in_(
+                    frame_stmt
+                ),
+            )
+            .order_by(distance_comp, self.StationInfoModel.station_id)
+            .limit(1)
+        )
+        radius = self.BOX_RADIUS
+        while (box := self.get_box(radius)) is not None:
+            station = session.execute(station_stmt, box).first()
+            max_distance = m.radians(radius) * CONFIG.earth_radius * _BOX_MARGIN
+            if station is not None and station.distance <= max_distance:
+                return station.station_id
+            radius *= 2
+        return super().search_station(session, include_null_wdsp=include_null_wdsp)
 
 
 class _GisRunner(BaseRunner[_GisSearchEngine]):
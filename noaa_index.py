@@ -0,0 +1,84 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, ClassVar
+
+from sqlalchemy import select
+
+from utils.base import BaseRunner, BaseSearchEngine
+from utils.config import CONFIG
+from utils.models_trig import Data, StationInfo
+from utils.spatial_index import StationIndex
+
+if TYPE_CHECKING:
+    from typing import Optional, Union
+
+    from sqlalchemy.engine.base import Connection
+    from sqlalchemy.orm import Session
+    from sqlalchemy.sql.elements import ColumnElement, SQLCoreOperations
+
+    from utils.region import Region
+
+
+class _IndexSearchEngine(BaseSearchEngine[Data, StationInfo]):
+    """"""
+
+    DataModel = Data
+    StationInfoModel = StationInfo
+
+    _indexes: ClassVar[dict[tuple[str, Region, bool], StationIndex]] = {}
+
+    def get_distance_comp(self) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return self.StationInfoModel.get_distance(lat=self.lat, lon=self.lon)
+
+    @classmethod
+    def get_batch_distance_comp(
+        cls, *, lat: ColumnElement[float], lon: ColumnElement[float]
+    ) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return cls.StationInfoModel.get_distance(lat=lat, lon=lon)
+
+    def get_index(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> StationIndex:
+        """"""
+        # One station list per region, and per `include_null_wdsp` when stations
+        # without a usable row are left out
+        key = (
+            str(self.engine.url),
+            self.get_region(),
+            include_null_wdsp and CONFIG.coverage.enabled,
+        )
+        index = self._indexes.get(key)
+        if index is None:
+            stations_stmt = select(
+                self.StationInfoModel.station_id,
+                self.StationInfoModel.latitude,
+                self.StationInfoModel.longitude,
+            ).where(*self.get_station_filters(include_null_wdsp=include_null_wdsp))
+            index = StationIndex(session.execute(stations_stmt).tuples())
+            self._indexes[key] = index
+        return index
+
+    def search_station(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> str:
+        """"""
+        station_id = self.get_index(
+            session, include_null_wdsp=include_null_wdsp
+        ).nearest(self.lat, self.lon)
+        if station_id is None:
+            raise ValueError("No station found")
+        return station_id
+
+
+class _IndexRunner(BaseRunner[_IndexSearchEngine]):
+    """"""
+
+    SearchEngineClass = _IndexSearchEngine
+
+
+if __name__ == "__main__":
+    _IndexRunner().run()
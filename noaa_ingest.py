@@ -0,0 +1,96 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine
+
+from utils.config import BASE_DIR, CONFIG
+from utils.ingest import GsodIngest
+from utils.schema import has_table, table_columns
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine.base import Engine
+
+
+def _get_engine(url: str) -> Engine:
+    """
+    A plain engine: the preload and `immutable` settings of `get_engine` are meant for
+    reading. SpatiaLite is loaded when `info` has the GIS geometry, as its triggers
+    need it
+    """
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        spatial = has_table(connection, "info") and "geom" in table_columns(
+            connection, "info"
+        )
+    if not spatial:
+        return engine
+    from geoalchemy2 import load_spatialite  # pyright: ignore
+    from sqlalchemy.event import listen
+
+    engine.dispose()
+    engine = create_engine(url)
+    listen(engine, "connect", load_spatialite)
+    return engine
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser(
+        description="Load NOAA GSOD daily summaries into the database. Station-years "
+        "already loaded from an unchanged file are skipped, so re-run it to refresh"
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        type=Path,
+        help="Yearly `.tar.gz` archives, CSV files, or directories of them",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="Parsing processes (default one per CPU)"
+    )
+    parser.add_argument("--batch-rows", type=int, default=50_000)
+    parser.add_argument("--commit-rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--keep-indexes",
+        action="store_true",
+        help="Do not drop and rebuild the `data` indexes, faster for small refreshes",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Reload station-years already loaded"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = _get_engine(CONFIG.db_url)
+    with engine.connect() as connection:
+        stats = GsodIngest(
+            connection,
+            jobs=args.jobs,
+            batch_rows=args.batch_rows,
+            commit_rows=args.commit_rows,
+            drop_indexes=not args.keep_indexes,
+            force=args.force,
+        ).run(args.paths)
+    engine.dispose()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Loaded {stats['loaded']:,} station-years ({stats['rows']:,} rows, "
+        f"{stats['stations']:,} new stations), skipped {stats['skipped']:,} unchanged "
+        f"and {stats['failed']:,} failed in {elapsed:,.1f} s"
+    )
+    if stats["loaded"]:
+        # Remembered stations and dates may have changed
+        if CONFIG.lookup_cache.path is not None:
+            (BASE_DIR / CONFIG.lookup_cache.path).unlink(missing_ok=True)
+        if (BASE_DIR / CONFIG.snapshot.path).exists():
+            print("Run `noaa_export_snapshot.py` to update the snapshot")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, ClassVar
+
+from sqlalchemy import select
+
+from utils.base import BaseRunner, BaseSearchEngine
+from utils.config import BASE_DIR, CONFIG
+from utils.models_trig import Data, StationInfo
+from utils.raster import open_raster
+
+if TYPE_CHECKING:
+    from typing import Optional, Union
+
+    from sqlalchemy.engine.base import Connection
+    from sqlalchemy.orm import Session
+    from sqlalchemy.sql.elements import ColumnElement, SQLCoreOperations
+
+    from utils.raster import StationRaster
+    from utils.region import Region
+
+
+class _RasterSearchEngine(BaseSearchEngine[Data, StationInfo]):
+    """
+    Nearest station read from the precomputed raster of `utils.raster`: one array
+    index, plus a few exact distances in cells near the border between stations
+    """
+
+    DataModel = Data
+    StationInfoModel = StationInfo
+
+    _rasters: ClassVar[dict[tuple[str, Region, bool], StationRaster]] = {}
+
+    def get_distance_comp(self) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return self.StationInfoModel.get_distance(lat=self.lat, lon=self.lon)
+
+    @classmethod
+    def get_batch_distance_comp(
+        cls, *, lat: ColumnElement[float], lon: ColumnElement[float]
+    ) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return cls.StationInfoModel.get_distance(lat=lat, lon=lon)
+
+    def get_raster(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> StationRaster:
+        """"""
+        key = (
+            str(self.engine.url),
+            self.get_region(),
+            include_null_wdsp and CONFIG.coverage.enabled,
+        )
+        raster = self._rasters.get(key)
+        if raster is None:
+            # Read once per process to tell whether the saved raster is still current
+            stations_stmt = (
+                select(
+                    self.StationInfoModel.station_id,
+                    self.StationInfoModel.latitude,
+                    self.StationInfoModel.longitude,
+                )
+                .where(*self.get_station_filters(include_null_wdsp=include_null_wdsp))
+                .order_by(self.StationInfoModel.station_id)
+            )
+            config = CONFIG.raster
+            raster = self._rasters[key] = open_raster(
+                BASE_DIR / config.path,
+                session.execute(stations_stmt).tuples().all(),
+                cell_degrees=config.cell_degrees,
+                bounds=config.bounds,
+            )
+        return raster
+
+    def search_station(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> str:
+        """"""
+        station_id = self.get_raster(
+            session, include_null_wdsp=include_null_wdsp
+        ).nearest(self.lat, self.lon)
+        if station_id is None:
+            # Outside of the raster bounds
+            return super().search_station(session, include_null_wdsp=include_null_wdsp)
+        return station_id
+
+
+class _RasterRunner(BaseRunner[_RasterSearchEngine]):
+    """"""
+
+    SearchEngineClass = _RasterSearchEngine
+
+
+if __name__ == "__main__":
+    _RasterRunner().run()
@@ -0,0 +1,79 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import importlib
+import signal
+import sys
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
+
+from utils.argparse import parse_server_argv
+from utils.config import BASE_DIR, CONFIG
+from utils.lookup_cache import LookupCache
+from utils.server import LookupHTTPServer, LookupService, LookupUnixServer
+
+if TYPE_CHECKING:
+    from typing import Any, Union
+
+    from utils.base import BaseSearchEngine
+    from utils.models_base import DataMixin, StationInfoMixin
+
+# Only the chosen engine is imported: the trig and GIS models share table names
+_ENGINES = {
+    "trig": ("noaa_trig", "_TrigSearchEngine"),
+    "index": ("noaa_index", "_IndexSearchEngine"),
+    "gis": ("noaa_gis", "_GisSearchEngine"),
+    "snapshot": ("noaa_snapshot", "_SnapshotSearchEngine"),
+    "raster": ("noaa_raster", "_RasterSearchEngine"),
+    "compact": ("noaa_compact", "_CompactSearchEngine"),
+}
+
+
+def _get_search_engine_class(
+    name: str,
+) -> type[BaseSearchEngine[DataMixin[Any], StationInfoMixin[Any]]]:
+    """"""
+    module_name, class_name = _ENGINES[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def main() -> None:
+    """"""
+    args = parse_server_argv()
+    use_lookup_cache = CONFIG.lookup_cache.enabled and not args.no_lookup_cache
+    with LookupCache.from_config() if use_lookup_cache else nullcontext() as cache:
+        SearchEngineClass = _get_search_engine_class(args.engine)
+        region = args.get_region()
+        if region is not None:
+            SearchEngineClass = SearchEngineClass.scoped(region)
+        service = LookupService(
+            SearchEngineClass,
+            lookup_cache=cache,
+            fast_exif=not args.full_exif,
+        )
+        service.warm_up()
+        socket = args.socket
+        if socket is None and CONFIG.server.socket is not None:
+            socket = BASE_DIR / CONFIG.server.socket
+        server: Union[LookupHTTPServer, LookupUnixServer]
+        if socket is not None:
+            server = LookupUnixServer(socket, service, quiet=args.quiet)
+            where = f"unix:{socket}"
+        else:
+            host = args.host or CONFIG.server.host
+            port = CONFIG.server.port if args.port is None else args.port
+            server = LookupHTTPServer((host, port), service, quiet=args.quiet)
+            where = f"http://{host}:{server.server_address[1]}"
+        print(f"Serving {args.engine} lookups on {where}", file=sys.stderr, flush=True)
+        # Stop as on Ctrl-C, so that the socket is removed and the cache saved
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        with server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
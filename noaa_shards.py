@@ -0,0 +1,84 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+
+from utils.config import BASE_DIR, CONFIG
+from utils.shards import ShardSet, merge_shards, split_data
+
+
+def _database_path() -> str:
+    """"""
+    url = make_url(CONFIG.db_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise ValueError(f"{CONFIG.db_url} is not a SQLite file")
+    assert url.database is not None
+    return url.database
+
+
+def main() -> None:
+    """"""
+    parser = ArgumentParser(
+        description="Split `data` into one SQLite file per year or per `--span` "
+        "years, or merge such files back into the main database"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split_parser = subparsers.add_parser("split")
+    split_parser.add_argument("--span", type=int, default=1, help="Years per shard")
+    split_parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Drop `data` from the main database and vacuum it afterwards",
+    )
+    merge_parser = subparsers.add_parser("merge")
+    merge_parser.add_argument(
+        "--delete", action="store_true", help="Delete the shard files afterwards"
+    )
+    for subparser in (split_parser, merge_parser):
+        subparser.add_argument(
+            "-d",
+            "--directory",
+            type=Path,
+            default=BASE_DIR / (CONFIG.shards.path or "shards"),
+            help="Shard folder (default from `config.yml`, else `shards`)",
+        )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    database = sqlite3.connect(_database_path())
+    try:
+        if args.command == "split":
+            result = split_data(database, args.directory, span=args.span)
+            print(
+                f"Split {result['rows']:,} rows of {result['first_year']} to "
+                f"{result['last_year']} into {result['shards']:,} shards in "
+                f"{args.directory}"
+            )
+            if args.drop:
+                database.execute("DROP TABLE data")
+                database.commit()
+                database.execute("VACUUM")
+            if CONFIG.shards.path is None:
+                print("Set `shards.path` in `config.yml` to read them")
+        else:
+            shard_set = ShardSet(args.directory)
+            result = merge_shards(database, shard_set)
+            print(f"Merged {result['rows']:,} rows of {result['shards']:,} shards")
+            if args.delete:
+                for shard in shard_set.shards:
+                    shard.path.unlink()
+            if CONFIG.shards.path is not None:
+                print("Unset `shards.path` in `config.yml` to read them")
+    finally:
+        database.close()
+    print(f"Done in {time.perf_counter() - start:,.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, ClassVar
+
+import numpy as np
+
+from utils.base import BaseRunner, BaseSearchEngine, LookupRecord
+from utils.config import BASE_DIR, CONFIG
+from utils.distance import distance_km
+from utils.models_trig import Data, StationInfo
+from utils.profiling import stage
+from utils.snapshot import Snapshot
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Sequence
+    from typing import Any, Optional
+
+    from numpy.typing import NDArray
+    from sqlalchemy.sql.elements import ColumnElement, SQLCoreOperations
+
+    from utils.batch import Photo
+    from utils.region import Region
+
+
+class _SnapshotSearchEngine(BaseSearchEngine[Data, StationInfo]):
+    """
+    Answers `lookup` from the memory-mapped arrays of `noaa_export_snapshot.py`,
+    without a database connection. `search` still goes through the database
+    """
+
+    DataModel = Data
+    StationInfoModel = StationInfo
+
+    _snapshots: ClassVar[dict[str, Snapshot]] = {}
+    # Station indexes per snapshot and region, and then per `include_null_wdsp`
+    _regions: ClassVar[dict[tuple[str, Region], NDArray[np.intp]]] = {}
+    _covered: ClassVar[dict[tuple[str, Region, bool], NDArray[np.intp]]] = {}
+
+    def get_distance_comp(self) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return self.StationInfoModel.get_distance(lat=self.lat, lon=self.lon)
+
+    @classmethod
+    def get_batch_distance_comp(
+        cls, *, lat: ColumnElement[float], lon: ColumnElement[float]
+    ) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return cls.StationInfoModel.get_distance(lat=lat, lon=lon)
+
+    @classmethod
+    def get_snapshot(cls) -> tuple[Snapshot, NDArray[np.intp]]:
+        """
+        The snapshot, and the indexes of the stations of the region passing
+        `get_station_filters`
+        """
+        path = str(BASE_DIR / CONFIG.snapshot.path)
+        snapshot = cls._snapshots.get(path)
+        if snapshot is None:
+            snapshot = cls._snapshots[path] = Snapshot(BASE_DIR / CONFIG.snapshot.path)
+        region = cls.get_region()
+        candidates = cls._regions.get((path, region))
+        if candidates is None:
+            # Coordinates are never NULL in a snapshot
+            candidates = cls._regions[path, region] = snapshot.in_region(region)
+        return snapshot, candidates
+
+    @classmethod
+    def get_candidates(
+        cls,
+        *,
+        include_null_wdsp: bool = False,
+        date: Optional[datetime.date] = None,
+        max_days_gap: Optional[int] = None,
+    ) -> NDArray[np.intp]:
+        """
+        Candidate stations further narrowed like the `coverage` filter of
+        `get_station_filters`, from the snapshot's own per-station first and last days
+        """
+        snapshot, candidates = cls.get_snapshot()
+        if not CONFIG.coverage.enabled:
+            return candidates
+        key = (
+            str(BASE_DIR / CONFIG.snapshot.path),
+            cls.get_region(),
+            include_null_wdsp,
+        )
+        covered = cls._covered.get(key)
+        if covered is None:
+            covered = cls._covered[key] = snapshot.covered(
+                candidates, include_null_wdsp=include_null_wdsp
+            )
+        if max_days_gap is None:
+            return covered
+        return snapshot.covered(
+            covered,
+            include_null_wdsp=include_null_wdsp,
+            date=date,
+            max_days_gap=max_days_gap,
+        )
+
+    @contextmanager
+    def get_connection(self) -> Generator[Any, None, None]:
+        # Nothing to open: the arrays are mapped once per process
+        yield None
+
+    def search_station(self, session: Any, *, include_null_wdsp: bool = False) -> str:
+        """"""
+        snapshot, _ = self.get_snapshot()
+        candidates = self.get_candidates(include_null_wdsp=include_null_wdsp)
+        station = snapshot.nearest_station(self.lat, self.lon, candidates)
+        if station is None:
+            raise ValueError("No station found")
+        return snapshot.station_ids[station].decode()
+
+    def lookup(
+        self,
+        connection: Any = None,
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> LookupRecord:
+        """"""
+        snapshot, _ = self.get_snapshot()
+        with stage("station"):
+            candidates = self.get_candidates(
+                include_null_wdsp=include_null_wdsp,
+                date=self.date,
+                max_days_gap=max_days_gap,
+            )
+            if k == 1:
+                station = snapshot.nearest_station(self.lat, self.lon, candidates)
+                stations = [] if station is None else [station]
+            else:
+                stations = snapshot.nearest_stations(
+                    np.array([self.lat]), np.array([self.lon]), candidates, k
+                )[0].tolist()
+        with stage("data"):
+            return self._get_record(
+                stations,
+                include_null_wdsp=include_null_wdsp,
+                max_days_gap=max_days_gap,
+            )
+
+    @classmethod
+    def lookup_batch(
+        cls,
+        photos: Sequence[Photo],
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> list[Optional[LookupRecord]]:
+        """"""
+        snapshot, _ = cls.get_snapshot()
+        # Candidates only depend on the date when narrowed by `max_days_gap`
+        groups: dict[Optional[datetime.date], list[Photo]] = {}
+        for photo in photos:
+            if (
+                photo.lat is not None
+                and photo.lon is not None
+                and photo.date is not None
+            ):
+                key = None if max_days_gap is None else photo.date
+                groups.setdefault(key, []).append(photo)
+        found: dict[int, LookupRecord] = {}
+        for date, group in groups.items():
+            candidates = cls.get_candidates(
+                include_null_wdsp=include_null_wdsp,
+                date=date,
+                max_days_gap=max_days_gap,
+            )
+            # One vectorized N x M pass for the stations of the whole group
+            stations = snapshot.nearest_stations(
+                np.array([photo.lat for photo in group], dtype=np.float64),
+                np.array([photo.lon for photo in group], dtype=np.float64),
+                candidates,
+                k,
+            )
+            for photo, nearest in zip(group, stations.tolist()):
+                assert photo.lat is not None and photo.lon is not None
+                search_engine = cls(lat=photo.lat, lon=photo.lon, date=photo.date)
+                try:
+                    found[id(photo)] = search_engine._get_record(
+                        nearest,
+                        include_null_wdsp=include_null_wdsp,
+                        max_days_gap=max_days_gap,
+                    )
+                except ValueError:
+                    pass
+        return [found.get(id(photo)) for photo in photos]
+
+    def _get_record(
+        self,
+        stations: list[int],
+        *,
+        include_null_wdsp: bool,
+        max_days_gap: Optional[int],
+    ) -> LookupRecord:
+        """
+        Closest row of the first of `stations`, nearest first, having one within
+        `max_days_gap` days
+        """
+        if not stations:
+            raise ValueError("No station found")
+        snapshot, _ = self.get_snapshot()
+        for rank, station in enumerate(stations, 1):
+            row = snapshot.nearest_row(
+                station, self.date, include_null_wdsp=include_null_wdsp
+            )
+            if row is None:
+                continue
+            date = snapshot.get_date(row)
+            days_gap = abs((date - self.date).days)
+            if max_days_gap is not None and days_gap > max_days_gap:
+                continue
+            return LookupRecord(
+                station=snapshot.station_ids[station].decode(),
+                station_name=str(snapshot.station_names[station]) or None,
+                date=date,
+                wdsp=snapshot.get_value("wdsp", row),
+                distance_km=distance_km(
+                    float(snapshot.latitudes[station]),
+                    float(snapshot.longitudes[station]),
+                    self.lat,
+                    self.lon,
+                ),
+                station_rank=rank,
+                days_gap=days_gap,
+            )
+        if max_days_gap is None:
+            raise ValueError("No data found")
+        raise ValueError(
+            f"No data found within {max_days_gap} days "
+            f"at the {len(stations)} nearest stations"
+        )
+
+
+class _SnapshotRunner(BaseRunner[_SnapshotSearchEngine]):
+    """"""
+
+    SearchEngineClass = _SnapshotSearchEngine
+
+
+if __name__ == "__main__":
+    _SnapshotRunner().run()
@@ -2,15 +2,22 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import math as m
+from typing import TYPE_CHECKING, ClassVar
+
+from sqlalchemy import Float, bindparam, select
 
 from utils.base import BaseRunner, BaseSearchEngine
+from utils.config import CONFIG
 from utils.models_trig import Data, StationInfo
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Optional, Union
 
-    from sqlalchemy.sql.elements import SQLCoreOperations
+    from sqlalchemy.engine.base import Connection
+    from sqlalchemy.orm import Session
+    from sqlalchemy.sql.elements import ColumnElement, SQLCoreOperations
+    from sqlalchemy.sql.selectable import Select
 
 
 class _TrigSearchEngine(BaseSearchEngine[Data, StationInfo]):
@@ -19,10 +26,67 @@ class _TrigSearchEngine(BaseSearchEngine[Data, StationInfo]):
     DataModel = Data
     StationInfoModel = StationInfo
 
+    _station_stmts: ClassVar[dict[tuple[type, bool], Select[tuple[str, float]]]] = {}
+
     def get_distance_comp(self) -> SQLCoreOperations[Optional[float]]:
         """"""
         return self.StationInfoModel.get_distance(lat=self.lat, lon=self.lon)
 
+    @classmethod
+    def get_batch_distance_comp(
+        cls, *, lat: ColumnElement[float], lon: ColumnElement[float]
+    ) -> SQLCoreOperations[Optional[float]]:
+        """"""
+        return cls.StationInfoModel.get_distance(lat=lat, lon=lon)
+
+    @classmethod
+    def get_station_stmt(
+        cls, *, include_null_wdsp: bool = False
+    ) -> Select[tuple[str, float]]:
+        """"""
+        # Built once: building the statement costs more than running it
+        key = (cls, include_null_wdsp)
+        station_stmt = cls._station_stmts.get(key)
+        if station_stmt is not None:
+            return station_stmt
+        distance_comp = cls.get_batch_distance_comp(
+            lat=bindparam("lat", type_=Float), lon=bindparam("lon", type_=Float)
+        ).label("distance")
+        station_stmt = (
+            select(cls.StationInfoModel.station_id, distance_comp)
+            .where(
+                *cls.get_station_filters(include_null_wdsp=include_null_wdsp),
+                cls.StationInfoModel.latitude.between(
+                    bindparam("lat_min"), bindparam("lat_max")
+                ),
+                cls.StationInfoModel.longitude.between(
+                    bindparam("lon_min"), bindparam("lon_max")
+                ),
+            )
+            .order_by(distance_comp, cls.StationInfoModel.station_id)
+            .limit(1)
+        )
+        cls._station_stmts[key] = station_stmt
+        return station_stmt
+
+    def search_station(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> str:
+        """"""
+        # Rank only the stations inside an indexed bounding box, growing it until
+        # the best hit is provably closer than anything outside of it
+        station_stmt = self.get_station_stmt(include_null_wdsp=include_null_wdsp)
+        radius = self.BOX_RADIUS
+        while (box := self.get_box(radius)) is not None:
+            station = session.execute(
+                station_stmt, {"lat": self.lat, "lon": self.lon, **box}
+            ).first()
+            max_distance = m.radians(radius) * CONFIG.earth_radius
+            if station is not None and station.distance <= max_distance:
+                return station.station_id
+            radius *= 2
+        return super().search_station(session, include_null_wdsp=include_null_wdsp)
+
 
 class _TrigRunner(BaseRunner[_TrigSearchEngine]):
     """"""
@@ -0,0 +1,29 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING
+
+import pytest
+
+from utils import config
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Any
+
+
+@pytest.fixture
+def configure(monkeypatch: pytest.MonkeyPatch) -> Callable[..., Any]:
+    """
+    `configure(db_url=..., ...)` replaces values of `config.yml` for one test
+    """
+    base = config._get_config()
+
+    def configure(**changes: Any) -> Any:
+        patched = dataclasses.replace(base, **changes)
+        monkeypatch.setattr(config, "_get_config", lambda: patched)
+        return patched
+
+    return configure
@@ -0,0 +1,227 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import random
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.synthetic import generate_database
+from utils.schema import apply_non_spatial_migrations, create_tables, table_columns
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Any
+
+# Lookups are drawn over the stations of the default region
+_SOUTH, _NORTH, _WEST, _EAST = 18.0, 53.5, 73.5, 134.8
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory: pytest.TempPathFactory) -> tuple[str, dict[str, str]]:
+    """
+    Synthetic database where some stations have a twin at the same place, with the
+    station each twin pair must resolve to
+    """
+    path = tmp_path_factory.mktemp("engines") / "noaa.db"
+    generated = generate_database(
+        path, stations=400, years=1, end=datetime.date(2023, 12, 31), seed=0
+    )
+    url = generated["db_url"]
+    engine = create_engine(url)
+    expected: dict[str, str] = {}
+    with engine.begin() as connection:
+        stations = connection.exec_driver_sql(
+            "SELECT station_id FROM info WHERE country = '中国' "
+            "AND latitude IS NOT NULL ORDER BY station_id LIMIT 10"
+        ).scalars()
+        info_columns = table_columns(connection, "info")[1:]
+        coverage_columns = table_columns(connection, "coverage")[1:]
+        for i, station_id in enumerate(list(stations)):
+            # Ids sorting before and after the original one
+            twin_id = station_id[:6] + ("00000" if i % 2 else "9999A")
+            for name, key, columns in (
+                ("info", "station_id", info_columns),
+                ("coverage", "station", coverage_columns),
+            ):
+                connection.exec_driver_sql(
+                    f"INSERT INTO {name} ({key}, {', '.join(columns)}) "
+                    f"SELECT ?, {', '.join(columns)} FROM {name} WHERE {key} = ?",
+                    (twin_id, station_id),
+                )
+            expected[station_id] = min(station_id, twin_id)
+    engine.dispose()
+    return url, expected
+
+
+def _search_stations(
+    SearchEngineClass: type[Any], points: list[tuple[float, float]]
+) -> list[str]:
+    """"""
+    search_engine = SearchEngineClass(lat=0, lon=0)
+    results: list[str] = []
+    with search_engine.get_session() as session:
+        for lat, lon in points:
+            search_engine.lat, search_engine.lon = lat, lon
+            results.append(search_engine.search_station(session))
+    return results
+
+
+def test_engines_pick_same_station(
+    database: tuple[str, dict[str, str]],
+    configure: Callable[..., Any],
+    tmp_path: Path,
+) -> None:
+    """"""
+    from noaa_index import _IndexSearchEngine
+    from noaa_raster import _RasterSearchEngine
+    from noaa_trig import _TrigSearchEngine
+
+    url, expected = database
+    base = configure()
+    configure(db_url=url, raster=dataclasses.replace(base.raster, path=str(tmp_path)))
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        twins = connection.exec_driver_sql(
+            "SELECT station_id, latitude, longitude FROM info "
+            f"WHERE station_id IN ({', '.join('?' * len(expected))})",
+            tuple(expected),
+        ).all()
+    engine.dispose()
+    rng = random.Random(0)
+    points = [
+        (rng.uniform(_SOUTH, _NORTH), rng.uniform(_WEST, _EAST)) for _ in range(300)
+    ]
+    # On each twin pair, and just off it where both are exactly as far
+    tie_points = [
+        (lat + d_lat, lon + d_lon)
+        for _, lat, lon in twins
+        for d_lat, d_lon in ((0, 0), (0.003, -0.002), (-0.01, 0.004))
+    ]
+
+    results = {
+        SearchEngineClass.__name__: _search_stations(
+            SearchEngineClass, points + tie_points
+        )
+        for SearchEngineClass in (
+            _TrigSearchEngine,
+            _IndexSearchEngine,
+            _RasterSearchEngine,
+        )
+    }
+    trig = results.pop(_TrigSearchEngine.__name__)
+    for name, stations in results.items():
+        assert stations == trig, name
+    tie_expected = [
+        expected[station_id] for station_id, _, _ in twins for _ in range(3)
+    ]
+    assert trig[len(points) :] == tie_expected
+
+
+def test_hot_preload_matches_file(
+    database: tuple[str, dict[str, str]],
+    configure: Callable[..., Any],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """"""
+    from noaa_trig import _TrigSearchEngine
+    from utils.batch import Photo
+
+    url, _ = database
+    base = configure(db_url=url)
+    rng = random.Random(1)
+    searches = [
+        (
+            rng.uniform(_SOUTH, _NORTH),
+            rng.uniform(_WEST, _EAST),
+            datetime.date(2023, 1, 1) + datetime.timedelta(days=rng.randrange(365)),
+        )
+        for _ in range(50)
+    ]
+
+    def lookup_all() -> list[Any]:
+        records: list[Any] = []
+        search_engine = _TrigSearchEngine(lat=0, lon=0)
+        with search_engine.get_connection() as connection:
+            for lat, lon, date in searches:
+                search_engine.lat, search_engine.lon = lat, lon
+                search_engine.date = date
+                records.append(search_engine.lookup(connection, max_days_gap=3))
+        return records
+
+    expected = lookup_all()
+    # Engines are made once per process and URL
+    monkeypatch.setattr("utils.engine._engines", {})
+    monkeypatch.setattr("utils.engine._preloaded", {})
+    configure(
+        db_url=url,
+        sqlite=dataclasses.replace(
+            base.sqlite, preload="hot", preload_data_since=datetime.date(2023, 1, 1)
+        ),
+    )
+    assert lookup_all() == expected
+
+    # Rows before the cutoff are not in memory, so earlier dates are refused
+    search_engine = _TrigSearchEngine(
+        lat=39.9, lon=116.3, date=datetime.date(2022, 12, 31)
+    )
+    with search_engine.get_connection() as connection:
+        with pytest.raises(ValueError, match="preloaded"):
+            search_engine.lookup(connection)
+    photo = Photo(
+        Path("old.jpg"),
+        datetime=datetime.datetime(2022, 12, 31, 12),
+        lat=39.9,
+        lon=116.3,
+    )
+    assert _TrigSearchEngine.lookup_batch([photo]) == [None]
+
+
+def test_trig_ranks_stations_without_unit_vector(
+    configure: Callable[..., Any], tmp_path: Path
+) -> None:
+    """"""
+    from noaa_trig import _TrigSearchEngine
+
+    url = f"sqlite:///{tmp_path / 'noaa.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        create_tables(connection)
+        connection.exec_driver_sql(
+            "INSERT INTO info (station_id, name, latitude, longitude, country) "
+            "VALUES (?, ?, ?, ?, '中国')",
+            [
+                ("54511099999", "BEIJING", 39.933, 116.283),
+                ("54527099999", "TIANJIN", 39.083, 117.067),
+            ],
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO data (station, date, wdsp) VALUES (?, '2023-01-01', 2.5)",
+            [("54511099999",), ("54527099999",)],
+        )
+        apply_non_spatial_migrations(connection)
+        # As left by a writer other than the migrations and the ingest
+        connection.exec_driver_sql(
+            "UPDATE info SET unit_x = NULL, unit_y = NULL, unit_z = NULL "
+            "WHERE station_id = '54527099999'"
+        )
+    engine.dispose()
+    configure(db_url=url)
+
+    for (lat, lon), expected in (
+        ((39.1, 117.1), "54527099999"),
+        ((39.9, 116.3), "54511099999"),
+    ):
+        search_engine = _TrigSearchEngine(
+            lat=lat, lon=lon, date=datetime.date(2023, 1, 1)
+        )
+        with search_engine.get_connection() as connection:
+            assert search_engine.search_station(connection) == expected
+            record = search_engine.lookup(connection)
+        assert record.station == expected
+        assert record.distance_km is not None and record.distance_km < 10
@@ -0,0 +1,42 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+import sqlite3
+from typing import TYPE_CHECKING
+
+from utils.exif import ExifRecord
+from utils.exif_cache import ExifCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_records_kept_per_reader(tmp_path: Path) -> None:
+    """"""
+    picture = tmp_path / "picture.jpg"
+    picture.write_bytes(b"\xff\xd8\xff\xd9")
+    fast = ExifRecord(None, None, None, "No GPS", "No GPS", "No date")
+    full = ExifRecord(39.9, 116.3, datetime.datetime(2023, 1, 14, 12))
+    with ExifCache(tmp_path / "exif_cache.db") as cache:
+        cache.put(picture, fast, fast=True)
+        assert cache.get(picture, fast=False) is None
+        cache.put(picture, full, fast=False)
+        assert cache.get(picture, fast=True) == fast
+        assert cache.get(picture, fast=False) == full
+
+
+def test_older_schema_dropped(tmp_path: Path) -> None:
+    """"""
+    path = tmp_path / "exif_cache.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE exif (path TEXT PRIMARY KEY NOT NULL)")
+    connection.commit()
+    connection.close()
+    picture = tmp_path / "picture.jpg"
+    picture.write_bytes(b"\xff\xd8\xff\xd9")
+    with ExifCache(path) as cache:
+        assert cache.get(picture, fast=True) is None
+        cache.put(picture, ExifRecord(39.9, 116.3, None), fast=True)
+        assert cache.get(picture, fast=True) == ExifRecord(39.9, 116.3, None)
@@ -0,0 +1,109 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine
+
+from utils.lookup_cache import LookupCache
+from utils.region import Region
+from utils.schema import apply_non_spatial_migrations, create_tables
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+    from typing import Any
+
+_REGION = Region(("中国",), ())
+
+
+def test_saved_cache_dropped_when_database_changes(
+    configure: Callable[..., Any], tmp_path: Path
+) -> None:
+    """"""
+    url = f"sqlite:///{tmp_path / 'noaa.db'}"
+    cache_path = tmp_path / "lookup_cache.json"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        create_tables(connection)
+        connection.exec_driver_sql(
+            "INSERT INTO info (station_id, name, latitude, longitude, country) "
+            "VALUES ('54511099999', 'BEIJING', 39.933, 116.283, '中国')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO data (station, date, wdsp) "
+            "VALUES ('54511099999', '2023-01-01', 2.5)"
+        )
+        apply_non_spatial_migrations(connection)
+    base = configure()
+    configure(
+        db_url=url,
+        lookup_cache=dataclasses.replace(base.lookup_cache, path=str(cache_path)),
+    )
+
+    with LookupCache.from_config() as cache:
+        cache.put_station("E", 39.9, 116.3, False, _REGION, "54511099999")
+        cache.put_date(
+            "54511099999", datetime.date(2023, 1, 2), False, datetime.date(2023, 1, 1)
+        )
+    cache = LookupCache.from_config()
+    assert cache.get_station("E", 39.9, 116.3, False, _REGION) == "54511099999"
+    # Entries are per engine
+    assert cache.get_station("F", 39.9, 116.3, False, _REGION) is None
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO data (station, date, wdsp) "
+            "VALUES ('54511099999', '2023-01-02', 3.5)"
+        )
+        connection.exec_driver_sql(
+            "UPDATE coverage SET last_date = '2023-01-02', data_rows = 2, "
+            "wdsp_last_date = '2023-01-02', wdsp_rows = 2"
+        )
+    engine.dispose()
+    cache = LookupCache.from_config()
+    assert cache.get_station("E", 39.9, 116.3, False, _REGION) is None
+    assert cache.get_date("54511099999", datetime.date(2023, 1, 2), False) is None
+    assert not cache_path.exists()
+
+
+def test_lookup_reuses_cached_dates(
+    configure: Callable[..., Any], tmp_path: Path
+) -> None:
+    """"""
+    from noaa_trig import _TrigSearchEngine
+
+    url = f"sqlite:///{tmp_path / 'noaa.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        create_tables(connection)
+        connection.exec_driver_sql(
+            "INSERT INTO info (station_id, name, latitude, longitude, country) "
+            "VALUES ('54511099999', 'BEIJING', 39.933, 116.283, '中国')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO data (station, date, wdsp) VALUES (?, ?, ?)",
+            [
+                ("54511099999", f"2023-01-{day:02d}", None if day % 3 else 2.5)
+                for day in range(1, 29)
+            ],
+        )
+        apply_non_spatial_migrations(connection)
+    engine.dispose()
+    configure(db_url=url)
+
+    cache = LookupCache(grid=0.001, capacity=100)
+    records = []
+    for _ in range(3):
+        search_engine = _TrigSearchEngine(
+            lat=39.9, lon=116.3, date=datetime.date(2023, 1, 14), cache=cache
+        )
+        with search_engine.get_connection() as connection:
+            records.append(search_engine.lookup(connection))
+    assert records[0].date == datetime.date(2023, 1, 15)
+    assert records[1:] == records[:1] * 2
+    assert (cache.data_hits, cache.data_misses) == (2, 1)
+    assert (cache.station_hits, cache.station_misses) == (2, 1)
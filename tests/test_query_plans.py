@@ -0,0 +1,97 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from utils.profiling import Profiler
+from utils.schema import apply_non_spatial_migrations, create_tables
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator
+    from typing import Any
+
+    from sqlalchemy.engine.base import Connection
+
+_INDEX = "ix_data_station_date_wdsp"
+
+
+@pytest.fixture
+def connection() -> Generator[Connection, None, None]:
+    """
+    In-memory database with the schema of the migrations and a few rows
+    """
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        create_tables(connection)
+        connection.exec_driver_sql(
+            "INSERT INTO info (station_id, name, latitude, longitude, country) "
+            "VALUES ('54511099999', 'BEIJING', 39.933, 116.283, '中国')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO data (station, date, wdsp) VALUES (?, ?, ?)",
+            [
+                ("54511099999", f"2023-01-{day:02d}", None if day % 3 else 2.5)
+                for day in range(1, 29)
+            ],
+        )
+        apply_non_spatial_migrations(connection)
+        yield connection
+    engine.dispose()
+
+
+def _data_plans(profiler: Profiler) -> list[str]:
+    """
+    Query plans of the statements reading `data`
+    """
+    return [
+        "\n".join(plan)
+        for statement, plan in profiler.plans.items()
+        if "FROM data" in statement
+    ]
+
+
+@pytest.mark.parametrize("include_null_wdsp", [False, True])
+def test_lookup_seeks_partial_index(
+    connection: Connection, configure: Callable[..., Any], include_null_wdsp: bool
+) -> None:
+    """"""
+    from noaa_trig import _TrigSearchEngine
+
+    configure(db_url="sqlite://")
+    search_engine = _TrigSearchEngine(
+        lat=39.9, lon=116.3, date=datetime.date(2023, 1, 14)
+    )
+    with Profiler(explain=True) as profiler:
+        search_engine.lookup(connection, include_null_wdsp=include_null_wdsp)
+    plans = _data_plans(profiler)
+    assert plans
+    for plan in plans:
+        assert (_INDEX in plan) is not include_null_wdsp, plan
+
+
+@pytest.mark.parametrize("include_null_wdsp", [False, True])
+def test_search_data_seeks_partial_index(
+    connection: Connection, configure: Callable[..., Any], include_null_wdsp: bool
+) -> None:
+    """"""
+    from noaa_trig import _TrigSearchEngine
+
+    configure(db_url="sqlite://")
+    search_engine = _TrigSearchEngine(
+        lat=39.9, lon=116.3, date=datetime.date(2023, 1, 14)
+    )
+    with Profiler(explain=True) as profiler, Session(connection) as session:
+        data = search_engine.search_data(
+            session, "54511099999", include_null_wdsp=include_null_wdsp
+        )
+    assert data.wdsp is not None or include_null_wdsp
+    plans = _data_plans(profiler)
+    assert plans
+    for plan in plans:
+        assert (_INDEX in plan) is not include_null_wdsp, plan
@@ -0,0 +1,44 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import http.client
+import json
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+from utils.server import LookupHTTPServer, LookupService
+
+if TYPE_CHECKING:
+    from typing import Any
+
+
+class _FailingService(LookupService):
+    """"""
+
+    def lookup(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        """"""
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_unexpected_error_answers_json() -> None:
+    """"""
+    service = _FailingService(object)  # type: ignore[arg-type]
+    server = LookupHTTPServer(("127.0.0.1", 0), service, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+        for _ in range(2):
+            # The connection is kept alive across the failure
+            connection.request("GET", "/lookup?lat=39.9&lon=116.3")
+            response = connection.getresponse()
+            assert response.status == 500
+            assert json.loads(response.read()) == {
+                "error": "OperationalError: database is locked"
+            }
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
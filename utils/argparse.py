@@ -2,11 +2,44 @@ from __future__ import annotations
 
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
+from typing import Optional
 
+from .region import Region
 
-class _Args(Namespace):
-    path: Path
+
+class _RegionArgs(Namespace):
+    countries: list[str]
+    provinces: list[str]
+    everywhere: bool
+
+    def get_region(self) -> Optional[Region]:
+        """
+        Region given on the command line, `None` to keep the one of `config.yml`
+        """
+        if self.everywhere:
+            return Region()
+        if self.countries or self.provinces:
+            return Region(tuple(self.countries), tuple(self.provinces))
+        return None
+
+
+class _Args(_RegionArgs):
+    paths: list[str]
+    files_from: Optional[Path]
     include_null_wdsp: bool
+    k: int
+    max_days_gap: Optional[int]
+    full_exif: bool
+    no_exif_cache: bool
+    clear_exif_cache: bool
+    no_lookup_cache: bool
+    jobs: Optional[int]
+    chunk_size: Optional[int]
+    format: str
+    output: Optional[Path]
+    profile: bool
+    stats: Optional[Path]
+    explain: bool
 
 
 def _valid_path(path_str: str) -> Path:
@@ -16,11 +49,166 @@ def _valid_path(path_str: str) -> Path:
     return path
 
 
+def _positive_int(value_str: str) -> int:
+    value = int(value_str)
+    if value < 1:
+        raise ValueError(f'"{value_str}" is not a positive integer')
+    return value
+
+
+def _non_negative_int(value_str: str) -> int:
+    value = int(value_str)
+    if value < 0:
+        raise ValueError(f'"{value_str}" is negative')
+    return value
+
+
+def _add_region_arguments(parser: ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--country",
+        dest="countries",
+        action="append",
+        default=[],
+        help="Only search the stations of this country (repeatable)",
+    )
+    group.add_argument(
+        "--global",
+        dest="everywhere",
+        action="store_true",
+        help="Search every station, ignoring config.yml and --province",
+    )
+    parser.add_argument(
+        "--province",
+        dest="provinces",
+        action="append",
+        default=[],
+        help="Only search the stations of this province (repeatable)",
+    )
+
+
 def parse_argv() -> _Args:
     """"""
     parser = ArgumentParser()
 
-    parser.add_argument("path", type=_valid_path, help="Picture path")
+    parser.add_argument(
+        "paths", nargs="*", help="Picture paths, directories or glob patterns"
+    )
+    parser.add_argument(
+        "--files-from",
+        type=_valid_path,
+        help="File listing one picture path per line",
+    )
     parser.add_argument("--include-null-wdsp", action="store_true")
+    parser.add_argument(
+        "-k",
+        "--stations",
+        dest="k",
+        type=_positive_int,
+        default=1,
+        help="Fall back to the k nearest stations when nearer ones have no data",
+    )
+    parser.add_argument(
+        "--max-days-gap",
+        type=_non_negative_int,
+        help="Only accept data this many days away from the picture date",
+    )
+    _add_region_arguments(parser)
+    parser.add_argument(
+        "--full-exif",
+        action="store_true",
+        help="Parse every Exif tag instead of only the GPS and datetime ones",
+    )
+    parser.add_argument(
+        "--no-exif-cache", action="store_true", help="Bypass the Exif cache"
+    )
+    parser.add_argument(
+        "--clear-exif-cache",
+        action="store_true",
+        help="Empty the Exif cache before reading any picture",
+    )
+
+    parser.add_argument(
+        "--no-lookup-cache",
+        action="store_true",
+        help="Search the database even for positions and dates looked up before",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Processes parsing Exif in batch mode (default from config.yml)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help="Pictures searched per database round trip in batch mode",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("csv", "jsonl"),
+        default="csv",
+        help="Batch mode output format",
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, help="Batch mode output file instead of stdout"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent per stage and per SQL statement to stderr",
+    )
+    parser.add_argument(
+        "--stats", type=Path, help='Write the same timings as JSON to a file, or "-"'
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Also capture the query plan of every distinct SQL statement",
+    )
+
+    args = parser.parse_args(namespace=_Args())
+    if not args.paths and args.files_from is None and not args.clear_exif_cache:
+        parser.error("at least one path or --files-from is required")
+    return args
+
+
+class _ServerArgs(_RegionArgs):
+    engine: str
+    host: Optional[str]
+    port: Optional[int]
+    socket: Optional[Path]
+    full_exif: bool
+    no_lookup_cache: bool
+    quiet: bool
+
+
+def parse_server_argv() -> _ServerArgs:
+    """"""
+    parser = ArgumentParser()
+
+    parser.add_argument(
+        "--engine",
+        choices=("trig", "index", "gis", "snapshot", "raster", "compact"),
+        default="index",
+        help="Search engine answering the lookups",
+    )
+    _add_region_arguments(parser)
+    parser.add_argument("--host", help="Address to listen on (default from config.yml)")
+    parser.add_argument("--port", type=int, help="Port to listen on")
+    parser.add_argument(
+        "--socket", type=Path, help="Listen on this Unix socket instead of TCP"
+    )
+    parser.add_argument(
+        "--full-exif",
+        action="store_true",
+        help="Parse every Exif tag instead of only the GPS and datetime ones",
+    )
+    parser.add_argument(
+        "--no-lookup-cache",
+        action="store_true",
+        help="Search the database even for positions and dates looked up before",
+    )
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
 
-    return parser.parse_args(namespace=_Args())
+    return parser.parse_args(namespace=_ServerArgs())
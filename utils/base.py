@@ -3,26 +3,36 @@
 from __future__ import annotations
 
 import datetime
+import math as m
+import sys
 from abc import ABC, abstractmethod
-from contextlib import contextmanager
-from typing import TYPE_CHECKING, Any, Generic, TypeVar
-
-from sqlalchemy import create_engine
-from sqlalchemy import func as f
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, NamedTuple, TypeVar
 
+# SQLAlchemy and the modules built on it are imported where they are used, so that
+# importing this module does not load them
 from .argparse import parse_argv
 from .config import CONFIG
 from .exif import Exif
+from .profiling import Profiler, stage
+from .region import Region
+from .shards import ShardSet
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
-    from typing import Optional
+    from collections.abc import Generator, Iterable, Sequence
+    from typing import Optional, Union
 
-    from sqlalchemy.engine.base import Engine
-    from sqlalchemy.sql.elements import SQLCoreOperations
+    from sqlalchemy.engine import Row
+    from sqlalchemy.engine.base import Connection, Engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.sql.elements import ColumnElement, SQLCoreOperations
+    from sqlalchemy.sql.selectable import Select
 
+    from utils.argparse import _Args
+    from utils.batch import BatchSearchEngine, Photo
+    from utils.exif_cache import ExifCache
+    from utils.lookup_cache import LookupCache
     from utils.models_base import DataMixin, StationInfoMixin
 
 
@@ -35,83 +45,973 @@ _SearchEngine = TypeVar(
 )
 
 
+class LookupRecord(NamedTuple):
+    """
+    Plain result of `BaseSearchEngine.lookup`, read straight from one Core row.
+    `station_rank` is 1 for the nearest station, and `days_gap` the number of days
+    between the picture and the data row
+    """
+
+    station: str
+    station_name: Optional[str]
+    date: datetime.date
+    wdsp: Optional[float]
+    distance_km: Optional[float]
+    station_rank: int = 1
+    days_gap: Optional[int] = None
+
+
 class BaseSearchEngine(ABC, Generic[_DataModel, _StationInfoModel]):
     """"""
 
     lat: float
     lon: float
     date: datetime.date
+    cache: Optional[LookupCache]
     engine: Engine
 
     DataModel: type[_DataModel]
     StationInfoModel: type[_StationInfoModel]
 
+    # Initial half-size of the bounding box around the photo, in degrees of arc
+    BOX_RADIUS = 0.5
+    # Stations searched, `None` for the `region` of `config.yml`; see `scoped`
+    region: ClassVar[Optional[Region]] = None
+
+    _scoped: ClassVar[dict[tuple[type, Region], type]] = {}
+    _lookup_stmts: ClassVar[dict[tuple[type, bool], Select[tuple[Any, ...]]]] = {}
+    _nearest_stmts: ClassVar[dict[tuple[type, bool], Select[tuple[Any, ...]]]] = {}
+    _exact_stmts: ClassVar[dict[tuple[type, bool], Select[tuple[Any, ...]]]] = {}
+
     def __init__(
-        self, *, lat: float, lon: float, date: Optional[datetime.date] = None
+        self,
+        *,
+        lat: float,
+        lon: float,
+        date: Optional[datetime.date] = None,
+        cache: Optional[LookupCache] = None,
     ) -> None:
         self.lat = lat
         self.lon = lon
         self.date = datetime.date.today() if date is None else date
-        self.engine = create_engine(CONFIG.db_url)
+        self.cache = cache
+        self.engine = self.get_engine()
+
+    @classmethod
+    def get_engine(cls) -> Engine:
+        """"""
+        from .engine import get_engine
+
+        return get_engine()
+
+    @classmethod
+    def get_shards(cls) -> Optional[ShardSet]:
+        """"""
+        return ShardSet.from_config()
+
+    @classmethod
+    def get_region(cls) -> Region:
+        """"""
+        return Region.from_config() if cls.region is None else cls.region
+
+    @classmethod
+    def scoped(cls: type[_SearchEngine], region: Region) -> type[_SearchEngine]:
+        """
+        Subclass searching the stations of `region`, created once per class and
+        region so that its statements and station lists are also built once
+        """
+        key = (cls, region)
+        scoped = cls._scoped.get(key)
+        if scoped is None:
+            scoped = cls._scoped[key] = type(cls.__name__, (cls,), {"region": region})
+        return scoped
 
     @contextmanager
     def get_session(self) -> Generator[Session, None, None]:
+        from sqlalchemy.orm import Session
+
         with Session(self.engine) as session:
             with session.begin():
                 yield session
 
+    @contextmanager
+    def get_connection(self) -> Generator[Connection, None, None]:
+        with stage("connect"):
+            connection = self.engine.connect()
+        with connection:
+            yield connection
+
     def search(
-        self, session: Session, *, include_null_wdsp: bool = False
+        self,
+        session: Session,
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
     ) -> _DataModel:
-        stations_stmt = select(self.StationInfoModel).where(
-            self.StationInfoModel.country == "中国",
-            self.StationInfoModel.latitude.is_not(None),
-            self.StationInfoModel.longitude.is_not(None),
-        )
-        station_stmt = stations_stmt.order_by(self.get_distance_comp()).limit(1)
-        station = session.scalars(station_stmt).first()
-        if station is None:
-            raise ValueError("No station found")
-        data_stmt = select(self.DataModel).where(self.DataModel.station_info == station)
-        if not include_null_wdsp:
-            data_stmt = data_stmt.where(self.DataModel.wdsp.is_not(None))
-        data_stmt = data_stmt.order_by(self.get_day_comp()).limit(1)
-        data = session.scalars(data_stmt).first()
-        if data is None:
-            raise ValueError("No data found")
+        """
+        Data row of the nearest station closest to the date. With `k` or
+        `max_days_gap`, the row of the nearest of the `k` nearest stations having
+        one within `max_days_gap` days, as picked by `lookup`
+        """
+        self._check_date()
+        if k > 1 or max_days_gap is not None:
+            record = self.lookup_nearest(
+                session,
+                include_null_wdsp=include_null_wdsp,
+                k=k,
+                max_days_gap=max_days_gap,
+            )
+            data = self._get_data(session, record.station, record.date)
+            assert data is not None
+            return data
+        with stage("station"):
+            station_id = self.get_station_id(
+                session, include_null_wdsp=include_null_wdsp
+            )
+        with stage("data"):
+            return self._search_cached_data(
+                session, station_id, include_null_wdsp=include_null_wdsp
+            )
+
+    def _search_cached_data(
+        self, session: Session, station_id: str, *, include_null_wdsp: bool
+    ) -> _DataModel:
+        """"""
+        if self.cache is None:
+            return self.search_data(
+                session, station_id, include_null_wdsp=include_null_wdsp
+            )
+        data_date = self.cache.get_date(station_id, self.date, include_null_wdsp)
+        if data_date is not None:
+            data = self._get_data(session, station_id, data_date)
+            if data is not None:
+                return data
+        data = self.search_data(
+            session, station_id, include_null_wdsp=include_null_wdsp
+        )
+        self.cache.put_date(station_id, self.date, include_null_wdsp, data.date)
         return data
 
+    def lookup(
+        self,
+        connection: Connection,
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> LookupRecord:
+        """
+        Same answer as `search` from a single Core statement, without building ORM
+        instances, loading `station_info` or computing the distance again in Python
+        """
+        self._check_date()
+        if k > 1 or max_days_gap is not None:
+            return self.lookup_nearest(
+                connection,
+                include_null_wdsp=include_null_wdsp,
+                k=k,
+                max_days_gap=max_days_gap,
+            )
+        with stage("station"):
+            station_id = self.get_station_id(
+                connection, include_null_wdsp=include_null_wdsp
+            )
+        with stage("data"):
+            row = self._lookup_cached_data(
+                connection, station_id, include_null_wdsp=include_null_wdsp
+            )
+        if row is None:
+            raise ValueError("No data found")
+        return LookupRecord(*row, days_gap=abs((row.date - self.date).days))
+
+    def lookup_nearest(
+        self,
+        session: Union[Session, Connection],
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> LookupRecord:
+        """
+        Best row among the `k` nearest stations: the nearest station having a row
+        within `max_days_gap` days (any row when `None`), then the closest date
+        """
+        self._check_date()
+        with stage("nearest"):
+            row = self._execute_data(
+                session,
+                self.get_nearest_stmt(include_null_wdsp=include_null_wdsp),
+                {
+                    "k": k,
+                    "max_days_gap": max_days_gap,
+                    "date": self.date,
+                    "lat": self.lat,
+                    "lon": self.lon,
+                },
+                max_days_gap=max_days_gap,
+            )
+        if row is None:
+            if max_days_gap is None:
+                raise ValueError("No data found")
+            raise ValueError(
+                f"No data found within {max_days_gap} days "
+                f"at the {k} nearest stations"
+            )
+        return LookupRecord(*row)
+
+    @classmethod
+    def lookup_batch(
+        cls,
+        photos: Sequence[Photo],
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> list[Optional[LookupRecord]]:
+        """
+        `lookup` for many photos at once, `None` for photos that cannot be resolved
+        """
+        from .batch import BatchSearchEngine
+
+        batch = BatchSearchEngine(cls)
+        if k == 1 and max_days_gap is None:
+            shards = cls.get_shards()
+            if shards is not None:
+                return cls._lookup_batch_sharded(
+                    batch, shards, photos, include_null_wdsp=include_null_wdsp
+                )
+            with batch.get_session() as session:
+                return batch.lookup(
+                    session, photos, include_null_wdsp=include_null_wdsp
+                )
+        # The fallback query is per photo; they still share one connection
+        results: list[Optional[LookupRecord]] = []
+        with batch.get_session() as session:
+            for photo in photos:
+                if photo.lat is None or photo.lon is None or photo.date is None:
+                    results.append(None)
+                    continue
+                search_engine = cls(lat=photo.lat, lon=photo.lon, date=photo.date)
+                try:
+                    results.append(
+                        search_engine.lookup_nearest(
+                            session,
+                            include_null_wdsp=include_null_wdsp,
+                            k=k,
+                            max_days_gap=max_days_gap,
+                        )
+                    )
+                except ValueError:
+                    results.append(None)
+        return results
+
+    @classmethod
+    def _lookup_batch_sharded(
+        cls,
+        batch: BatchSearchEngine[Any, Any],
+        shards: ShardSet,
+        photos: Sequence[Photo],
+        *,
+        include_null_wdsp: bool = False,
+    ) -> list[Optional[LookupRecord]]:
+        """
+        `lookup_batch` per group of photos sharing the shards of their date. Photos
+        whose row may not be the closest one, as closer dates are in other shards,
+        are looked up again one by one
+        """
+        results: list[Optional[LookupRecord]] = [None] * len(photos)
+        groups: dict[int, list[int]] = {}
+        for i, photo in enumerate(photos):
+            if photo.date is not None:
+                groups.setdefault(shards.home(photo.date), []).append(i)
+        for home, indexes in groups.items():
+            window = shards.around(home)
+            # Shards cannot be attached while a transaction is open
+            with batch.get_session() as session:
+                shards.attach(session.connection(), window)
+                records = batch.lookup(
+                    session,
+                    [photos[i] for i in indexes],
+                    include_null_wdsp=include_null_wdsp,
+                )
+            for i, record in zip(indexes, records):
+                photo = photos[i]
+                if photo.lat is None or photo.lon is None or photo.date is None:
+                    continue
+                if record is not None and (
+                    record.days_gap is not None
+                    and record.days_gap <= shards.bound_days(window, photo.date)
+                ):
+                    results[i] = record
+                    continue
+                search_engine = cls(lat=photo.lat, lon=photo.lon, date=photo.date)
+                with search_engine.get_connection() as connection:
+                    try:
+                        results[i] = search_engine.lookup(
+                            connection, include_null_wdsp=include_null_wdsp
+                        )
+                    except ValueError:
+                        pass
+        return results
+
+    def _lookup_cached_data(
+        self, connection: Connection, station_id: str, *, include_null_wdsp: bool
+    ) -> Optional[Row[Any]]:
+        """
+        `_lookup_data` through the date cache, like `_search_cached_data`
+        """
+        if self.cache is None:
+            return self._lookup_data(
+                connection, station_id, include_null_wdsp=include_null_wdsp
+            )
+        data_date = self.cache.get_date(station_id, self.date, include_null_wdsp)
+        if data_date is not None:
+            shards = self.get_shards()
+            if shards is not None:
+                shards.attach(connection, shards.window(data_date))
+            row = connection.execute(
+                self.get_exact_stmt(include_null_wdsp=include_null_wdsp),
+                {
+                    "station_id": station_id,
+                    "date": data_date,
+                    "lat": self.lat,
+                    "lon": self.lon,
+                },
+            ).first()
+            if row is not None:
+                return row
+        row = self._lookup_data(
+            connection, station_id, include_null_wdsp=include_null_wdsp
+        )
+        if row is not None:
+            self.cache.put_date(station_id, self.date, include_null_wdsp, row.date)
+        return row
+
+    def _lookup_data(
+        self,
+        session: Union[Session, Connection],
+        station_id: str,
+        *,
+        include_null_wdsp: bool = False,
+    ) -> Optional[Row[Any]]:
+        """"""
+        return self._execute_data(
+            session,
+            self.get_lookup_stmt(include_null_wdsp=include_null_wdsp),
+            {
+                "station_id": station_id,
+                "date": self.date,
+                "lat": self.lat,
+                "lon": self.lon,
+            },
+        )
+
+    def _execute_data(
+        self,
+        session: Union[Session, Connection],
+        stmt: Select[tuple[Any, ...]],
+        params: dict[str, Any],
+        *,
+        max_days_gap: Optional[int] = None,
+    ) -> Optional[Row[Any]]:
+        """
+        First row of a statement ranking data rows by station rank then distance to
+        `self.date`. With sharded `data`, it runs on the shard of the date and its
+        neighbours, and on the other shards only when they may hold a better row
+        """
+        from sqlalchemy.orm import Session
+
+        shards = self.get_shards()
+        if shards is None:
+            return session.execute(stmt, params).first()
+        connection = session.connection() if isinstance(session, Session) else session
+        window = shards.window(self.date)
+        shards.attach(connection, window)
+        best = connection.execute(stmt, params).first()
+        bound = shards.bound_days(window, self.date)
+        if max_days_gap is not None and max_days_gap <= bound:
+            return best
+        if best is not None:
+            rank, days_gap, _ = self._rank_row(best)
+            if rank == 1 and days_gap <= bound:
+                return best
+        for chunk in shards.chunks(self.date):
+            distance = shards.distance_days(chunk, self.date)
+            if max_days_gap is not None and distance > max_days_gap:
+                continue
+            if best is not None:
+                # Rows of the nearest station are only beaten by closer dates
+                rank, days_gap, _ = self._rank_row(best)
+                if rank == 1 and days_gap < distance:
+                    continue
+            shards.attach(connection, chunk)
+            row = connection.execute(stmt, params).first()
+            if row is not None and (
+                best is None or self._rank_row(row) < self._rank_row(best)
+            ):
+                best = row
+        return best
+
+    def _check_date(self) -> None:
+        """
+        Refuse dates whose nearest row may be older than the `data` the engine reads
+        """
+        from .engine import get_data_since
+
+        since = get_data_since(self.engine)
+        if since is not None and self.date < since:
+            raise ValueError(
+                f"Only data from {since:%x} on is preloaded: unset "
+                "`sqlite.preload_data_since` to look up earlier dates"
+            )
+
+    def _rank_row(self, row: Row[Any]) -> tuple[int, int, datetime.date]:
+        """
+        Station rank, days from `self.date` and date of a row, in order of preference
+        """
+        date: datetime.date = row.date
+        return getattr(row, "station_rank", 1), abs((date - self.date).days), date
+
+    def _get_data(
+        self, session: Session, station_id: str, date: datetime.date
+    ) -> Optional[_DataModel]:
+        """"""
+        from sqlalchemy import select
+
+        shards = self.get_shards()
+        if shards is not None:
+            shards.attach(session.connection(), shards.window(date))
+        data_stmt = select(self.DataModel).where(
+            self.DataModel.station == station_id, self.DataModel.date == date
+        )
+        return session.scalars(data_stmt).first()
+
+    def get_station_id(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> str:
+        """"""
+        if self.cache is None:
+            return self.search_station(session, include_null_wdsp=include_null_wdsp)
+        engine = type(self).__name__
+        region = self.get_region()
+        station_id = self.cache.get_station(
+            engine, self.lat, self.lon, include_null_wdsp, region
+        )
+        if station_id is None:
+            station_id = self.search_station(
+                session, include_null_wdsp=include_null_wdsp
+            )
+            self.cache.put_station(
+                engine, self.lat, self.lon, include_null_wdsp, region, station_id
+            )
+        return station_id
+
+    @classmethod
+    def get_lookup_stmt(
+        cls, *, include_null_wdsp: bool = False
+    ) -> Select[tuple[Any, ...]]:
+        """
+        Statement of `lookup`, built once per engine class since building it costs
+        more than running it
+        """
+        from sqlalchemy import Date, Float, bindparam
+        from sqlalchemy import func as f
+        from sqlalchemy import select, union_all
+
+        key = (cls, include_null_wdsp)
+        lookup_stmt = cls._lookup_stmts.get(key)
+        if lookup_stmt is not None:
+            return lookup_stmt
+        # Both seeks of `search_data` as one UNION ALL, keeping the closer date
+        # (the earlier one on ties) and joining the station for its name
+        date = bindparam("date", type_=Date)
+        date_key = cls.DataModel.get_date_key(date)
+        data_stmt = select(
+            cls.DataModel.station, cls.DataModel.date, cls.DataModel.wdsp
+        ).where(
+            cls.DataModel.station == bindparam("station_id"),
+            *cls.get_data_filters(include_null_wdsp=include_null_wdsp),
+        )
+        before_stmt = (
+            data_stmt.where(cls.DataModel.date <= date_key)
+            .order_by(cls.DataModel.date.desc())
+            .limit(1)
+            .subquery()
+        )
+        after_stmt = (
+            data_stmt.where(cls.DataModel.date > date_key)
+            .order_by(cls.DataModel.date.asc())
+            .limit(1)
+            .subquery()
+        )
+        candidates = union_all(select(before_stmt), select(after_stmt)).subquery()
+        distance_comp = cls.get_batch_distance_comp(
+            lat=bindparam("lat", type_=Float), lon=bindparam("lon", type_=Float)
+        )
+        lookup_stmt = (
+            select(
+                candidates.c.station,
+                cls.StationInfoModel.name,
+                candidates.c.date,
+                candidates.c.wdsp,
+                distance_comp,
+            )
+            .join_from(
+                candidates,
+                cls.StationInfoModel,
+                cls.StationInfoModel.station_id == candidates.c.station,
+            )
+            .order_by(
+                f.abs(cls.DataModel.get_days_between(candidates.c.date, date)),
+                candidates.c.date,
+            )
+            .limit(1)
+        )
+        cls._lookup_stmts[key] = lookup_stmt
+        return lookup_stmt
+
+    @classmethod
+    def get_exact_stmt(
+        cls, *, include_null_wdsp: bool = False
+    ) -> Select[tuple[Any, ...]]:
+        """
+        Row of `get_lookup_stmt` on exactly `:date`, for dates picked before
+        """
+        from sqlalchemy import Date, Float, bindparam, select
+
+        key = (cls, include_null_wdsp)
+        exact_stmt = cls._exact_stmts.get(key)
+        if exact_stmt is not None:
+            return exact_stmt
+        distance_comp = cls.get_batch_distance_comp(
+            lat=bindparam("lat", type_=Float), lon=bindparam("lon", type_=Float)
+        )
+        exact_stmt = (
+            select(
+                cls.DataModel.station.label("station"),
+                cls.StationInfoModel.name,
+                # Named like the columns of `get_lookup_stmt` whatever the schema
+                cls.DataModel.date.label("date"),
+                cls.DataModel.wdsp.label("wdsp"),
+                distance_comp,
+            )
+            .join_from(
+                cls.DataModel,
+                cls.StationInfoModel,
+                cls.StationInfoModel.station_id == cls.DataModel.station,
+            )
+            .where(
+                cls.DataModel.station == bindparam("station_id"),
+                cls.DataModel.date
+                == cls.DataModel.get_date_key(bindparam("date", type_=Date)),
+                *cls.get_data_filters(include_null_wdsp=include_null_wdsp),
+            )
+        )
+        cls._exact_stmts[key] = exact_stmt
+        return exact_stmt
+
+    @classmethod
+    def get_nearest_stmt(
+        cls, *, include_null_wdsp: bool = False
+    ) -> Select[tuple[Any, ...]]:
+        """
+        Statement of `lookup_nearest`: the `:k` nearest stations, both date seeks of
+        each, and `ROW_NUMBER` over station keeping each station's closest row
+        """
+        from sqlalchemy import Date, Float, Integer, and_, bindparam, cast
+        from sqlalchemy import func as f
+        from sqlalchemy import or_, select, union_all
+
+        key = (cls, include_null_wdsp)
+        nearest_stmt = cls._nearest_stmts.get(key)
+        if nearest_stmt is not None:
+            return nearest_stmt
+        StationInfoModel = cls.StationInfoModel
+        DataModel = cls.DataModel
+        date = bindparam("date", type_=Date)
+        date_key = DataModel.get_date_key(date)
+        max_days_gap = bindparam("max_days_gap", type_=Integer)
+        distance_comp = cls.get_batch_distance_comp(
+            lat=bindparam("lat", type_=Float), lon=bindparam("lon", type_=Float)
+        )
+        stations = (
+            select(
+                StationInfoModel.station_id,
+                StationInfoModel.name,
+                distance_comp.label("distance"),
+            )
+            .where(
+                *cls.get_station_filters(
+                    include_null_wdsp=include_null_wdsp,
+                    date=date,
+                    max_days_gap=max_days_gap,
+                )
+            )
+            .order_by(distance_comp, StationInfoModel.station_id)
+            .limit(bindparam("k"))
+            .subquery()
+        )
+        ranked = select(
+            stations,
+            f.row_number()
+            .over(order_by=(stations.c.distance, stations.c.station_id))
+            .label("station_rank"),
+        ).cte("ranked")
+        dates_stmt = select(DataModel.date).where(
+            DataModel.station == ranked.c.station_id,
+            *cls.get_data_filters(include_null_wdsp=include_null_wdsp),
+        )
+        before = (
+            dates_stmt.where(DataModel.date <= date_key)
+            .order_by(DataModel.date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        after = (
+            dates_stmt.where(DataModel.date > date_key)
+            .order_by(DataModel.date.asc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        seeks = union_all(
+            select(ranked, before.label("date")), select(ranked, after.label("date"))
+        ).subquery()
+        days_gap = cast(f.abs(DataModel.get_days_between(seeks.c.date, date)), Integer)
+        candidates = (
+            select(
+                seeks,
+                days_gap.label("days_gap"),
+                f.row_number()
+                .over(
+                    partition_by=seeks.c.station_id, order_by=(days_gap, seeks.c.date)
+                )
+                .label("row_number"),
+            )
+            .where(
+                seeks.c.date.is_not(None),
+                or_(max_days_gap.is_(None), days_gap <= max_days_gap),
+            )
+            .subquery()
+        )
+        nearest_stmt = (
+            select(
+                candidates.c.station_id,
+                candidates.c.name,
+                candidates.c.date,
+                DataModel.wdsp,
+                candidates.c.distance,
+                candidates.c.station_rank,
+                candidates.c.days_gap,
+            )
+            .join_from(
+                candidates,
+                DataModel,
+                and_(
+                    DataModel.station == candidates.c.station_id,
+                    DataModel.date == candidates.c.date,
+                ),
+            )
+            .where(candidates.c.row_number == 1)
+            .order_by(candidates.c.station_rank)
+            .limit(1)
+        )
+        cls._nearest_stmts[key] = nearest_stmt
+        return nearest_stmt
+
+    def search_station(
+        self, session: Union[Session, Connection], *, include_null_wdsp: bool = False
+    ) -> str:
+        """
+        Nearest station, among those having a usable row when `coverage` is enabled
+        """
+        from sqlalchemy import select
+
+        station_stmt = (
+            select(self.StationInfoModel.station_id)
+            .where(*self.get_station_filters(include_null_wdsp=include_null_wdsp))
+            # Ties broken by station id, like the in-memory engines
+            .order_by(self.get_distance_comp(), self.StationInfoModel.station_id)
+            .limit(1)
+        )
+        station_id = session.scalars(station_stmt).first()
+        if station_id is None:
+            raise ValueError("No station found")
+        return station_id
+
+    def search_data(
+        self, session: Session, station_id: str, *, include_null_wdsp: bool = False
+    ) -> _DataModel:
+        """"""
+        from sqlalchemy import select
+
+        if self.get_shards() is not None:
+            # The date is found across shards first, then the row is read
+            row = self._lookup_data(
+                session, station_id, include_null_wdsp=include_null_wdsp
+            )
+            data = (
+                None if row is None else self._get_data(session, station_id, row.date)
+            )
+            if data is None:
+                raise ValueError("No data found")
+            return data
+        # Two seeks on (station, date) instead of ranking the station's whole history
+        data_stmt = select(self.DataModel).where(
+            self.DataModel.station == station_id,
+            *self.get_data_filters(include_null_wdsp=include_null_wdsp),
+        )
+        before_stmt = (
+            data_stmt.where(self.DataModel.date <= self.date)
+            .order_by(self.DataModel.date.desc())
+            .limit(1)
+        )
+        after_stmt = (
+            data_stmt.where(self.DataModel.date >= self.date)
+            .order_by(self.DataModel.date.asc())
+            .limit(1)
+        )
+        before = session.scalars(before_stmt).first()
+        if before is not None and before.date == self.date:
+            return before
+        after = session.scalars(after_stmt).first()
+        if before is None:
+            if after is None:
+                raise ValueError("No data found")
+            return after
+        if after is None or self.date - before.date <= after.date - self.date:
+            return before
+        return after
+
+    @classmethod
+    def get_data_filters(
+        cls, *, include_null_wdsp: bool = False
+    ) -> tuple[ColumnElement[bool], ...]:
+        """"""
+        if include_null_wdsp:
+            return ()
+        return (cls.DataModel.wdsp.is_not(None),)
+
+    @classmethod
+    def get_station_filters(
+        cls,
+        *,
+        include_null_wdsp: bool = False,
+        date: Optional[ColumnElement[datetime.date]] = None,
+        max_days_gap: Optional[ColumnElement[Optional[int]]] = None,
+    ) -> tuple[ColumnElement[bool], ...]:
+        """
+        Stations of the region worth ranking. With `coverage` enabled, stations
+        without a usable row, or without one within `max_days_gap` days of `date` when
+        both are given, are left out before any distance is computed
+        """
+        filters = (
+            *cls.get_region().get_filters(cls.StationInfoModel),
+            cls.StationInfoModel.latitude.is_not(None),
+            cls.StationInfoModel.longitude.is_not(None),
+        )
+        if not CONFIG.coverage.enabled:
+            return filters
+        from .coverage import has_coverage
+
+        return (
+            *filters,
+            has_coverage(
+                cls.StationInfoModel.station_id,
+                include_null_wdsp=include_null_wdsp,
+                date=date,
+                max_days_gap=max_days_gap,
+            ),
+        )
+
     @abstractmethod
     def get_distance_comp(self) -> SQLCoreOperations[Optional[float]]:
         """"""
         raise NotImplementedError
 
-    def get_day_comp(self) -> SQLCoreOperations[float]:
+    @classmethod
+    @abstractmethod
+    def get_batch_distance_comp(
+        cls, *, lat: ColumnElement[float], lon: ColumnElement[float]
+    ) -> SQLCoreOperations[Optional[float]]:
         """"""
-        return f.abs(f.julianday(self.date) - f.julianday(self.DataModel.date))
+        raise NotImplementedError
+
+    def get_box(self, radius: float) -> Optional[dict[str, float]]:
+        """
+        Latitude/longitude range that contains every point within `radius` degrees of
+        arc from the photo, or `None` if that range wraps around a pole or the
+        antimeridian
+        """
+        if abs(self.lat) + radius >= 90:
+            return None
+        lon_radius = m.degrees(
+            m.asin(min(1.0, m.sin(m.radians(radius)) / m.cos(m.radians(self.lat))))
+        )
+        if abs(self.lon) + lon_radius >= 180:
+            return None
+        return {
+            "lat_min": self.lat - radius,
+            "lat_max": self.lat + radius,
+            "lon_min": self.lon - lon_radius,
+            "lon_max": self.lon + lon_radius,
+        }
 
 
 class BaseRunner(ABC, Generic[_SearchEngine]):
     """"""
 
     SearchEngineClass: type[_SearchEngine]
+    # Set to collect stage and SQL timings of `run` without the command line flags
+    profiler: Optional[Profiler] = None
 
     def run(self) -> None:
         """"""
         args = parse_argv()
-        exif = Exif(args.path)
+        profiler = self.profiler
+        if profiler is None and (args.profile or args.stats or args.explain):
+            profiler = Profiler(explain=args.explain)
+        if profiler is None:
+            self.run_args(args)
+            return
+        with profiler, stage("total"):
+            self.run_args(args)
+        if args.stats is not None:
+            with (
+                nullcontext(sys.stdout)
+                if str(args.stats) == "-"
+                else args.stats.open("wt", encoding="utf-8")
+            ) as stream:
+                stream.write(profiler.to_json() + "\n")
+        if args.profile or (args.explain and args.stats is None):
+            print(profiler.format_table(), file=sys.stderr)
+
+    def run_args(self, args: _Args) -> None:
+        """"""
+        from .exif_cache import ExifCache
+        from .lookup_cache import LookupCache
+
+        region = args.get_region()
+        if region is not None:
+            self.SearchEngineClass = self.SearchEngineClass.scoped(region)
+        if args.clear_exif_cache:
+            with ExifCache.from_config() as exif_cache:
+                exif_cache.clear()
+        if not args.paths and args.files_from is None:
+            return
+        use_exif_cache = CONFIG.exif_cache.enabled and not args.no_exif_cache
+        with ExifCache.from_config() if use_exif_cache else nullcontext() as exif_cache:
+            if args.files_from is None and len(args.paths) == 1:
+                path = Path(args.paths[0])
+                if path.is_file():
+                    use_lookup_cache = (
+                        CONFIG.lookup_cache.enabled and not args.no_lookup_cache
+                    )
+                    with (
+                        LookupCache.from_config() if use_lookup_cache else nullcontext()
+                    ) as lookup_cache:
+                        self.run_single(
+                            path,
+                            include_null_wdsp=args.include_null_wdsp,
+                            k=args.k,
+                            max_days_gap=args.max_days_gap,
+                            fast_exif=not args.full_exif,
+                            exif_cache=exif_cache,
+                            lookup_cache=lookup_cache,
+                        )
+                    return
+            # Batch-only modules are left out of single picture lookups
+            from .batch import iter_photo_paths
+
+            self.run_batch(
+                iter_photo_paths(args.paths, args.files_from),
+                include_null_wdsp=args.include_null_wdsp,
+                k=args.k,
+                max_days_gap=args.max_days_gap,
+                fast_exif=not args.full_exif,
+                exif_cache=exif_cache,
+                jobs=args.jobs,
+                chunk_size=args.chunk_size,
+                output_format=args.format,
+                output=args.output,
+            )
+
+    def run_single(
+        self,
+        path: Path,
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+        fast_exif: bool = True,
+        exif_cache: Optional[ExifCache] = None,
+        lookup_cache: Optional[LookupCache] = None,
+    ) -> None:
+        """"""
+        with stage("exif"):
+            exif_record = Exif(path, fast=fast_exif, cache=exif_cache).record
+            lat, lon = exif_record.get_lat(), exif_record.get_lon()
+            taken_at = exif_record.get_datetime()
+        print(
+            f"The picture is taken at date={taken_at:%x}, time={taken_at:%X}, "
+            f"lat={lat:.3f}, lon={lon:.3f}"
+        )
+        with stage("engine"):
+            runner = self.SearchEngineClass(
+                lat=lat, lon=lon, date=taken_at.date(), cache=lookup_cache
+            )
+        with runner.get_connection() as connection:
+            record = runner.lookup(
+                connection,
+                include_null_wdsp=include_null_wdsp,
+                k=k,
+                max_days_gap=max_days_gap,
+            )
         print(
-            f"The picture is taken at date={exif.date:%x}, time={exif.datetime:%X}, "
-            f"lat={exif.lat:.3f}, lon={exif.lon:.3f}"
+            f'The wind speed is {"not available" if record.wdsp is None else record.wdsp} '
+            f'for "{record.station_name or record.station or "closest"}" '
+            f"station on {record.date:%x}"
         )
-        runner = self.SearchEngineClass(lat=exif.lat, lon=exif.lon, date=exif.date)
-        with runner.get_session() as session:
-            data = runner.search(session, include_null_wdsp=args.include_null_wdsp)
+        if record.distance_km is not None:
+            print(f"The distance to the station is {record.distance_km:,.3f} km")
+        if record.station_rank > 1:
             print(
-                f'The wind speed is {"not available" if data.wdsp is None else data.wdsp} '
-                f'for "{data.station_info.name or data.station or "closest"}" '
-                f"station on {data.date:%x}"
+                "Nearer stations have no usable data, this is nearest station "
+                f"#{record.station_rank}"
             )
-            distance = data.station_info.get_distance(lat=exif.lat, lon=exif.lon)
-            if distance is not None:
-                print(f"The distance to the station is {distance:,.3f} km")
+
+    def run_batch(
+        self,
+        paths: Iterable[Path],
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+        fast_exif: bool = True,
+        exif_cache: Optional[ExifCache] = None,
+        jobs: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        output_format: str = "csv",
+        output: Optional[Path] = None,
+    ) -> None:
+        """"""
+        from .pipeline import BatchPipeline, get_writer
+
+        config = CONFIG.pipeline
+        pipeline = BatchPipeline(
+            self.SearchEngineClass,
+            jobs=config.jobs if jobs is None else jobs,
+            chunk_size=config.chunk_size if chunk_size is None else chunk_size,
+            queue_size=config.queue_size,
+            include_null_wdsp=include_null_wdsp,
+            k=k,
+            max_days_gap=max_days_gap,
+            fast_exif=fast_exif,
+            exif_cache=exif_cache,
+        )
+        with (
+            nullcontext(sys.stdout)
+            if output is None
+            else output.open("wt", encoding="utf-8", newline="")
+        ) as stream:
+            pipeline.run(paths, get_writer(output_format, stream))
@@ -0,0 +1,301 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+import glob
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from sqlalchemy import (
+    Column,
+    Date,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    case,
+    delete,
+)
+from sqlalchemy import func as f
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from .base import LookupRecord
+from .engine import get_data_since
+from .exif import Exif
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable, Iterator, Sequence
+    from typing import Optional
+
+    from sqlalchemy.engine.base import Engine
+    from sqlalchemy.sql.elements import ColumnElement
+
+    from utils.base import BaseSearchEngine
+    from utils.exif import ExifRecord
+    from utils.exif_cache import ExifCache
+    from utils.models_base import DataMixin, StationInfoMixin
+
+
+_DataModel = TypeVar("_DataModel", bound="DataMixin[Any]", covariant=True)
+_StationInfoModel = TypeVar(
+    "_StationInfoModel", bound="StationInfoMixin[Any]", covariant=True
+)
+
+PHOTO_SUFFIXES = frozenset(
+    {".jpg", ".jpeg", ".heic", ".heif", ".tif", ".tiff", ".png", ".webp"}
+)
+
+_photo_table = Table(
+    "batch_photo",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("latitude", Float, nullable=False),
+    Column("longitude", Float, nullable=False),
+    Column("date", Date, nullable=False),
+    Column("station", String(12), nullable=True),
+    Column("before_date", Date, nullable=True),
+    Column("after_date", Date, nullable=True),
+    prefixes=["TEMPORARY"],
+)
+
+
+def _iter_dir(path: Path) -> Iterator[Path]:
+    """"""
+    for child in sorted(path.rglob("*")):
+        if child.suffix.lower() in PHOTO_SUFFIXES and child.is_file():
+            yield child
+
+
+def iter_photo_paths(
+    patterns: Iterable[str], files_from: Optional[Path] = None
+) -> Iterator[Path]:
+    """"""
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_file():
+            yield path
+        elif path.is_dir():
+            yield from _iter_dir(path)
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                raise ValueError(f'"{pattern}" does not match any file')
+            for match in map(Path, matches):
+                if match.is_dir():
+                    yield from _iter_dir(match)
+                elif match.is_file():
+                    yield match
+    if files_from is not None:
+        with files_from.open("rt") as f:
+            for line in f:
+                if line := line.strip():
+                    yield Path(line)
+
+
+@dataclass(frozen=True)
+class Photo:
+    """"""
+
+    path: Path
+    datetime: Optional[datetime.datetime] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_path(
+        cls,
+        path: Path,
+        *,
+        fast_exif: bool = True,
+        exif_cache: Optional[ExifCache] = None,
+    ) -> Photo:
+        """"""
+        try:
+            record = Exif(path, fast=fast_exif, cache=exif_cache).record
+        # A single unreadable picture must not abort the whole batch
+        except Exception as err:
+            return cls(path, error=str(err) or type(err).__name__)
+        return cls.from_record(path, record)
+
+    @classmethod
+    def from_record(cls, path: Path, record: ExifRecord) -> Photo:
+        """"""
+        try:
+            return cls(
+                path,
+                datetime=record.get_datetime(),
+                lat=record.get_lat(),
+                lon=record.get_lon(),
+            )
+        except ValueError as err:
+            return cls(path, error=str(err))
+
+    @property
+    def date(self) -> Optional[datetime.date]:
+        """"""
+        return None if self.datetime is None else self.datetime.date()
+
+
+class BatchSearchEngine(Generic[_DataModel, _StationInfoModel]):
+    """"""
+
+    engine: Engine
+
+    SearchEngineClass: type[BaseSearchEngine[_DataModel, _StationInfoModel]]
+
+    def __init__(
+        self, SearchEngineClass: type[BaseSearchEngine[_DataModel, _StationInfoModel]]
+    ) -> None:
+        self.SearchEngineClass = SearchEngineClass
+        self.engine = SearchEngineClass.get_engine()
+
+    @contextmanager
+    def get_session(self) -> Generator[Session, None, None]:
+        with Session(self.engine) as session:
+            with session.begin():
+                yield session
+
+    def lookup(
+        self,
+        session: Session,
+        photos: Sequence[Photo],
+        *,
+        include_null_wdsp: bool = False,
+    ) -> list[Optional[LookupRecord]]:
+        """
+        Resolve the nearest station and the nearest-date data for every photo: one
+        station search per distinct point, then one INSERT, one UPDATE and one
+        SELECT over a temporary table instead of several queries per photo. Photos
+        without coordinates or date resolve to `None`
+        """
+        DataModel = self.SearchEngineClass.DataModel
+        StationInfoModel = self.SearchEngineClass.StationInfoModel
+        photo = _photo_table
+        results: list[Optional[LookupRecord]] = [None] * len(photos)
+        if not self._resolve(session, photos, include_null_wdsp=include_null_wdsp):
+            return results
+        lookup_stmt = (
+            select(
+                photo.c.id,
+                DataModel.station,
+                StationInfoModel.name,
+                DataModel.date,
+                DataModel.wdsp,
+                self.SearchEngineClass.get_batch_distance_comp(
+                    lat=photo.c.latitude, lon=photo.c.longitude
+                ),
+            )
+            .select_from(photo)
+            .join(
+                DataModel,
+                and_(
+                    DataModel.station == photo.c.station,
+                    DataModel.date == self._get_date_comp(DataModel),
+                ),
+            )
+            .join(StationInfoModel, StationInfoModel.station_id == DataModel.station)
+        )
+        for photo_id, *values in session.execute(lookup_stmt):
+            record = LookupRecord(*values)
+            date = photos[photo_id].date
+            assert date is not None
+            results[photo_id] = record._replace(days_gap=abs((record.date - date).days))
+        return results
+
+    def _resolve(
+        self,
+        session: Session,
+        photos: Sequence[Photo],
+        *,
+        include_null_wdsp: bool = False,
+    ) -> bool:
+        """
+        Fill the temporary table with the photos, their station and both candidate
+        dates. Return whether any photo can be searched at all
+        """
+        DataModel = self.SearchEngineClass.DataModel
+        photo = _photo_table
+
+        connection = session.connection()
+        photo.create(connection, checkfirst=True)
+        session.execute(delete(photo))
+        # Stations come from the engine's own search (bounding box, KD-tree, raster
+        # or R*Tree), once per distinct point, instead of a correlated UPDATE ranking
+        # every station of the region for every photo
+        search_engine = self.SearchEngineClass(lat=0, lon=0)
+        # Photos older than a hot preload are left unresolved, as in `_check_date`
+        since = get_data_since(self.engine)
+        stations: dict[tuple[float, float], Optional[str]] = {}
+        rows: list[dict[str, Any]] = []
+        for i, p in enumerate(photos):
+            if p.lat is None or p.lon is None or p.date is None:
+                continue
+            if since is not None and p.date < since:
+                continue
+            point = (p.lat, p.lon)
+            if point not in stations:
+                search_engine.lat, search_engine.lon = point
+                try:
+                    stations[point] = search_engine.search_station(
+                        session, include_null_wdsp=include_null_wdsp
+                    )
+                except ValueError:
+                    stations[point] = None
+            rows.append(
+                {
+                    "id": i,
+                    "latitude": p.lat,
+                    "longitude": p.lon,
+                    "date": p.date,
+                    "station": stations[point],
+                }
+            )
+        if not rows:
+            return False
+        session.execute(insert(photo), rows)
+
+        # Two correlated seeks on (station, date) per photo, then keep the closer
+        date_key = DataModel.get_date_key(photo.c.date)
+        dates_stmt = select(DataModel.date).where(
+            DataModel.station == photo.c.station,
+            *self.SearchEngineClass.get_data_filters(
+                include_null_wdsp=include_null_wdsp
+            ),
+        )
+        session.execute(
+            update(photo).values(
+                before_date=dates_stmt.where(DataModel.date <= date_key)
+                .order_by(DataModel.date.desc())
+                .limit(1)
+                .scalar_subquery(),
+                after_date=dates_stmt.where(DataModel.date >= date_key)
+                .order_by(DataModel.date.asc())
+                .limit(1)
+                .scalar_subquery(),
+            )
+        )
+        return True
+
+    @staticmethod
+    def _get_date_comp(DataModel: type[DataMixin[Any]]) -> ColumnElement[Any]:
+        """
+        The closer of both candidate dates, as values of `DataModel.date`
+        """
+        photo = _photo_table
+        return case(
+            (photo.c.after_date.is_(None), photo.c.before_date),
+            (photo.c.before_date.is_(None), photo.c.after_date),
+            (
+                -DataModel.get_days_between(photo.c.before_date, photo.c.date)
+                <= DataModel.get_days_between(photo.c.after_date, photo.c.date),
+                photo.c.before_date,
+            ),
+            else_=photo.c.after_date,
+        )
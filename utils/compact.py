@@ -0,0 +1,150 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Integer, cast, column
+from sqlalchemy import func as f
+from sqlalchemy import insert, select, table
+
+from .schema import FLOAT_COLUMNS
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine.base import Connection
+    from sqlalchemy.sql.selectable import Select
+
+__all__ = [
+    "DATA_COMPACT_DDL",
+    "DATA_VIEW_DDL",
+    "EPOCH_JULIAN_DAY",
+    "INFO_KEY_DDL",
+    "convert_to_compact",
+    "data_compact_table",
+    "data_table",
+    "from_compact_select",
+    "info_keys_table",
+    "is_compact",
+    "to_compact_select",
+]
+
+# Julian day of 1970-01-01, from which `data_compact.day` counts
+EPOCH_JULIAN_DAY = 2440587.5
+_COLUMNS = (*FLOAT_COLUMNS, "frshtt")
+
+
+def _day(date: str) -> str:
+    """"""
+    return f"CAST(julianday({date}) - {EPOCH_JULIAN_DAY} AS INTEGER)"
+
+
+def _station_int(station: str) -> str:
+    """"""
+    return f"(SELECT station_int FROM info WHERE station_id = {station})"
+
+
+data_table = table("data", column("station"), column("date"), *map(column, _COLUMNS))
+data_compact_table = table(
+    "data_compact", column("station_int"), column("day"), *map(column, _COLUMNS)
+)
+info_keys_table = table("info", column("station_id"), column("station_int"))
+
+# `info.station_int` is the rowid of the station when it was added
+INFO_KEY_DDL = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_info_station_int ON info (station_int)",
+    "CREATE TRIGGER IF NOT EXISTS info_station_int AFTER INSERT ON info "
+    "WHEN NEW.station_int IS NULL BEGIN "
+    "UPDATE info SET station_int = NEW.rowid WHERE rowid = NEW.rowid; END",
+)
+# Clustered on (station, day) with the values in the leaves: no rowid B-tree, and
+# 2 small integers instead of 12 characters and an ISO date in every key
+DATA_COMPACT_DDL = (
+    "CREATE TABLE IF NOT EXISTS data_compact ("
+    "station_int INTEGER NOT NULL REFERENCES info (station_int), "
+    "day INTEGER NOT NULL, "
+    f"{', '.join(f'{name} FLOAT' for name in FLOAT_COLUMNS)}, "
+    "frshtt INTEGER, "
+    "PRIMARY KEY (station_int, day)) WITHOUT ROWID"
+)
+# `data` as before for everything written in SQL, such as ingests, shards, snapshot
+# exports and coverage refreshes, while the compact models read `data_compact`
+DATA_VIEW_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_data_compact_wdsp ON data_compact "
+    "(station_int, day) WHERE wdsp IS NOT NULL",
+    "CREATE VIEW IF NOT EXISTS data AS "
+    f"SELECT info.station_id AS station, date(day + {EPOCH_JULIAN_DAY}) AS date, "
+    f"{', '.join(f'data_compact.{name} AS {name}' for name in _COLUMNS)} "
+    "FROM data_compact JOIN info ON info.station_int = data_compact.station_int",
+    "CREATE TRIGGER IF NOT EXISTS data_insert INSTEAD OF INSERT ON data BEGIN "
+    "SELECT RAISE(ABORT, 'Unknown station') "
+    "WHERE NOT EXISTS (SELECT 1 FROM info WHERE station_id = NEW.station); "
+    f"INSERT OR REPLACE INTO data_compact (station_int, day, {', '.join(_COLUMNS)}) "
+    f"VALUES ({_station_int('NEW.station')}, {_day('NEW.date')}, "
+    f"{', '.join(f'NEW.{name}' for name in _COLUMNS)}); END",
+    "CREATE TRIGGER IF NOT EXISTS data_update INSTEAD OF UPDATE ON data BEGIN "
+    f"UPDATE data_compact SET station_int = {_station_int('NEW.station')}, "
+    f"day = {_day('NEW.date')}, "
+    f"{', '.join(f'{name} = NEW.{name}' for name in _COLUMNS)} "
+    f"WHERE station_int = {_station_int('OLD.station')} "
+    f"AND day = {_day('OLD.date')}; END",
+    "CREATE TRIGGER IF NOT EXISTS data_delete INSTEAD OF DELETE ON data BEGIN "
+    f"DELETE FROM data_compact WHERE station_int = {_station_int('OLD.station')} "
+    f"AND day = {_day('OLD.date')}; END",
+)
+
+
+def to_compact_select() -> Select[tuple[object, ...]]:
+    """
+    Rows of `data` as `data_compact` rows
+    """
+    data, info = data_table, info_keys_table
+    return select(
+        info.c.station_int,
+        cast(f.julianday(data.c.date) - EPOCH_JULIAN_DAY, Integer),
+        *(data.c[name] for name in _COLUMNS),
+    ).join_from(data, info, info.c.station_id == data.c.station)
+
+
+def from_compact_select() -> Select[tuple[object, ...]]:
+    """
+    Rows of `data_compact` as `data` rows
+    """
+    data, info = data_compact_table, info_keys_table
+    return select(
+        info.c.station_id,
+        f.date(data.c.day + EPOCH_JULIAN_DAY),
+        *(data.c[name] for name in _COLUMNS),
+    ).join_from(data, info, info.c.station_int == data.c.station_int)
+
+
+def is_compact(connection: Connection) -> bool:
+    """
+    Whether `data` is the view over `data_compact`
+    """
+    return (
+        connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'data'"
+        ).first()
+        is not None
+    )
+
+
+def convert_to_compact(connection: Connection) -> None:
+    """
+    What the `compact` migration does, without SpatiaLite, to a database with the
+    tables of `apply_non_spatial_migrations`. Commit and `VACUUM` afterwards to
+    shrink the file
+    """
+    connection.exec_driver_sql("ALTER TABLE info ADD COLUMN station_int INTEGER")
+    connection.exec_driver_sql("UPDATE info SET station_int = rowid")
+    for statement in INFO_KEY_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(DATA_COMPACT_DDL)
+    connection.execute(
+        insert(data_compact_table).from_select(
+            list(data_compact_table.c), to_compact_select()
+        )
+    )
+    connection.exec_driver_sql("DROP TABLE data")
+    for statement in DATA_VIEW_DDL:
+        connection.exec_driver_sql(statement)
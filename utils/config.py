@@ -2,26 +2,144 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import datetime
+import functools
+import os
+from dataclasses import dataclass, field
 from pathlib import Path
-
-import yaml
+from typing import Any, Literal, Optional, cast
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 _CONFIG_PATH = BASE_DIR / "config.yml"
+# Points every entry point at another database, e.g. a generated benchmark one
+DB_URL_ENV = "NOAA_DB_URL"
+
+
+@dataclass(frozen=True)
+class _SqliteConfig:
+    pragmas: dict[str, Any] = field(default_factory=dict)
+    immutable: bool = False
+    preload: Literal["none", "full", "hot"] = "none"
+    preload_data_since: Optional[datetime.date] = None
+
+
+@dataclass(frozen=True)
+class _ExifCacheConfig:
+    enabled: bool = True
+    path: str = "exif_cache.db"
+    hash: bool = False
+    max_entries: Optional[int] = None
+    max_age_days: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class _LookupCacheConfig:
+    enabled: bool = True
+    grid_degrees: float = 0.001
+    capacity: int = 100000
+    path: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class _PipelineConfig:
+    jobs: Optional[int] = None
+    chunk_size: int = 256
+    queue_size: int = 1024
+
+
+@dataclass(frozen=True)
+class _SnapshotConfig:
+    path: str = "snapshot"
+
+
+@dataclass(frozen=True)
+class _RasterConfig:
+    path: str = "raster"
+    cell_degrees: float = 0.1
+    bounds: Optional[list[float]] = None
+
+
+@dataclass(frozen=True)
+class _ShardsConfig:
+    path: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class _CoverageConfig:
+    enabled: bool = True
+
+
+@dataclass(frozen=True)
+class _RegionConfig:
+    countries: list[str] = field(default_factory=lambda: ["中国"])
+    provinces: list[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class _ServerConfig:
+    host: str = "127.0.0.1"
+    port: int = 8765
+    socket: Optional[str] = None
 
 
 @dataclass(frozen=True)
 class _Config:
     db_url: str
     earth_radius: float
+    sqlite: _SqliteConfig = field(default_factory=_SqliteConfig)
+    exif_cache: _ExifCacheConfig = field(default_factory=_ExifCacheConfig)
+    lookup_cache: _LookupCacheConfig = field(default_factory=_LookupCacheConfig)
+    pipeline: _PipelineConfig = field(default_factory=_PipelineConfig)
+    server: _ServerConfig = field(default_factory=_ServerConfig)
+    snapshot: _SnapshotConfig = field(default_factory=_SnapshotConfig)
+    raster: _RasterConfig = field(default_factory=_RasterConfig)
+    shards: _ShardsConfig = field(default_factory=_ShardsConfig)
+    coverage: _CoverageConfig = field(default_factory=_CoverageConfig)
+    region: _RegionConfig = field(default_factory=_RegionConfig)
 
 
+@functools.cache
 def _get_config() -> _Config:
     """"""
-    with _CONFIG_PATH.open("rt") as f:
+    import yaml
+
+    with _CONFIG_PATH.open("rt", encoding="utf-8") as f:
         config_data = yaml.load(f, Loader=yaml.SafeLoader)
-    return _Config(**config_data)
+    sqlite_data = config_data.pop("sqlite", None) or {}
+    sqlite_data["pragmas"] = sqlite_data.get("pragmas") or {}
+    exif_cache_data = config_data.pop("exif_cache", None) or {}
+    lookup_cache_data = config_data.pop("lookup_cache", None) or {}
+    pipeline_data = config_data.pop("pipeline", None) or {}
+    server_data = config_data.pop("server", None) or {}
+    snapshot_data = config_data.pop("snapshot", None) or {}
+    raster_data = config_data.pop("raster", None) or {}
+    shards_data = config_data.pop("shards", None) or {}
+    coverage_data = config_data.pop("coverage", None) or {}
+    region_data = config_data.pop("region", None) or {}
+    config_data["db_url"] = os.environ.get(DB_URL_ENV) or config_data["db_url"]
+    return _Config(
+        **config_data,
+        sqlite=_SqliteConfig(**sqlite_data),
+        exif_cache=_ExifCacheConfig(**exif_cache_data),
+        lookup_cache=_LookupCacheConfig(**lookup_cache_data),
+        pipeline=_PipelineConfig(**pipeline_data),
+        server=_ServerConfig(**server_data),
+        snapshot=_SnapshotConfig(**snapshot_data),
+        raster=_RasterConfig(**raster_data),
+        shards=_ShardsConfig(**shards_data),
+        coverage=_CoverageConfig(**coverage_data),
+        region=_RegionConfig(**region_data),
+    )
+
+
+class _LazyConfig:
+    """
+    Stand-in for the `_Config` of `config.yml`, which is only read and parsed on the
+    first attribute access
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_get_config(), name)
 
 
-CONFIG = _get_config()
+CONFIG = cast(_Config, _LazyConfig())
@@ -0,0 +1,146 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Column, Date, Integer, MetaData, String, Table, and_, exists
+from sqlalchemy import func as f
+from sqlalchemy import or_
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+    from typing import Any, Optional
+
+    from sqlalchemy.engine.base import Connection
+    from sqlalchemy.sql.elements import ColumnElement
+
+    from utils.shards import ShardSet
+
+__all__ = [
+    "COVERAGE_DDL",
+    "COVERAGE_FILL",
+    "build_coverage",
+    "coverage_table",
+    "has_coverage",
+    "refresh_coverage",
+]
+
+# One row per station having any `data` row. The `wdsp_` columns only count rows
+# with a `wdsp`, and their dates are NULL when there is none
+coverage_table = Table(
+    "coverage",
+    MetaData(),
+    Column("station", String(12), primary_key=True),
+    Column("first_date", Date, nullable=False),
+    Column("last_date", Date, nullable=False),
+    Column("data_rows", Integer, nullable=False),
+    Column("wdsp_first_date", Date, nullable=True),
+    Column("wdsp_last_date", Date, nullable=True),
+    Column("wdsp_rows", Integer, nullable=False),
+    sqlite_with_rowid=False,
+)
+
+COVERAGE_DDL = (
+    "CREATE TABLE coverage ("
+    "station VARCHAR(12) NOT NULL PRIMARY KEY REFERENCES info (station_id), "
+    "first_date DATE NOT NULL, "
+    "last_date DATE NOT NULL, "
+    "data_rows INTEGER NOT NULL, "
+    "wdsp_first_date DATE, "
+    "wdsp_last_date DATE, "
+    "wdsp_rows INTEGER NOT NULL) WITHOUT ROWID"
+)
+_SUMMARY = (
+    "SELECT station, MIN(date), MAX(date), COUNT(*), "
+    "MIN(CASE WHEN wdsp IS NOT NULL THEN date END), "
+    "MAX(CASE WHEN wdsp IS NOT NULL THEN date END), "
+    "COUNT(wdsp) FROM data"
+)
+COVERAGE_FILL = f"INSERT INTO coverage {_SUMMARY} GROUP BY station"
+# Shards hold disjoint date ranges, so their summaries add up. SQLite's scalar
+# MIN/MAX return NULL when any argument is, hence the COALESCE
+_MERGE = (
+    f"{COVERAGE_FILL} ON CONFLICT (station) DO UPDATE SET "
+    "first_date = MIN(first_date, excluded.first_date), "
+    "last_date = MAX(last_date, excluded.last_date), "
+    "data_rows = data_rows + excluded.data_rows, "
+    "wdsp_first_date = COALESCE(MIN(wdsp_first_date, excluded.wdsp_first_date), "
+    "wdsp_first_date, excluded.wdsp_first_date), "
+    "wdsp_last_date = COALESCE(MAX(wdsp_last_date, excluded.wdsp_last_date), "
+    "wdsp_last_date, excluded.wdsp_last_date), "
+    "wdsp_rows = wdsp_rows + excluded.wdsp_rows"
+)
+# Stations per statement, below SQLite's default 999 host parameters of old builds
+_STATIONS_PER_REFRESH = 500
+
+
+def build_coverage(connection: Connection, shard_set: Optional[ShardSet] = None) -> int:
+    """
+    Rebuild `coverage` from the whole of `data`, or from every shard of `shard_set`
+    one at a time, and commit. Return the number of stations covered
+    """
+    connection.exec_driver_sql("DELETE FROM coverage")
+    if shard_set is None:
+        connection.exec_driver_sql(COVERAGE_FILL)
+    else:
+        for shard in shard_set.shards:
+            # Shards cannot be attached while a transaction is open
+            connection.commit()
+            shard_set.attach(connection, (shard,))
+            connection.exec_driver_sql(_MERGE)
+    connection.commit()
+    (stations,) = connection.exec_driver_sql("SELECT COUNT(*) FROM coverage").one()
+    return stations
+
+
+def refresh_coverage(connection: Connection, stations: Collection[str]) -> None:
+    """
+    Summarize `data` again for `stations` only, e.g. after loading some of their
+    rows. Runs in the current transaction
+    """
+    ordered = sorted(stations)
+    for start in range(0, len(ordered), _STATIONS_PER_REFRESH):
+        chunk = ordered[start : start + _STATIONS_PER_REFRESH]
+        placeholders = ", ".join("?" * len(chunk))
+        connection.exec_driver_sql(
+            f"DELETE FROM coverage WHERE station IN ({placeholders})", tuple(chunk)
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO coverage {_SUMMARY} WHERE station IN ({placeholders}) "
+            "GROUP BY station",
+            tuple(chunk),
+        )
+
+
+def has_coverage(
+    station: ColumnElement[str],
+    *,
+    include_null_wdsp: bool = False,
+    date: Optional[ColumnElement[Any]] = None,
+    max_days_gap: Optional[ColumnElement[Optional[int]]] = None,
+) -> ColumnElement[bool]:
+    """
+    Whether `station` has a usable `data` row and, when `max_days_gap` is not NULL,
+    one within `max_days_gap` days of `date`, as one primary key seek on `coverage`
+    """
+    c = coverage_table.c
+    conditions: list[ColumnElement[bool]] = [c.station == station]
+    if include_null_wdsp:
+        first_date, last_date = c.first_date, c.last_date
+    else:
+        conditions.append(c.wdsp_rows > 0)
+        first_date, last_date = c.wdsp_first_date, c.wdsp_last_date
+    if date is not None and max_days_gap is not None:
+        # ISO dates compare as strings; the bounds are constant per statement, so
+        # SQLite computes them once rather than once per station
+        conditions.append(
+            or_(
+                max_days_gap.is_(None),
+                and_(
+                    first_date <= f.date(date, f.printf("%+d days", max_days_gap)),
+                    last_date >= f.date(date, f.printf("%+d days", -max_days_gap)),
+                ),
+            )
+        )
+    return exists().where(*conditions)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import math as m
+from typing import TYPE_CHECKING
+
+from .config import CONFIG
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from typing import Any
+
+    import numpy as np
+    from numpy.typing import ArrayLike, NDArray
+
+# Upper bound on the cells of one N x M block, about 32 MiB per float64 temporary
+MAX_CHUNK_CELLS = 1 << 22
+
+
+def to_unit_vector(lat: float, lon: float) -> tuple[float, float, float]:
+    """"""
+    lat_rad = m.radians(lat)
+    lon_rad = m.radians(lon)
+    cos_lat = m.cos(lat_rad)
+    return cos_lat * m.cos(lon_rad), cos_lat * m.sin(lon_rad), m.sin(lat_rad)
+
+
+def _haversine_a(lat1: Any, lon1: Any, lat2: Any, lon2: Any, xp: Any) -> Any:
+    """
+    The haversine term, written once for `math` scalars and broadcast numpy arrays
+    """
+    # a = sin^2(|lat1-lat2|/2) + sin^2(|lon1-lon2|/2) * cos(lat1) * cos(lat2)
+    lat_diff = abs(xp.radians(lat1) - xp.radians(lat2))
+    distance_a_lat = xp.sin(lat_diff / 2) ** 2
+    lon_diff = abs(xp.radians(lon1) - xp.radians(lon2))
+    distance_a_lon = (
+        xp.sin(lon_diff / 2) ** 2 * xp.cos(xp.radians(lat1)) * xp.cos(xp.radians(lat2))
+    )
+    return distance_a_lat + distance_a_lon
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """"""
+    distance_a = _haversine_a(lat1, lon1, lat2, lon2, m)
+    # radian = atan(sqrt(a/(1-a))) * 2
+    return m.atan2(m.sqrt(distance_a), m.sqrt(1 - distance_a)) * 2
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """"""
+    return haversine(lat1, lon1, lat2, lon2) * CONFIG.earth_radius
+
+
+def haversine_array(
+    lat1: ArrayLike, lon1: ArrayLike, lat2: ArrayLike, lon2: ArrayLike
+) -> NDArray[np.float64]:
+    """
+    `haversine` over numpy-broadcast arguments: element-wise for equal shapes, or
+    N x M for `lat1[:, None]` against `lat2[None, :]`. NaN coordinates give NaN
+    """
+    import numpy as np
+
+    distance_a = _haversine_a(
+        np.asarray(lat1, dtype=np.float64),
+        np.asarray(lon1, dtype=np.float64),
+        np.asarray(lat2, dtype=np.float64),
+        np.asarray(lon2, dtype=np.float64),
+        np,
+    )
+    return np.arctan2(np.sqrt(distance_a), np.sqrt(1 - distance_a)) * 2
+
+
+def distance_km_array(
+    lat1: ArrayLike, lon1: ArrayLike, lat2: ArrayLike, lon2: ArrayLike
+) -> NDArray[np.float64]:
+    """"""
+    return haversine_array(lat1, lon1, lat2, lon2) * CONFIG.earth_radius
+
+
+def iter_distance_blocks(
+    lats: ArrayLike,
+    lons: ArrayLike,
+    station_lats: ArrayLike,
+    station_lons: ArrayLike,
+    *,
+    max_cells: int = MAX_CHUNK_CELLS,
+) -> Iterator[tuple[slice, NDArray[np.float64]]]:
+    """
+    Kilometres from every point to every station, as consecutive row blocks of the
+    N x M matrix small enough to stay under `max_cells`
+    """
+    import numpy as np
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    station_lats = np.asarray(station_lats, dtype=np.float64)[None, :]
+    station_lons = np.asarray(station_lons, dtype=np.float64)[None, :]
+    rows = max(max_cells // max(station_lats.size, 1), 1)
+    for start in range(0, len(lats), rows):
+        block = slice(start, min(start + rows, len(lats)))
+        yield block, distance_km_array(
+            lats[block, None], lons[block, None], station_lats, station_lons
+        )
+
+
+def top_k(
+    lats: ArrayLike,
+    lons: ArrayLike,
+    station_lats: ArrayLike,
+    station_lons: ArrayLike,
+    k: int = 1,
+    *,
+    max_cells: int = MAX_CHUNK_CELLS,
+) -> tuple[NDArray[np.intp], NDArray[np.float64]]:
+    """
+    Indexes of the `k` nearest stations of every point, nearest first with ties
+    going to the lower index, and their distances in kilometres. Both are N x k,
+    with `k` capped at the number of stations; stations with NaN coordinates rank
+    last with a NaN distance
+    """
+    import numpy as np
+
+    lats = np.asarray(lats, dtype=np.float64)
+    station_count = np.asarray(station_lats).size
+    k = min(k, station_count)
+    indexes = np.empty((len(lats), k), dtype=np.intp)
+    distances = np.empty((len(lats), k), dtype=np.float64)
+    if k == 0:
+        return indexes, distances
+    for block, block_distances in iter_distance_blocks(
+        lats, lons, station_lats, station_lons, max_cells=max_cells
+    ):
+        if k < station_count:
+            nearest = np.argpartition(block_distances, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.tile(np.arange(station_count), (len(block_distances), 1))
+        nearest_distances = np.take_along_axis(block_distances, nearest, axis=1)
+        # `argpartition` picks arbitrarily among stations tied with the k-th one;
+        # the rare rows where that matters fall back to a stable full sort
+        kth = nearest_distances.max(axis=1, keepdims=True)
+        tied = (block_distances == kth).sum(axis=1) > (nearest_distances == kth).sum(
+            axis=1
+        )
+        for row in np.flatnonzero(tied):
+            nearest[row] = np.argsort(block_distances[row], kind="stable")[:k]
+            nearest_distances[row] = block_distances[row, nearest[row]]
+        # Index as the secondary key keeps ties deterministic across chunk sizes
+        order = np.lexsort((nearest, nearest_distances), axis=1)
+        indexes[block] = np.take_along_axis(nearest, order, axis=1)
+        distances[block] = np.take_along_axis(nearest_distances, order, axis=1)
+    return indexes, distances
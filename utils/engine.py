@@ -0,0 +1,166 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+import re
+import sqlite3
+import threading
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.event import listen
+
+from .config import CONFIG
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+    from typing import Any, Optional
+
+    from sqlalchemy.engine.base import Engine
+
+    _ConnectListener = Callable[[Any, Any], None]
+
+__all__ = ["get_data_since", "get_engine"]
+
+_PRAGMA_NAME = re.compile(r"^[a-z_]+$")
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+
+_engines: dict[tuple[str, tuple[_ConnectListener, ...]], Engine] = {}
+# In-memory copies by source database path, with the connection keeping each alive
+_preloaded: dict[str, tuple[str, sqlite3.Connection]] = {}
+# Engines on a hot preload holding `data` from a date on only
+_data_since: dict[Engine, datetime.date] = {}
+_lock = threading.Lock()
+
+
+def _apply_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:
+    """"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in CONFIG.sqlite.pragmas.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(str(value)):
+                raise ValueError(f"Invalid SQLite pragma {name}={value}")
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def _copy_hot(source_uri: str, target: sqlite3.Connection) -> None:
+    """"""
+    target.execute("ATTACH DATABASE ? AS source", (source_uri,))
+    tables = ["info"]
+    # With shards, `data` is read from the attached shard files instead
+    if CONFIG.shards.path is None:
+        tables.append("data")
+    # Station filters read `coverage` on every lookup
+    if CONFIG.coverage.enabled:
+        tables.append("coverage")
+    schema = target.execute(
+        "SELECT type, tbl_name, sql FROM source.sqlite_master "
+        f"WHERE tbl_name IN ({', '.join('?' * len(tables))}) AND sql IS NOT NULL",
+        tables,
+    ).fetchall()
+    for type_, _, sql in schema:
+        if type_ == "table":
+            target.execute(sql)
+    since = CONFIG.sqlite.preload_data_since
+    for type_, name, _ in schema:
+        if type_ != "table":
+            continue
+        if name == "data" and since is not None:
+            target.execute(
+                "INSERT INTO main.data SELECT * FROM source.data WHERE date >= ?",
+                (since.isoformat(),),
+            )
+        else:
+            target.execute(f"INSERT INTO main.{name} SELECT * FROM source.{name}")
+    for type_, _, sql in schema:
+        if type_ == "index":
+            target.execute(sql)
+    target.commit()
+    target.execute("DETACH DATABASE source")
+
+
+def _preload(database: str) -> str:
+    """
+    Copy `database` into a shared-cache in-memory database and return the URI every
+    connection of the engine should open instead
+    """
+    if database in _preloaded:
+        return _preloaded[database][0]
+    memory_uri = f"file:noaa-preload-{len(_preloaded)}?mode=memory&cache=shared"
+    keeper = sqlite3.connect(memory_uri, uri=True, check_same_thread=False)
+    source_uri = f"file:{database}?mode=ro"
+    if CONFIG.sqlite.preload == "full":
+        source = sqlite3.connect(source_uri, uri=True)
+        try:
+            source.backup(keeper)
+        finally:
+            source.close()
+    else:
+        _copy_hot(source_uri, keeper)
+    _preloaded[database] = (memory_uri, keeper)
+    return memory_uri
+
+
+def _create_engine(url_str: str, on_connect: Sequence[_ConnectListener]) -> Engine:
+    """"""
+    url = make_url(url_str)
+    is_file_sqlite = (
+        url.get_backend_name() == "sqlite"
+        and url.database is not None
+        and url.database not in ("", ":memory:")
+    )
+    if is_file_sqlite and CONFIG.sqlite.preload != "none":
+        assert url.database is not None
+        memory_uri = _preload(url.database)
+        url = url.set(database=memory_uri, query={**url.query, "uri": "true"})
+    elif is_file_sqlite and CONFIG.sqlite.immutable:
+        url = url.set(
+            database=f"file:{url.database}?immutable=1",
+            query={**url.query, "uri": "true"},
+        )
+    engine = create_engine(url)
+    since = CONFIG.sqlite.preload_data_since
+    if (
+        is_file_sqlite
+        and CONFIG.sqlite.preload == "hot"
+        and CONFIG.shards.path is None
+        and since is not None
+    ):
+        _data_since[engine] = since
+    for listener in on_connect:
+        listen(engine, "connect", listener)
+    if url.get_backend_name() == "sqlite":
+        listen(engine, "connect", _apply_pragmas)
+    return engine
+
+
+def get_engine(
+    url: Optional[str] = None, *, on_connect: Sequence[_ConnectListener] = ()
+) -> Engine:
+    """
+    Process-wide engine for `url` (default `CONFIG.db_url`), created on first use and
+    shared by every search engine asking for the same URL and connect listeners
+    """
+    url_str = CONFIG.db_url if url is None else url
+    key = (url_str, tuple(on_connect))
+    engine = _engines.get(key)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _create_engine(url_str, on_connect)
+                _engines[key] = engine
+    return engine
+
+
+def get_data_since(engine: Engine) -> Optional[datetime.date]:
+    """
+    First date of the `data` rows `engine` reads, `None` when it reads all of them
+    """
+    return _data_since.get(engine)
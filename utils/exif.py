@@ -3,15 +3,20 @@
 from __future__ import annotations
 
 import datetime
-from typing import TYPE_CHECKING
-
-import exifread
-from exifread.classes import IfdTag
-from exifread.utils import Ratio
+import functools
+import struct
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, TypeVar
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from pathlib import Path
-    from typing import Any, Optional
+    from types import ModuleType
+    from typing import Any, BinaryIO, Optional
+
+    from exifread.classes import IfdTag
+
+    from .exif_cache import ExifCache
 
 
 def _monkey_patch_heic_get_parser() -> None:
@@ -36,31 +41,244 @@ def _monkey_patch_heic_get_parser() -> None:
     HEICExifFinder.get_parser = _get_parser  # pyright: ignore[reportGeneralTypeIssues]
 
 
-_monkey_patch_heic_get_parser()
+@functools.cache
+def _import_exifread() -> ModuleType:
+    """
+    `exifread`, imported and patched on first use only: Exif values found in the
+    cache never need it
+    """
+    import exifread
+
+    _monkey_patch_heic_get_parser()
+    return exifread
+
+
+# Byte size of each TIFF field type that the fast reader understands
+_FIELD_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+_EXIF_POINTER = 0x8769
+_GPS_POINTER = 0x8825
+_IMAGE_TAGS = {0x0132: "Image DateTime"}
+_EXIF_TAGS = {
+    0x9003: "EXIF DateTimeOriginal",
+    0x9004: "EXIF DateTimeDigitized",
+    0x9010: "EXIF OffsetTime",
+    0x9011: "EXIF OffsetTimeOriginal",
+    0x9012: "EXIF OffsetTimeDigitized",
+}
+_GPS_TAGS = {
+    0x0001: "GPS GPSLatitudeRef",
+    0x0002: "GPS GPSLatitude",
+    0x0003: "GPS GPSLongitudeRef",
+    0x0004: "GPS GPSLongitude",
+}
+
+
+def _find_jpeg_tiff_offset(f: BinaryIO) -> int:
+    """"""
+    f.seek(2)
+    while True:
+        segment = f.read(4)
+        if len(segment) < 4 or segment[0] != 0xFF:
+            raise ValueError("Cannot find JPEG Exif segment")
+        marker = segment[1]
+        length = int.from_bytes(segment[2:4], "big")
+        if marker in (0xD9, 0xDA):
+            raise ValueError("No Exif segment before JPEG image data")
+        if marker == 0xE1:
+            if f.read(6) == b"Exif\x00\x00":
+                return f.tell()
+            f.seek(length - 8, 1)
+        else:
+            f.seek(length - 2, 1)
+
+
+def _find_tiff_offset(f: BinaryIO) -> int:
+    """"""
+    header = f.read(12)
+    if header[:2] == b"\xff\xd8":
+        return _find_jpeg_tiff_offset(f)
+    if header[:4] in (b"II*\x00", b"MM\x00*"):
+        return 0
+    if header[4:12] == b"ftypheic":
+        _import_exifread()
+        from exifread.heic import HEICExifFinder
+
+        f.seek(0)
+        try:
+            offset, _ = HEICExifFinder(f).find_exif()
+        except AssertionError as err:
+            raise ValueError("Unsupported HEIC layout") from err
+        return offset
+    raise ValueError("Unsupported file format for fast Exif reading")
+
+
+def _read_ifd(
+    f: BinaryIO, base: int, endian: str, ifd_offset: int, names: dict[int, str]
+) -> tuple[dict[str, IfdTag], dict[int, int]]:
+    """
+    Read only the tags in `names` from one IFD, and the values of the IFD pointers
+    """
+    from exifread.classes import IfdTag
+    from exifread.utils import Ratio
+
+    f.seek(base + ifd_offset)
+    (count,) = struct.unpack(f"{endian}H", f.read(2))
+    entries = f.read(count * 12)
+    tags: dict[str, IfdTag] = {}
+    pointers: dict[int, int] = {}
+    for i in range(count):
+        entry = entries[i * 12 : (i + 1) * 12]
+        tag, field_type, value_count = struct.unpack(f"{endian}HHI", entry[:8])
+        if tag in (_EXIF_POINTER, _GPS_POINTER) and field_type == 4:
+            (pointers[tag],) = struct.unpack(f"{endian}I", entry[8:])
+            continue
+        if tag not in names or field_type not in _FIELD_SIZES:
+            continue
+        length = _FIELD_SIZES[field_type] * value_count
+        if length <= 4:
+            field_offset = ifd_offset + 2 + i * 12 + 8
+            data = entry[8 : 8 + length]
+        else:
+            (field_offset,) = struct.unpack(f"{endian}I", entry[8:])
+            f.seek(base + field_offset)
+            data = f.read(length)
+        if field_type == 2:
+            values: Any = data.split(b"\x00", 1)[0].decode("utf-8", errors="replace")
+            printable = values
+        elif field_type in (5, 10):
+            fmt = "I" if field_type == 5 else "i"
+            numbers = struct.unpack(f"{endian}{value_count * 2}{fmt}", data)
+            values = [Ratio(n, d) for n, d in zip(numbers[::2], numbers[1::2])]
+            printable = str(values)
+        else:
+            values = list(data)
+            printable = str(values)
+        tags[names[tag]] = IfdTag(
+            printable, tag, field_type, values, field_offset, length
+        )
+    return tags, pointers
+
+
+def read_fast_tags(f: BinaryIO) -> dict[str, IfdTag]:
+    """
+    Read only the GPS position and capture time tags, seeking straight to the three
+    IFDs holding them. MakerNotes, thumbnails and image data are never read
+    """
+    base = _find_tiff_offset(f)
+    f.seek(base)
+    header = f.read(8)
+    if header[:2] == b"II":
+        endian = "<"
+    elif header[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Invalid TIFF header")
+    (ifd0_offset,) = struct.unpack(f"{endian}I", header[4:])
+    tags, pointers = _read_ifd(f, base, endian, ifd0_offset, _IMAGE_TAGS)
+    if _EXIF_POINTER in pointers:
+        tags.update(_read_ifd(f, base, endian, pointers[_EXIF_POINTER], _EXIF_TAGS)[0])
+    if _GPS_POINTER in pointers:
+        tags.update(_read_ifd(f, base, endian, pointers[_GPS_POINTER], _GPS_TAGS)[0])
+    return tags
+
+
+_T = TypeVar("_T")
+
+
+def _parse_or_error(parser: Callable[[], _T]) -> tuple[Optional[_T], Optional[str]]:
+    """"""
+    try:
+        return parser(), None
+    except ValueError as err:
+        return None, str(err)
+
+
+@dataclass(frozen=True)
+class ExifRecord:
+    """
+    Parsed position and capture time of a picture, or why each could not be parsed
+    """
+
+    lat: Optional[float]
+    lon: Optional[float]
+    datetime: Optional[datetime.datetime]
+    lat_error: Optional[str] = None
+    lon_error: Optional[str] = None
+    datetime_error: Optional[str] = None
+
+    @classmethod
+    def from_parsers(
+        cls,
+        parse_lat: Callable[[], float],
+        parse_lon: Callable[[], float],
+        parse_datetime: Callable[[], datetime.datetime],
+    ) -> ExifRecord:
+        """"""
+        lat, lat_error = _parse_or_error(parse_lat)
+        lon, lon_error = _parse_or_error(parse_lon)
+        dt, datetime_error = _parse_or_error(parse_datetime)
+        return cls(lat, lon, dt, lat_error, lon_error, datetime_error)
+
+    def get_lat(self) -> float:
+        """"""
+        if self.lat is None:
+            raise ValueError(self.lat_error)
+        return self.lat
+
+    def get_lon(self) -> float:
+        """"""
+        if self.lon is None:
+            raise ValueError(self.lon_error)
+        return self.lon
+
+    def get_datetime(self) -> datetime.datetime:
+        """"""
+        if self.datetime is None:
+            raise ValueError(self.datetime_error)
+        return self.datetime
 
 
 class Exif:
     """"""
 
     path: Path
+    fast: bool
+    cache: Optional[ExifCache]
     _tags: Optional[dict[str, Any]]
+    _record: Optional[ExifRecord]
 
-    def __init__(self, path: Path) -> None:
+    def __init__(
+        self, path: Path, *, fast: bool = True, cache: Optional[ExifCache] = None
+    ) -> None:
         self.path = path
+        self.fast = fast
+        self.cache = cache
         self._tags = None
+        self._record = None
 
     @property
     def tags(self) -> dict[str, Any]:
         if self._tags is None:
             with self.path.open("rb") as f:
-                self._tags = exifread.process_file(
+                if self.fast:
+                    try:
+                        self._tags = read_fast_tags(
+                            f  # pyright: ignore[reportGeneralTypeIssues]
+                        )
+                        return self._tags
+                    except (ValueError, struct.error):
+                        # Let the full parser deal with anything unusual
+                        f.seek(0)
+                self._tags = _import_exifread().process_file(
                     f  # pyright: ignore[reportGeneralTypeIssues]
                 )
         return self._tags
 
-    @property
-    def lat(self) -> float:
+    def _parse_lat(self) -> float:
         """"""
+        from exifread.classes import IfdTag
+        from exifread.utils import Ratio
+
         lat_tag = self.tags.get("GPS GPSLatitude")
         lat_ref_tag = self.tags.get("GPS GPSLatitudeRef")
         if lat_tag is None or lat_ref_tag is None:
@@ -87,9 +305,11 @@ class Exif:
         else:
             raise ValueError(f"Cannot parse latitude reference {lat_ref_tag}")
 
-    @property
-    def lon(self) -> float:
+    def _parse_lon(self) -> float:
         """"""
+        from exifread.classes import IfdTag
+        from exifread.utils import Ratio
+
         lon_tag = self.tags.get("GPS GPSLongitude")
         lon_tag_ref = self.tags.get("GPS GPSLongitudeRef")
         if lon_tag is None or lon_tag_ref is None:
@@ -116,9 +336,10 @@ class Exif:
         else:
             raise ValueError(f"Cannot parse longitude reference {lon_tag_ref}")
 
-    @property
-    def datetime(self) -> datetime.datetime:
+    def _parse_datetime(self) -> datetime.datetime:
         """"""
+        from exifread.classes import IfdTag
+
         dt_tag = (
             self.tags.get("EXIF DateTimeOriginal")
             or self.tags.get("Image DateTime")
@@ -156,6 +377,45 @@ class Exif:
                 f"{dt_offset_tag=})"
             ) from err
 
+    @property
+    def record(self) -> ExifRecord:
+        """"""
+        if self._record is None:
+            record = (
+                None
+                if self.cache is None
+                else self.cache.get(self.path, fast=self.fast)
+            )
+            if record is None:
+                record = ExifRecord.from_parsers(
+                    self._parse_lat, self._parse_lon, self._parse_datetime
+                )
+                if self.cache is not None:
+                    self.cache.put(self.path, record, fast=self.fast)
+            self._record = record
+        return self._record
+
+    @property
+    def lat(self) -> float:
+        """"""
+        if self.cache is None:
+            return self._parse_lat()
+        return self.record.get_lat()
+
+    @property
+    def lon(self) -> float:
+        """"""
+        if self.cache is None:
+            return self._parse_lon()
+        return self.record.get_lon()
+
+    @property
+    def datetime(self) -> datetime.datetime:
+        """"""
+        if self.cache is None:
+            return self._parse_datetime()
+        return self.record.get_datetime()
+
     @property
     def date(self) -> datetime.date:
         """"""
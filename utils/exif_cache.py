@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import sqlite3
+import time
+from typing import TYPE_CHECKING
+
+from .config import BASE_DIR, CONFIG
+from .exif import ExifRecord
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from types import TracebackType
+    from typing import Optional
+
+# Bumped whenever `_SCHEMA` changes: older caches are dropped rather than migrated
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exif (
+    path TEXT NOT NULL,
+    fast INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT,
+    lat REAL,
+    lon REAL,
+    datetime TEXT,
+    lat_error TEXT,
+    lon_error TEXT,
+    datetime_error TEXT,
+    cached_at REAL NOT NULL,
+    PRIMARY KEY (path, fast)
+);
+CREATE INDEX IF NOT EXISTS ix_exif_cached_at ON exif (cached_at);
+"""
+_HASH_CHUNK_SIZE = 1 << 20
+# Pending writes are committed in batches rather than one transaction per picture
+_COMMIT_EVERY = 1000
+
+
+def _hash_file(path: Path) -> str:
+    """"""
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExifCache:
+    """
+    SQLite sidecar of parsed Exif records keyed by path, size and modification time,
+    optionally confirmed by a content hash when size or modification time changed.
+    Records of the fast and the full reader are kept apart, as they may differ
+    """
+
+    path: Path
+    use_hash: bool
+    max_entries: Optional[int]
+    max_age: Optional[datetime.timedelta]
+    hits: int
+    misses: int
+    _connection: sqlite3.Connection
+    _pending: int
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        use_hash: bool = False,
+        max_entries: Optional[int] = None,
+        max_age: Optional[datetime.timedelta] = None,
+    ) -> None:
+        self.path = path
+        self.use_hash = use_hash
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30)
+        (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        if version != _SCHEMA_VERSION:
+            self._connection.executescript(
+                f"DROP TABLE IF EXISTS exif; PRAGMA user_version = {_SCHEMA_VERSION};"
+            )
+        self._connection.executescript(_SCHEMA)
+        self._pending = 0
+        self.evict()
+
+    @classmethod
+    def from_config(cls) -> ExifCache:
+        """"""
+        config = CONFIG.exif_cache
+        return cls(
+            BASE_DIR / config.path,
+            use_hash=config.hash,
+            max_entries=config.max_entries,
+            max_age=(
+                None
+                if config.max_age_days is None
+                else datetime.timedelta(days=config.max_age_days)
+            ),
+        )
+
+    def __enter__(self) -> ExifCache:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def get(self, path: Path, *, fast: bool) -> Optional[ExifRecord]:
+        """
+        Record of `path` as read by the fast reader, or the full one
+        """
+        key = str(path.resolve())
+        stat = path.stat()
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, hash, lat, lon, datetime, lat_error, lon_error, "
+            "datetime_error FROM exif WHERE path = ? AND fast = ?",
+            (key, fast),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        size, mtime_ns, file_hash, *values = row
+        if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+            if not self.use_hash or file_hash is None or file_hash != _hash_file(path):
+                self.misses += 1
+                return None
+        # `cached_at` is the last access, so that eviction drops cold entries only
+        self._write(
+            "UPDATE exif SET size = ?, mtime_ns = ?, cached_at = ? "
+            "WHERE path = ? AND fast = ?",
+            (stat.st_size, stat.st_mtime_ns, time.time(), key, fast),
+        )
+        self.hits += 1
+        lat, lon, dt, lat_error, lon_error, datetime_error = values
+        return ExifRecord(
+            lat,
+            lon,
+            None if dt is None else datetime.datetime.fromisoformat(dt),
+            lat_error,
+            lon_error,
+            datetime_error,
+        )
+
+    def put(self, path: Path, record: ExifRecord, *, fast: bool) -> None:
+        """"""
+        stat = path.stat()
+        self._write(
+            "INSERT OR REPLACE INTO exif VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(path.resolve()),
+                fast,
+                stat.st_size,
+                stat.st_mtime_ns,
+                _hash_file(path) if self.use_hash else None,
+                record.lat,
+                record.lon,
+                None if record.datetime is None else record.datetime.isoformat(),
+                record.lat_error,
+                record.lon_error,
+                record.datetime_error,
+                time.time(),
+            ),
+        )
+
+    def _write(self, sql: str, params: tuple[object, ...]) -> None:
+        """"""
+        self._connection.execute(sql, params)
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """"""
+        self._connection.commit()
+        self._pending = 0
+
+    def evict(self) -> None:
+        """"""
+        if self.max_age is not None:
+            self._connection.execute(
+                "DELETE FROM exif WHERE cached_at < ?",
+                (time.time() - self.max_age.total_seconds(),),
+            )
+        if self.max_entries is not None:
+            self._connection.execute(
+                "DELETE FROM exif WHERE path IN (SELECT path FROM exif "
+                "ORDER BY cached_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self.flush()
+
+    def clear(self) -> None:
+        """"""
+        self._connection.execute("DELETE FROM exif")
+        self.flush()
+        self._connection.execute("VACUUM")
+
+    def close(self) -> None:
+        """"""
+        self.flush()
+        self._connection.close()
@@ -0,0 +1,507 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+import os
+import sys
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, NamedTuple
+
+from .coverage import refresh_coverage
+from .distance import to_unit_vector
+from .schema import (
+    FLOAT_COLUMNS,
+    apply_non_spatial_migrations,
+    create_tables,
+    has_table,
+    table_columns,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+    from typing import Any, Optional, TextIO, Union
+
+    from sqlalchemy.engine.base import Connection
+
+__all__ = ["GsodIngest", "MISSING_VALUES", "StationYear", "iter_sources", "parse_csv"]
+
+# Missing-value sentinels of the GSOD daily summaries, stored as NULL
+MISSING_VALUES = {
+    "temp": 9999.9,
+    "dewp": 9999.9,
+    "slp": 9999.9,
+    "stp": 9999.9,
+    "visib": 999.9,
+    "wdsp": 999.9,
+    "mxspd": 999.9,
+    "gust": 999.9,
+    "max": 9999.9,
+    "min": 9999.9,
+    "prcp": 99.99,
+    "sndp": 999.9,
+}
+_ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+_INSERT_DATA = (
+    f"INSERT OR REPLACE INTO data (station, date, {', '.join(FLOAT_COLUMNS)}, frshtt) "
+    f"VALUES ({', '.join('?' * (len(FLOAT_COLUMNS) + 3))})"
+)
+_INSERT_LOG = (
+    "INSERT OR REPLACE INTO ingest_log (station, year, size, mtime, rows, loaded_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_DELETE_YEAR = "DELETE FROM data WHERE station = ? AND date >= ? AND date < ?"
+# Members parsed ahead of the writer per worker process
+_PENDING_PER_JOB = 16
+
+
+class _Source(NamedTuple):
+    """
+    One CSV file of GSOD, holding the daily summaries of one station over one year
+    """
+
+    name: str
+    size: int
+    mtime: int
+    content: bytes
+
+
+class StationYear(NamedTuple):
+    """"""
+
+    station: str
+    year: int
+    name: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    rows: list[tuple[Any, ...]]
+
+
+def _is_source(path: Path) -> bool:
+    """"""
+    name = path.name.lower()
+    return name.endswith(".csv") or name.endswith(_ARCHIVE_SUFFIXES)
+
+
+def iter_sources(paths: Iterable[Path]) -> Iterator[_Source]:
+    """
+    CSV files given directly, found in directories, or read from `.tar`/`.tar.gz`
+    archives such as the yearly ones NOAA publishes. Archives are streamed: nothing
+    is extracted to disk, and only one member is held in memory at a time
+    """
+    for path in paths:
+        if path.is_dir():
+            yield from iter_sources(
+                sorted(p for p in path.rglob("*") if p.is_file() and _is_source(p))
+            )
+        elif path.name.lower().endswith(_ARCHIVE_SUFFIXES):
+            with tarfile.open(path, "r|*") as archive:
+                for member in archive:
+                    if not member.isfile() or not member.name.lower().endswith(".csv"):
+                        continue
+                    f = archive.extractfile(member)
+                    assert f is not None
+                    yield _Source(
+                        f"{path.name}:{member.name}",
+                        member.size,
+                        int(member.mtime),
+                        f.read(),
+                    )
+        else:
+            stat = path.stat()
+            yield _Source(
+                str(path), stat.st_size, int(stat.st_mtime), path.read_bytes()
+            )
+
+
+def _to_float(value: str, missing: Optional[float] = None) -> Optional[float]:
+    """"""
+    value = value.strip()
+    if not value:
+        return None
+    number = float(value)
+    return None if number == missing else number
+
+
+def _read_header(header: list[str]) -> dict[str, int]:
+    """"""
+    index = {name.strip().lower(): i for i, name in enumerate(header)}
+    for name in ("station", "date", *FLOAT_COLUMNS, "frshtt"):
+        if name not in index:
+            raise ValueError(f"Missing column {name.upper()}")
+    return index
+
+
+def _peek_key(content: bytes) -> Optional[tuple[str, int]]:
+    """
+    Station and year of a source from its first row, without parsing the rest
+    """
+    lines = content.split(b"\n", 2)[:2]
+    if len(lines) < 2 or not lines[1].strip():
+        return None
+    header, first = csv.reader(line.decode("utf-8", "replace") for line in lines)
+    index = _read_header(header)
+    return first[index["station"]].strip(), int(first[index["date"]].strip()[:4])
+
+
+def parse_csv(content: bytes) -> StationYear:
+    """
+    Rows ready for `data` from one GSOD CSV file, with missing values as `None`.
+    Columns are found by header name; the legacy fixed-width `.op` files are not
+    supported. Run in the worker processes
+    """
+    reader = csv.reader(io.StringIO(content.decode("utf-8", "replace")))
+    index = _read_header(next(reader))
+    station_i = index["station"]
+    date_i = index["date"]
+    frshtt_i = index["frshtt"]
+    value_columns = [
+        (index[column], MISSING_VALUES[column]) for column in FLOAT_COLUMNS
+    ]
+
+    first: Optional[list[str]] = None
+    rows: list[tuple[Any, ...]] = []
+    for record in reader:
+        if not record:
+            continue
+        if first is None:
+            first = record
+        frshtt = record[frshtt_i].strip()
+        # `_to_float` inlined, as this runs for every value of the archive
+        rows.append(
+            (
+                record[station_i].strip(),
+                record[date_i].strip(),
+                *[
+                    None
+                    if not (value := record[i].strip())
+                    or (number := float(value)) == missing
+                    else number
+                    for i, missing in value_columns
+                ],
+                int(frshtt) if frshtt else None,
+            )
+        )
+    if first is None:
+        raise ValueError("No rows")
+
+    station, date = rows[0][0], rows[0][1]
+    year = date[:4]
+    # A station-year is replaced as a whole, so it must be one
+    for row in rows:
+        if row[0] != station or not row[1].startswith(year):
+            raise ValueError(f"Rows of {row[0]} on {row[1]} in the file of {station}")
+    name_i = index.get("name")
+    latitude_i = index.get("latitude")
+    longitude_i = index.get("longitude")
+    return StationYear(
+        station=station,
+        year=int(year),
+        name=None if name_i is None else first[name_i].strip() or None,
+        latitude=None if latitude_i is None else _to_float(first[latitude_i]),
+        longitude=None if longitude_i is None else _to_float(first[longitude_i]),
+        rows=rows,
+    )
+
+
+def _parse_or_error(content: bytes) -> Union[StationYear, str]:
+    """
+    Run in the worker processes: only the rows or the error message cross back
+    """
+    try:
+        return parse_csv(content)
+    except (ValueError, IndexError, csv.Error) as err:
+        return str(err) or type(err).__name__
+
+
+class GsodIngest:
+    """
+    Loads GSOD CSV files into `info` and `data` of a SQLite database, creating the
+    tables if needed. Files are parsed by a process pool while this process inserts
+    them in `executemany` batches of `batch_rows`, committing every `commit_rows`.
+    Secondary indexes of `data` are dropped before the first insert and rebuilt at
+    the end. Every station-year loaded is recorded in `ingest_log` with the size and
+    modification time of its file, and skipped by later runs unless that changed.
+    The `coverage` of every station loaded is summarized again at the end.
+
+    Stations not in `info` yet are added with their GSOD name and coordinates only;
+    fill in their country and province to make them part of a `region`, or search
+    them with `--global`
+    """
+
+    connection: Connection
+    jobs: int
+    batch_rows: int
+    commit_rows: int
+    drop_indexes: bool
+    force: bool
+    log: Optional[TextIO]
+    stats: dict[str, int]
+    _geom: bool
+    _insert_info: str
+    _loaded: dict[tuple[str, int], tuple[int, int]]
+    _seen: set[tuple[str, int]]
+    _stations: set[str]
+    _has_data: bool
+    _indexes: Optional[list[str]]
+    _rows: list[tuple[Any, ...]]
+    _info_rows: list[tuple[Any, ...]]
+    _log_rows: list[tuple[Any, ...]]
+    _uncommitted: int
+    _touched: set[str]
+    _committed: set[str]
+
+    def __init__(
+        self,
+        connection: Connection,
+        *,
+        jobs: Optional[int] = None,
+        batch_rows: int = 50_000,
+        commit_rows: int = 1_000_000,
+        drop_indexes: bool = True,
+        force: bool = False,
+        log: Optional[TextIO] = sys.stderr,
+    ) -> None:
+        self.connection = connection
+        self.jobs = jobs or os.cpu_count() or 1
+        self.batch_rows = max(batch_rows, 1)
+        self.commit_rows = max(commit_rows, self.batch_rows)
+        self.drop_indexes = drop_indexes
+        self.force = force
+        self.log = log
+
+    def run(self, paths: Iterable[Path]) -> dict[str, int]:
+        """
+        Load every station-year of `paths` not loaded yet, and return the counts of
+        files `loaded`, `skipped` and `failed`, `rows` inserted and `stations` added
+        """
+        self.stats = dict.fromkeys(
+            ("loaded", "skipped", "failed", "rows", "stations"), 0
+        )
+        self._prepare()
+        self._indexes = None
+        self._rows = []
+        self._info_rows = []
+        self._log_rows = []
+        self._uncommitted = 0
+        self._touched = set()
+        self._committed = set()
+        try:
+            self._load(iter_sources(paths))
+            self._flush()
+            # Once per station, rather than per commit of its station-years
+            refresh_coverage(self.connection, self._touched)
+            self.connection.commit()
+        except BaseException:
+            # Station-years committed so far are kept and skipped by the next run,
+            # so their coverage must be right already
+            self.connection.rollback()
+            refresh_coverage(self.connection, self._committed)
+            self.connection.commit()
+            raise
+        finally:
+            self._restore_indexes()
+        return self.stats
+
+    def _prepare(self) -> None:
+        """"""
+        connection = self.connection
+        # `data` is a view after the compact migration
+        if not has_table(connection, "info"):
+            create_tables(connection)
+            apply_non_spatial_migrations(connection)
+        elif not has_table(connection, "coverage"):
+            raise RuntimeError("Apply the migrations first: alembic upgrade head")
+        # Larger page cache for the B-tree inserts, and index sorts in memory
+        connection.exec_driver_sql("PRAGMA cache_size = -262144")
+        connection.exec_driver_sql("PRAGMA temp_store = MEMORY")
+
+        columns = ["station_id", "name", "latitude", "longitude"]
+        columns += ["unit_x", "unit_y", "unit_z"]
+        values = ["?"] * len(columns)
+        # Needs a connection with SpatiaLite loaded
+        self._geom = "geom" in table_columns(connection, "info")
+        if self._geom:
+            columns.append("geom")
+            values.append("MakePoint(?, ?, 4326)")
+        self._insert_info = (
+            f"INSERT OR IGNORE INTO info ({', '.join(columns)}) "
+            f"VALUES ({', '.join(values)})"
+        )
+
+        self._loaded = {
+            (station, year): (size, mtime)
+            for station, year, size, mtime in connection.exec_driver_sql(
+                "SELECT station, year, size, mtime FROM ingest_log"
+            )
+        }
+        self._stations = {
+            station_id
+            for (station_id,) in connection.exec_driver_sql(
+                "SELECT station_id FROM info"
+            )
+        }
+        # Nothing to replace in an empty table
+        self._has_data = (
+            connection.exec_driver_sql("SELECT 1 FROM data LIMIT 1").first() is not None
+        )
+        self._seen = set()
+        connection.commit()
+
+    def _load(self, sources: Iterator[_Source]) -> None:
+        """"""
+        if self.jobs == 1:
+            for source in sources:
+                if self._wanted(source):
+                    self._store(source, _parse_or_error(source.content))
+            return
+        pending: deque[tuple[_Source, Future[Union[StationYear, str]]]] = deque()
+        pool = ProcessPoolExecutor(self.jobs)
+        try:
+            for source in sources:
+                if not self._wanted(source):
+                    continue
+                pending.append((source, pool.submit(_parse_or_error, source.content)))
+                if len(pending) >= self.jobs * _PENDING_PER_JOB:
+                    source, future = pending.popleft()
+                    self._store(source, future.result())
+            while pending:
+                source, future = pending.popleft()
+                self._store(source, future.result())
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _wanted(self, source: _Source) -> bool:
+        """"""
+        try:
+            key = _peek_key(source.content)
+        except (ValueError, IndexError, csv.Error) as err:
+            self._fail(source, str(err))
+            return False
+        if key is None:
+            self._fail(source, "No rows")
+            return False
+        if key in self._seen:
+            self._fail(
+                source, f"{key[0]} in {key[1]} was already read from another file"
+            )
+            return False
+        self._seen.add(key)
+        if not self.force and self._loaded.get(key) == (source.size, source.mtime):
+            self.stats["skipped"] += 1
+            return False
+        return True
+
+    def _fail(self, source: _Source, message: str) -> None:
+        """"""
+        self.stats["failed"] += 1
+        if self.log is not None:
+            print(f"{source.name}: {message}", file=self.log)
+
+    def _store(self, source: _Source, parsed: Union[StationYear, str]) -> None:
+        """"""
+        if isinstance(parsed, str):
+            self._fail(source, parsed)
+            return
+        if self._indexes is None:
+            self._drop_indexes()
+        station, year = parsed.station, parsed.year
+        if self._has_data:
+            self.connection.exec_driver_sql(
+                _DELETE_YEAR, (station, f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+            )
+        self._touched.add(station)
+        if station not in self._stations:
+            self._stations.add(station)
+            self._info_rows.append(self._info_row(parsed))
+        self._rows.extend(parsed.rows)
+        self._log_rows.append(
+            (
+                station,
+                year,
+                source.size,
+                source.mtime,
+                len(parsed.rows),
+                datetime.datetime.now().isoformat(" "),
+            )
+        )
+        self.stats["loaded"] += 1
+        if len(self._rows) >= self.batch_rows:
+            self._flush()
+        if self._uncommitted >= self.commit_rows:
+            self.connection.commit()
+            self._committed.update(self._touched)
+            self._uncommitted = 0
+            if self.log is not None:
+                print(
+                    f"{self.stats['loaded']:,} station-years, "
+                    f"{self.stats['rows']:,} rows loaded",
+                    file=self.log,
+                )
+
+    def _info_row(self, parsed: StationYear) -> tuple[Any, ...]:
+        """"""
+        lat, lon = parsed.latitude, parsed.longitude
+        row: tuple[Any, ...] = (parsed.station, parsed.name, lat, lon)
+        if lat is None or lon is None:
+            row += (None, None, None)
+        else:
+            row += to_unit_vector(lat, lon)
+        if self._geom:
+            row += (lon, lat)
+        return row
+
+    def _flush(self) -> None:
+        """"""
+        connection = self.connection
+        if self._info_rows:
+            result = connection.exec_driver_sql(self._insert_info, self._info_rows)
+            self.stats["stations"] += result.rowcount
+            self._info_rows = []
+        if self._rows:
+            connection.exec_driver_sql(_INSERT_DATA, self._rows)
+            self.stats["rows"] += len(self._rows)
+            self._uncommitted += len(self._rows)
+            self._rows = []
+        if self._log_rows:
+            connection.exec_driver_sql(_INSERT_LOG, self._log_rows)
+            self._log_rows = []
+
+    def _drop_indexes(self) -> None:
+        """
+        Drop the secondary indexes of `data`, keeping their SQL; the primary key
+        stays, as it is needed to replace station-years
+        """
+        self._indexes = []
+        if not self.drop_indexes:
+            return
+        connection = self.connection
+        for name, sql in connection.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = 'data' AND sql IS NOT NULL"
+        ).all():
+            connection.exec_driver_sql(f'DROP INDEX "{name}"')
+            self._indexes.append(sql)
+        connection.commit()
+
+    def _restore_indexes(self) -> None:
+        """"""
+        if not self._indexes:
+            return
+        start = time.perf_counter()
+        for sql in self._indexes:
+            self.connection.exec_driver_sql(sql)
+        self.connection.exec_driver_sql("PRAGMA optimize")
+        self.connection.commit()
+        self._indexes = None
+        if self.log is not None:
+            print(
+                f"Indexes rebuilt in {time.perf_counter() - start:,.1f} s",
+                file=self.log,
+            )
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import datetime
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from .config import BASE_DIR, CONFIG
+from .region import Region
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from types import TracebackType
+    from typing import Any, Optional
+
+    from sqlalchemy.engine.base import Connection
+
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+
+_StationKey = tuple[str, int, int, bool, Region]
+_DataKey = tuple[str, datetime.date, bool]
+# Bumped whenever the saved keys change
+_FILE_VERSION = 4
+
+
+def database_fingerprint(connection: Connection) -> list[Any]:
+    """
+    Summary of `info` and `coverage` changing whenever stations or their data do, so
+    that a saved cache is dropped after an ingest, a migration or a coverage rebuild.
+    `coverage` is a WITHOUT ROWID table, hence its sums rather than its row ids
+    """
+    from .schema import has_table
+
+    fingerprint: list[Any] = list(
+        connection.exec_driver_sql("SELECT COUNT(*), MAX(rowid) FROM info").one()
+    )
+    if has_table(connection, "coverage"):
+        fingerprint.extend(
+            connection.exec_driver_sql(
+                "SELECT COUNT(*), SUM(data_rows), SUM(wdsp_rows), MAX(last_date) "
+                "FROM coverage"
+            ).one()
+        )
+    return fingerprint
+
+
+class _Lru(Generic[_K, _V]):
+    """"""
+
+    capacity: int
+    _items: OrderedDict[_K, _V]
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._items = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: _K) -> Optional[_V]:
+        """"""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: _K, value: _V) -> None:
+        """"""
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def items(self) -> list[tuple[_K, _V]]:
+        """"""
+        return list(self._items.items())
+
+
+class LookupCache:
+    """
+    Memoized search results: the nearest station of a region per cell of a
+    `grid`-degree latitude/longitude grid, and the date picked per `(station, date,
+    include_null_wdsp)`. Pictures in one cell share a station, so `grid` trades
+    accuracy near the boundary between two stations for fewer station queries
+    """
+
+    grid: float
+    path: Optional[Path]
+    fingerprint: Optional[list[Any]]
+    station_hits: int
+    station_misses: int
+    data_hits: int
+    data_misses: int
+    _stations: _Lru[_StationKey, str]
+    _dates: _Lru[_DataKey, datetime.date]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        *,
+        grid: float,
+        capacity: int,
+        path: Optional[Path] = None,
+        fingerprint: Optional[list[Any]] = None,
+    ) -> None:
+        self.grid = grid
+        self.path = path
+        self.fingerprint = fingerprint
+        self.station_hits = 0
+        self.station_misses = 0
+        self.data_hits = 0
+        self.data_misses = 0
+        self._stations = _Lru(capacity)
+        self._dates = _Lru(capacity)
+        # Shared by the request threads of the lookup server
+        self._lock = threading.Lock()
+        if path is not None and path.is_file():
+            self.load(path)
+
+    @classmethod
+    def from_config(cls) -> LookupCache:
+        """"""
+        config = CONFIG.lookup_cache
+        if config.path is None:
+            return cls(grid=config.grid_degrees, capacity=config.capacity)
+        from .engine import get_engine
+
+        with get_engine().connect() as connection:
+            fingerprint = database_fingerprint(connection)
+        return cls(
+            grid=config.grid_degrees,
+            capacity=config.capacity,
+            path=BASE_DIR / config.path,
+            fingerprint=fingerprint,
+        )
+
+    def __enter__(self) -> LookupCache:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if self.path is not None:
+            self.save(self.path)
+
+    def _quantize(
+        self,
+        engine: str,
+        lat: float,
+        lon: float,
+        include_null_wdsp: bool,
+        region: Region,
+    ) -> _StationKey:
+        """"""
+        # Stations without `wdsp` are skipped unless `include_null_wdsp`, and engines
+        # may break ties or round distances differently
+        return (
+            engine,
+            round(lat / self.grid),
+            round(lon / self.grid),
+            include_null_wdsp,
+            region,
+        )
+
+    def get_station(
+        self,
+        engine: str,
+        lat: float,
+        lon: float,
+        include_null_wdsp: bool,
+        region: Region,
+    ) -> Optional[str]:
+        """"""
+        with self._lock:
+            station_id = self._stations.get(
+                self._quantize(engine, lat, lon, include_null_wdsp, region)
+            )
+            if station_id is None:
+                self.station_misses += 1
+            else:
+                self.station_hits += 1
+        return station_id
+
+    def put_station(
+        self,
+        engine: str,
+        lat: float,
+        lon: float,
+        include_null_wdsp: bool,
+        region: Region,
+        station_id: str,
+    ) -> None:
+        """"""
+        with self._lock:
+            self._stations.put(
+                self._quantize(engine, lat, lon, include_null_wdsp, region), station_id
+            )
+
+    def get_date(
+        self, station_id: str, date: datetime.date, include_null_wdsp: bool
+    ) -> Optional[datetime.date]:
+        """
+        Date of the data row picked for `date` at `station_id`
+        """
+        with self._lock:
+            data_date = self._dates.get((station_id, date, include_null_wdsp))
+            if data_date is None:
+                self.data_misses += 1
+            else:
+                self.data_hits += 1
+        return data_date
+
+    def put_date(
+        self,
+        station_id: str,
+        date: datetime.date,
+        include_null_wdsp: bool,
+        data_date: datetime.date,
+    ) -> None:
+        """"""
+        with self._lock:
+            self._dates.put((station_id, date, include_null_wdsp), data_date)
+
+    def load(self, path: Path) -> None:
+        """"""
+        with path.open("rt", encoding="utf-8") as f:
+            content: dict[str, Any] = json.load(f)
+        # Entries of another database, or of this one before it changed, or of
+        # another grid would be wrong rather than just stale
+        if (
+            content.get("version") != _FILE_VERSION
+            or content.get("db_url") != CONFIG.db_url
+            or content.get("fingerprint") != self.fingerprint
+            or content.get("grid") != self.grid
+        ):
+            path.unlink(missing_ok=True)
+            return
+        for key, station_id in content["stations"]:
+            engine, lat_key, lon_key, include_null_wdsp, countries, provinces = key
+            region = Region(tuple(countries), tuple(provinces))
+            self._stations.put(
+                (engine, lat_key, lon_key, include_null_wdsp, region), station_id
+            )
+        for (station_id, date, include_null_wdsp), data_date in content["dates"]:
+            self._dates.put(
+                (station_id, datetime.date.fromisoformat(date), include_null_wdsp),
+                datetime.date.fromisoformat(data_date),
+            )
+
+    def save(self, path: Path) -> None:
+        """"""
+        with self._lock:
+            stations = self._stations.items()
+            dates = self._dates.items()
+        content = {
+            "version": _FILE_VERSION,
+            "db_url": CONFIG.db_url,
+            "fingerprint": self.fingerprint,
+            "grid": self.grid,
+            "stations": [
+                ((*key[:4], key[4].countries, key[4].provinces), station_id)
+                for key, station_id in stations
+            ],
+            "dates": [
+                ((key[0], key[1].isoformat(), key[2]), data_date.isoformat())
+                for key, data_date in dates
+            ],
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with temp_path.open("wt", encoding="utf-8") as f:
+            json.dump(content, f)
+        temp_path.replace(path)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import sqlalchemy as sa
+
+from alembic import op
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping, Sequence
+    from typing import Any, Optional
+
+    from sqlalchemy.engine.base import Connection
+    from sqlalchemy.sql.elements import ColumnElement
+    from sqlalchemy.sql.expression import TableClause
+    from sqlalchemy.sql.selectable import Select
+
+__all__ = ["DEFAULT_CHUNK_SIZE", "PROGRESS_TABLE", "backfill", "copy_rows"]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50_000
+PROGRESS_TABLE = "alembic_backfill"
+# Seconds between two throughput lines of the same backfill
+_LOG_INTERVAL = 10.0
+
+# One checkpoint per running backfill, removed once it finished
+_progress = sa.Table(
+    PROGRESS_TABLE,
+    sa.MetaData(),
+    sa.Column("name", sa.String(64), primary_key=True),
+    # `None` before the first chunk; JSON keeps integer and string keys apart
+    sa.Column("last_key", sa.JSON),
+    sa.Column("rows", sa.Integer, nullable=False),
+)
+
+
+def _get_chunk_size() -> int:
+    """
+    `-x chunk_size=N`, as read by `alembic/env.py`
+    """
+    config = op.get_context().config
+    if config is None:
+        return DEFAULT_CHUNK_SIZE
+    return config.attributes.get("backfill_chunk_size", DEFAULT_CHUNK_SIZE)
+
+
+def _get_upper_key(
+    bind: Connection,
+    table: TableClause,
+    key: ColumnElement[Any],
+    lower: Any,
+    chunk_size: int,
+) -> Any:
+    """
+    Key of the last row of the chunk after `lower`, `None` past the end of `table`
+    """
+    after = () if lower is None else (key > lower,)
+    upper = bind.execute(
+        sa.select(key)
+        .select_from(table)
+        .where(*after)
+        .order_by(key)
+        .limit(1)
+        .offset(chunk_size - 1)
+    ).scalar()
+    if upper is None:
+        upper = bind.execute(
+            sa.select(sa.func.max(key)).select_from(table).where(*after)
+        ).scalar()
+    return upper
+
+
+def _run_chunks(
+    source: TableClause,
+    key: ColumnElement[Any],
+    run: Callable[[tuple[ColumnElement[bool], ...]], int],
+    *,
+    name: str,
+    chunk_size: Optional[int],
+) -> int:
+    """
+    `run` on consecutive ranges of `chunk_size` rows of `source` by `key`, each
+    committed with a checkpoint under `name`, resuming after the last one. Return
+    the rows `run` reported, including by earlier runs
+    """
+    if chunk_size is None:
+        chunk_size = _get_chunk_size()
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        _progress.create(bind, checkfirst=True)
+        checkpoint = bind.execute(
+            sa.select(_progress.c.last_key, _progress.c.rows).where(
+                _progress.c.name == name
+            )
+        ).first()
+        if checkpoint is None:
+            lower, total = None, 0
+            bind.execute(_progress.insert().values(name=name, last_key=None, rows=0))
+        else:
+            lower, total = checkpoint
+            logger.info("Resuming backfill %s after %s (%s rows)", name, lower, total)
+
+        start = last_log = time.perf_counter()
+        done = 0
+        while (
+            upper := _get_upper_key(bind, source, key, lower, chunk_size)
+        ) is not None:
+            chunk = (key <= upper,) if lower is None else (key > lower, key <= upper)
+            # Explicit, as every statement commits by itself in the block
+            bind.exec_driver_sql("BEGIN")
+            try:
+                rows = run(chunk)
+                total += rows
+                done += rows
+                bind.execute(
+                    _progress.update()
+                    .where(_progress.c.name == name)
+                    .values(last_key=upper, rows=total)
+                )
+            except BaseException:
+                bind.exec_driver_sql("ROLLBACK")
+                raise
+            bind.exec_driver_sql("COMMIT")
+            lower = upper
+
+            now = time.perf_counter()
+            if now - last_log >= _LOG_INTERVAL:
+                logger.info(
+                    "Backfill %s: %s rows up to key %s, %s rows/s",
+                    name,
+                    f"{total:,}",
+                    upper,
+                    f"{done / (now - start):,.0f}",
+                )
+                last_log = now
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Backfill %s done: %s rows in %.1f s (%s rows/s), %s in total",
+            name,
+            f"{done:,}",
+            elapsed,
+            f"{done / max(elapsed, 1e-9):,.0f}",
+            f"{total:,}",
+        )
+
+    # Removed in the transaction of the migration, so that a crash before Alembic
+    # records the revision resumes from the finished checkpoint instead of redoing it
+    op.execute(_progress.delete().where(_progress.c.name == name))
+    if (
+        not op.get_bind()
+        .execute(sa.select(sa.func.count()).select_from(_progress))
+        .scalar()
+    ):
+        op.drop_table(PROGRESS_TABLE)
+    return total
+
+
+def backfill(
+    table: TableClause,
+    values: Mapping[str, Any],
+    *,
+    name: str,
+    where: Sequence[ColumnElement[bool]] = (),
+    key: Optional[ColumnElement[Any]] = None,
+    chunk_size: Optional[int] = None,
+) -> int:
+    """
+    `UPDATE table SET values WHERE where` in chunks of `chunk_size` rows by `key`
+    (the rowid by default), each committed with a checkpoint under `name`, so that
+    an interrupted upgrade resumes after the last chunk committed. Chunks being
+    redone when a process dies mid-commit, `values` must only depend on the row
+    itself. Return the number of rows updated, including by earlier runs.
+
+    This commits the transaction of the migration so far: its DDL must be safe to
+    run again, or skipped when already applied. `--sql` renders a single `UPDATE`
+    """
+    if op.get_context().as_sql:
+        op.execute(table.update().where(*where).values(values))
+        return 0
+    return _run_chunks(
+        table,
+        sa.literal_column(f"{table.name}.rowid") if key is None else key,
+        lambda chunk: op.get_bind()
+        .execute(table.update().where(*chunk, *where).values(values))
+        .rowcount,
+        name=name,
+        chunk_size=chunk_size,
+    )
+
+
+def copy_rows(
+    target: TableClause,
+    rows: Select[Any],
+    *,
+    name: str,
+    source: TableClause,
+    key: Optional[ColumnElement[Any]] = None,
+    chunk_size: Optional[int] = None,
+) -> int:
+    """
+    `INSERT INTO target rows`, `rows` selecting from `source`, chunked by `key` of
+    `source` and resumable like `backfill`. A chunk and its checkpoint being
+    committed together, no row is copied twice
+    """
+    if op.get_context().as_sql:
+        op.execute(target.insert().from_select(list(target.c), rows))
+        return 0
+    return _run_chunks(
+        source,
+        sa.literal_column(f"{source.name}.rowid") if key is None else key,
+        lambda chunk: op.get_bind()
+        .execute(target.insert().from_select(list(target.c), rows.where(*chunk)))
+        .rowcount,
+        name=name,
+        chunk_size=chunk_size,
+    )
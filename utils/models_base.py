@@ -2,15 +2,18 @@
 
 from __future__ import annotations
 
-import math as m
 from datetime import date
-from typing import Any, Generic, Optional, TypeVar
+from typing import TYPE_CHECKING, Any, Generic, Optional, TypeVar
 
 from sqlalchemy import Date, ForeignKey, String
+from sqlalchemy import func as f
 from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
-from .config import CONFIG
+from .distance import distance_km
+
+if TYPE_CHECKING:
+    from sqlalchemy.sql.elements import ColumnElement
 
 _DataModel = TypeVar("_DataModel", bound="DataMixin[Any]")
 _StationInfoModel = TypeVar("_StationInfoModel", bound="StationInfoMixin[Any]")
@@ -49,6 +52,23 @@ class DataMixin(_Base, Generic[_StationInfoModel]):
             f"date={self.date.isoformat()})"
         )
 
+    @classmethod
+    def get_date_key(cls, date: ColumnElement[date]) -> ColumnElement[Any]:
+        """
+        `date`, a `Date` expression, as compared with the `date` column
+        """
+        return date
+
+    @classmethod
+    def get_days_between(
+        cls, date_key: ColumnElement[Any], date: ColumnElement[date]
+    ) -> ColumnElement[float]:
+        """
+        Days from `date`, a `Date` expression, to `date_key`, a value of the `date`
+        column
+        """
+        return f.julianday(date_key) - f.julianday(date)
+
 
 class StationInfoMixin(_Base, Generic[_DataModel]):
     __abstract__ = True
@@ -77,19 +97,7 @@ class StationInfoMixin(_Base, Generic[_DataModel]):
         """"""
         if self.latitude is None or self.longitude is None:
             return None
-        # a = sin^2(|lat1-lat2|/2) + sin^2(|lon1-lon2|/2) * cos(lat1) * cos(lat2)
-        lat_diff = abs(m.radians(self.latitude) - m.radians(lat))
-        distance_a_lat = m.sin(lat_diff / 2) ** 2
-        lon_diff = abs(m.radians(self.longitude) - m.radians(lon))
-        distance_a_lon = (
-            m.sin(lon_diff / 2) ** 2
-            * m.cos(m.radians(self.latitude))
-            * m.cos(m.radians(lat))
-        )
-        distance_a = distance_a_lat + distance_a_lon
-        # radian = atan(sqrt(a/(1-a))) * 2
-        distance_rad = m.atan2(m.sqrt(distance_a), m.sqrt(1 - distance_a)) * 2
-        return distance_rad * CONFIG.earth_radius
+        return distance_km(self.latitude, self.longitude, lat, lon)
 
     @hybrid_method
     def get_distance(self, *, lat: float, lon: float) -> Optional[float]:
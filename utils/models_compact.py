@@ -0,0 +1,169 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING, Any, Optional
+
+from sqlalchemy import ForeignKey, Integer, case, cast
+from sqlalchemy import func as f
+from sqlalchemy import select
+from sqlalchemy.ext.hybrid import hybrid_method
+from sqlalchemy.orm import (
+    ColumnProperty,
+    Mapped,
+    column_property,
+    mapped_column,
+    relationship,
+)
+from sqlalchemy.types import TypeDecorator
+
+from .compact import EPOCH_JULIAN_DAY
+from .config import CONFIG
+from .distance import to_unit_vector
+from .models_base import DataMixin, StationInfoMixin
+
+if TYPE_CHECKING:
+    from typing import Union
+
+    from sqlalchemy.engine.interfaces import Dialect
+    from sqlalchemy.sql.elements import ColumnElement
+
+__all__ = ["DataCompact", "StationInfoCompact"]
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+class _Day(TypeDecorator[datetime.date]):
+    """
+    Date stored as days since 1970-01-01
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(
+        self, value: Optional[datetime.date], dialect: Dialect
+    ) -> Optional[int]:
+        """"""
+        return None if value is None else (value - _EPOCH).days
+
+    def process_result_value(
+        self, value: Optional[int], dialect: Dialect
+    ) -> Optional[datetime.date]:
+        """"""
+        return None if value is None else _EPOCH + datetime.timedelta(days=value)
+
+
+class _StationComparator(ColumnProperty.Comparator[str]):
+    """
+    `DataCompact.station == station_id` as a comparison of `station_int`, so that
+    it still seeks the primary key
+    """
+
+    def __eq__(self, other: Any) -> ColumnElement[bool]:  # pyright: ignore
+        return DataCompact.station_int == (
+            select(StationInfoCompact.station_int)
+            .where(StationInfoCompact.station_id == other)
+            .correlate_except(StationInfoCompact)
+            .scalar_subquery()
+        )
+
+
+def _unit_vector(
+    lat: Union[float, ColumnElement[float]], lon: Union[float, ColumnElement[float]]
+) -> tuple[Any, Any, Any]:
+    """"""
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return to_unit_vector(lat, lon)
+    lat_rad = f.radians(lat)
+    lon_rad = f.radians(lon)
+    return (
+        f.cos(lat_rad) * f.cos(lon_rad),
+        f.cos(lat_rad) * f.sin(lon_rad),
+        f.sin(lat_rad),
+    )
+
+
+class StationInfoCompact(StationInfoMixin["DataCompact"]):
+    """
+    `info` with the `station_int` key of the `compact` migration, ranked in SQL by
+    the unit-vector distance of `StationInfo`
+    """
+
+    station_int: Mapped[Optional[int]] = mapped_column(unique=True)
+    data: Mapped[list[DataCompact]] = relationship(back_populates="station_info")
+    unit_x: Mapped[Optional[float]]
+    unit_y: Mapped[Optional[float]]
+    unit_z: Mapped[Optional[float]]
+
+    @hybrid_method
+    def get_distance(self, *, lat: float, lon: float) -> Optional[float]:
+        """"""
+        return self._calc_distance(lat=lat, lon=lon)
+
+    @get_distance.expression
+    @classmethod
+    def _(
+        cls,
+        *,
+        lat: Union[float, ColumnElement[float]],
+        lon: Union[float, ColumnElement[float]],
+    ) -> ColumnElement[Optional[float]]:
+        """"""
+        x, y, z = _unit_vector(lat, lon)
+        # Rows written without the migration or the ingest may lack the unit vector
+        unit_x, unit_y, unit_z = (
+            f.coalesce(column, fallback)
+            for column, fallback in zip(
+                (cls.unit_x, cls.unit_y, cls.unit_z),
+                _unit_vector(cls.latitude, cls.longitude),
+            )
+        )
+        chord_sq = (
+            f.power(unit_x - x, 2) + f.power(unit_y - y, 2) + f.power(unit_z - z, 2)
+        )
+        distance_a = chord_sq / 4
+        distance_rad = f.atan2(f.sqrt(distance_a), f.sqrt(1 - distance_a)) * 2
+        return case(
+            (cls.latitude.is_(None), None),
+            (cls.longitude.is_(None), None),
+            else_=distance_rad * CONFIG.earth_radius,
+        )
+
+
+class DataCompact(DataMixin["StationInfoCompact"]):
+    """
+    `data_compact` of the `compact` migration, with the attributes of `data`
+    """
+
+    __tablename__ = "data_compact"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    station_int: Mapped[int] = mapped_column(
+        ForeignKey("info.station_int"), nullable=False, primary_key=True
+    )
+    station: Mapped[str] = column_property(
+        select(StationInfoCompact.station_id)
+        .where(StationInfoCompact.station_int == station_int)
+        .correlate_except(StationInfoCompact)
+        .scalar_subquery()
+        .label("station"),
+        comparator_factory=_StationComparator,
+    )
+    station_info: Mapped[StationInfoCompact] = relationship(back_populates="data")
+    date: Mapped[datetime.date] = mapped_column(
+        "day", _Day, nullable=False, primary_key=True
+    )
+
+    @classmethod
+    def get_date_key(cls, date: ColumnElement[datetime.date]) -> ColumnElement[Any]:
+        """"""
+        return cast(f.julianday(date) - EPOCH_JULIAN_DAY, Integer)
+
+    @classmethod
+    def get_days_between(
+        cls, date_key: ColumnElement[Any], date: ColumnElement[datetime.date]
+    ) -> ColumnElement[float]:
+        """"""
+        return date_key - cls.get_date_key(date)
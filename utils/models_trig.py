@@ -2,8 +2,7 @@
 
 from __future__ import annotations
 
-import math as m
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Optional
 
 from sqlalchemy import case
 from sqlalchemy import func as f
@@ -11,10 +10,11 @@ from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.orm import Mapped, relationship
 
 from .config import CONFIG
+from .distance import to_unit_vector
 from .models_base import DataMixin, StationInfoMixin
 
 if TYPE_CHECKING:
-    from typing import Optional
+    from typing import Union
 
     from sqlalchemy.sql.elements import ColumnElement
 
@@ -22,12 +22,31 @@ if TYPE_CHECKING:
 __all__ = ["Data", "StationInfo"]
 
 
+def _unit_vector(
+    lat: Union[float, ColumnElement[float]], lon: Union[float, ColumnElement[float]]
+) -> tuple[Any, Any, Any]:
+    """"""
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return to_unit_vector(lat, lon)
+    lat_rad = f.radians(lat)
+    lon_rad = f.radians(lon)
+    return (
+        f.cos(lat_rad) * f.cos(lon_rad),
+        f.cos(lat_rad) * f.sin(lon_rad),
+        f.sin(lat_rad),
+    )
+
+
 class Data(DataMixin["StationInfo"]):
     station_info: Mapped[StationInfo] = relationship(back_populates="data")
 
 
 class StationInfo(StationInfoMixin["Data"]):
     data: Mapped[list[Data]] = relationship(back_populates="station_info")
+    # Unit vector of (latitude, longitude), precomputed for SQL distance ranking
+    unit_x: Mapped[Optional[float]]
+    unit_y: Mapped[Optional[float]]
+    unit_z: Mapped[Optional[float]]
 
     @hybrid_method
     def get_distance(self, *, lat: float, lon: float) -> Optional[float]:
@@ -36,18 +55,28 @@ class StationInfo(StationInfoMixin["Data"]):
 
     @get_distance.expression
     @classmethod
-    def _(cls, *, lat: float, lon: float) -> ColumnElement[Optional[float]]:
+    def _(
+        cls,
+        *,
+        lat: Union[float, ColumnElement[float]],
+        lon: Union[float, ColumnElement[float]],
+    ) -> ColumnElement[Optional[float]]:
         """"""
-        # a = sin^2(|lat1-lat2|/2) + sin^2(|lon1-lon2|/2) * cos(lat1) * cos(lat2)
-        lat_diff = f.abs(f.radians(cls.latitude) - m.radians(lat))
-        distance_a_lat = f.power(f.sin(lat_diff / 2), 2)
-        lon_diff = f.abs(f.radians(cls.longitude) - m.radians(lon))
-        distance_a_lon = (
-            f.power(f.sin(lon_diff / 2), 2)
-            * f.cos(f.radians(cls.latitude))
-            * m.cos(m.radians(lat))
+        # The chord between two unit vectors is 2*sin(d/2), so the haversine term
+        # a = sin^2(d/2) is a quarter of its square and needs no per-row trigonometry
+        x, y, z = _unit_vector(lat, lon)
+        # Rows written without the migration or the ingest may lack the unit vector
+        unit_x, unit_y, unit_z = (
+            f.coalesce(column, fallback)
+            for column, fallback in zip(
+                (cls.unit_x, cls.unit_y, cls.unit_z),
+                _unit_vector(cls.latitude, cls.longitude),
+            )
+        )
+        chord_sq = (
+            f.power(unit_x - x, 2) + f.power(unit_y - y, 2) + f.power(unit_z - z, 2)
         )
-        distance_a = distance_a_lat + distance_a_lon
+        distance_a = chord_sq / 4
         # radian = atan(sqrt(a/(1-a))) * 2
         distance_rad = f.atan2(f.sqrt(distance_a), f.sqrt(1 - distance_a)) * 2
         distance = distance_rad * CONFIG.earth_radius
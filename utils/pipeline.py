@@ -0,0 +1,345 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from .batch import Photo
+from .exif import Exif
+from .profiling import stage
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+    from typing import Optional, TextIO, Union
+
+    from utils.base import BaseSearchEngine, LookupRecord
+    from utils.exif import ExifRecord
+    from utils.exif_cache import ExifCache
+    from utils.models_base import DataMixin, StationInfoMixin
+
+_DataModel = TypeVar("_DataModel", bound="DataMixin[Any]", covariant=True)
+_StationInfoModel = TypeVar(
+    "_StationInfoModel", bound="StationInfoMixin[Any]", covariant=True
+)
+_T = TypeVar("_T")
+
+FIELDS = (
+    "path",
+    "datetime",
+    "latitude",
+    "longitude",
+    "station",
+    "station_name",
+    "date",
+    "wdsp",
+    "distance_km",
+    "station_rank",
+    "days_gap",
+    "error",
+)
+
+# Seconds a blocked stage waits before checking whether another stage failed
+_POLL_INTERVAL = 0.1
+
+
+class _Stopped(Exception):
+    """"""
+
+
+def _read_record(path: Path, fast_exif: bool) -> Union[ExifRecord, str]:
+    """
+    Run in the worker processes: only the record or the error message crosses back
+    """
+    try:
+        return Exif(path, fast=fast_exif).record
+    except Exception as err:
+        return str(err) or type(err).__name__
+
+
+def _done(result: _T) -> Future[_T]:
+    """"""
+    future: Future[_T] = Future()
+    future.set_result(result)
+    return future
+
+
+class ResultWriter(ABC):
+    """"""
+
+    stream: TextIO
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    @abstractmethod
+    def write(self, row: dict[str, Any]) -> None:
+        """"""
+        ...
+
+    def flush(self) -> None:
+        """"""
+        self.stream.flush()
+
+
+class CsvWriter(ResultWriter):
+    """"""
+
+    _writer: Any
+
+    def __init__(self, stream: TextIO) -> None:
+        super().__init__(stream)
+        self._writer = csv.writer(stream)
+        self._writer.writerow(FIELDS)
+
+    def write(self, row: dict[str, Any]) -> None:
+        """"""
+        self._writer.writerow(row[field] for field in FIELDS)
+
+
+class JsonlWriter(ResultWriter):
+    """"""
+
+    def write(self, row: dict[str, Any]) -> None:
+        """"""
+        self.stream.write(json.dumps(row, ensure_ascii=False))
+        self.stream.write("\n")
+
+
+def get_writer(format: str, stream: TextIO) -> ResultWriter:
+    """"""
+    if format == "csv":
+        return CsvWriter(stream)
+    if format == "jsonl":
+        return JsonlWriter(stream)
+    raise ValueError(f"Unknown output format {format}")
+
+
+def to_row(photo: Photo, record: Optional[LookupRecord]) -> dict[str, Any]:
+    """"""
+    row: dict[str, Any] = dict.fromkeys(FIELDS)
+    row["path"] = str(photo.path)
+    row["datetime"] = None if photo.datetime is None else photo.datetime.isoformat()
+    row["latitude"] = photo.lat
+    row["longitude"] = photo.lon
+    if record is None or photo.lat is None or photo.lon is None:
+        row["error"] = photo.error or "No data found"
+        return row
+    row["station"] = record.station
+    row["station_name"] = record.station_name
+    row["date"] = record.date.isoformat()
+    row["wdsp"] = record.wdsp
+    row["distance_km"] = (
+        None if record.distance_km is None else round(record.distance_km, 3)
+    )
+    row["station_rank"] = record.station_rank
+    row["days_gap"] = record.days_gap
+    return row
+
+
+class BatchPipeline(Generic[_DataModel, _StationInfoModel]):
+    """
+    Enumerated paths are parsed by a process pool, searched in chunks by a thread and
+    written by another one as results arrive. Every hand-off is bounded, so memory
+    use does not grow with the number of pictures; output keeps the input order
+    """
+
+    SearchEngineClass: type[BaseSearchEngine[_DataModel, _StationInfoModel]]
+    jobs: int
+    chunk_size: int
+    queue_size: int
+    include_null_wdsp: bool
+    k: int
+    max_days_gap: Optional[int]
+    fast_exif: bool
+    exif_cache: Optional[ExifCache]
+    _stop: threading.Event
+    _errors: list[BaseException]
+
+    def __init__(
+        self,
+        SearchEngineClass: type[BaseSearchEngine[_DataModel, _StationInfoModel]],
+        *,
+        jobs: Optional[int] = None,
+        chunk_size: int = 256,
+        queue_size: int = 1024,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+        fast_exif: bool = True,
+        exif_cache: Optional[ExifCache] = None,
+    ) -> None:
+        self.SearchEngineClass = SearchEngineClass
+        self.jobs = jobs or os.cpu_count() or 1
+        self.chunk_size = max(chunk_size, 1)
+        self.queue_size = max(queue_size, self.chunk_size)
+        self.include_null_wdsp = include_null_wdsp
+        self.k = k
+        self.max_days_gap = max_days_gap
+        self.fast_exif = fast_exif
+        self.exif_cache = exif_cache
+        self._stop = threading.Event()
+        self._errors = []
+
+    def run(self, paths: Iterable[Path], writer: ResultWriter) -> None:
+        """"""
+        self._stop.clear()
+        self._errors.clear()
+        photos: queue.Queue[Optional[Photo]] = queue.Queue(self.queue_size)
+        rows: queue.Queue[Optional[list[dict[str, Any]]]] = queue.Queue(
+            max(self.queue_size // self.chunk_size, 1)
+        )
+        threads = (
+            threading.Thread(
+                target=self._run_stage, args=(self._search_stage, photos, rows)
+            ),
+            threading.Thread(
+                target=self._run_stage, args=(self._write_stage, rows, writer)
+            ),
+        )
+        for thread in threads:
+            thread.start()
+        try:
+            with closing(self._parse_stage(paths)) as parsed:
+                for photo in parsed:
+                    self._put(photos, photo)
+            self._put(photos, None)
+        except _Stopped:
+            pass
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _run_stage(self, stage: Callable[..., None], *args: Any) -> None:
+        """"""
+        try:
+            stage(*args)
+        except _Stopped:
+            pass
+        except BaseException as err:
+            self._errors.append(err)
+            self._stop.set()
+
+    def _put(self, q: queue.Queue[_T], item: _T) -> None:
+        """"""
+        while True:
+            if self._stop.is_set():
+                raise _Stopped
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q: queue.Queue[_T]) -> _T:
+        """"""
+        while True:
+            if self._stop.is_set():
+                raise _Stopped
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def _parse_stage(self, paths: Iterable[Path]) -> Iterator[Photo]:
+        """"""
+        if self.jobs == 1:
+            for path in paths:
+                with stage("exif"):
+                    photo = Photo.from_path(
+                        path, fast_exif=self.fast_exif, exif_cache=self.exif_cache
+                    )
+                yield photo
+            return
+        # The cache is only touched from this process, which avoids several
+        # writers contending for the SQLite lock
+        pending: deque[tuple[Path, Future[Union[ExifRecord, str]], bool]] = deque()
+        pool = ProcessPoolExecutor(self.jobs)
+        try:
+            for path in paths:
+                try:
+                    record = (
+                        None
+                        if self.exif_cache is None
+                        else self.exif_cache.get(path, fast=self.fast_exif)
+                    )
+                except OSError as err:
+                    pending.append((path, _done(str(err)), False))
+                else:
+                    if record is None:
+                        future = pool.submit(_read_record, path, self.fast_exif)
+                        pending.append((path, future, True))
+                    else:
+                        pending.append((path, _done(record), False))
+                if len(pending) >= self.queue_size:
+                    yield self._collect(*pending.popleft())
+            while pending:
+                yield self._collect(*pending.popleft())
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _collect(
+        self, path: Path, future: Future[Union[ExifRecord, str]], fresh: bool
+    ) -> Photo:
+        """"""
+        # Time spent waiting on the pool, not the parsing itself
+        with stage("exif_wait"):
+            result = future.result()
+        if isinstance(result, str):
+            return Photo(path, error=result)
+        if fresh and self.exif_cache is not None:
+            self.exif_cache.put(path, result, fast=self.fast_exif)
+        return Photo.from_record(path, result)
+
+    def _search_stage(
+        self,
+        photos: queue.Queue[Optional[Photo]],
+        rows: queue.Queue[Optional[list[dict[str, Any]]]],
+    ) -> None:
+        """"""
+        chunk: list[Photo] = []
+        while (photo := self._get(photos)) is not None:
+            chunk.append(photo)
+            # Search right away when the parsers are the bottleneck rather than
+            # holding finished pictures back until a full chunk is available
+            if len(chunk) >= self.chunk_size or photos.empty():
+                self._put(rows, self._search_chunk(chunk))
+                chunk = []
+        if chunk:
+            self._put(rows, self._search_chunk(chunk))
+        self._put(rows, None)
+
+    def _search_chunk(self, chunk: list[Photo]) -> list[dict[str, Any]]:
+        """"""
+        with stage("search"):
+            results = self.SearchEngineClass.lookup_batch(
+                chunk,
+                include_null_wdsp=self.include_null_wdsp,
+                k=self.k,
+                max_days_gap=self.max_days_gap,
+            )
+        return [to_row(photo, data) for photo, data in zip(chunk, results)]
+
+    def _write_stage(
+        self, rows: queue.Queue[Optional[list[dict[str, Any]]]], writer: ResultWriter
+    ) -> None:
+        """"""
+        while (chunk := self._get(rows)) is not None:
+            with stage("write"):
+                for row in chunk:
+                    writer.write(row)
+                writer.flush()
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from contextlib import AbstractContextManager
+    from types import TracebackType
+    from typing import Optional
+
+__all__ = ["Profiler", "stage"]
+
+# Returned by `stage` while nothing is being profiled; `nullcontext` is reusable
+_NULL_STAGE: AbstractContextManager[None] = nullcontext()
+_active: Optional[Profiler] = None
+_STATEMENT_WIDTH = 100
+
+
+def stage(name: str) -> AbstractContextManager[None]:
+    """
+    Time the enclosed block as stage `name` of the active profiler, if any
+    """
+    profiler = _active
+    return _NULL_STAGE if profiler is None else profiler.stage(name)
+
+
+class _Timing:
+    """"""
+
+    __slots__ = ("count", "total")
+
+    count: int
+    total: float
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, elapsed: float) -> None:
+        """"""
+        self.count += 1
+        self.total += elapsed
+
+    def to_dict(self) -> dict[str, Any]:
+        """"""
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1e3, 3),
+            "mean_ms": round(self.total * 1e3 / self.count, 3) if self.count else 0,
+        }
+
+
+class Profiler:
+    """
+    Wall time per named stage and, through cursor events on every engine, count and
+    time per distinct SQL statement, optionally with its `EXPLAIN QUERY PLAN`.
+    Nothing is hooked until it is entered, so code paths cost nothing while no
+    profiler is active
+    """
+
+    explain: bool
+    stages: dict[str, _Timing]
+    statements: dict[str, _Timing]
+    plans: dict[str, list[str]]
+    _lock: threading.Lock
+
+    def __init__(self, *, explain: bool = False) -> None:
+        self.explain = explain
+        self.stages = {}
+        self.statements = {}
+        self.plans = {}
+        # Stages also run on the batch pipeline threads
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> Profiler:
+        global _active
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        if _active is not None:
+            raise RuntimeError("Another profiler is already active")
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        _active = self
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        global _active
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        _active = None
+        event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[None, None, None]:
+        """"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                timing = self.stages.get(name)
+                if timing is None:
+                    timing = self.stages[name] = _Timing()
+                timing.add(elapsed)
+
+    def _before_cursor_execute(
+        self,
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        """"""
+        conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        """"""
+        elapsed = time.perf_counter() - conn.info["profile_start"].pop()
+        key = " ".join(statement.split())
+        with self._lock:
+            timing = self.statements.get(key)
+            first = timing is None
+            if timing is None:
+                timing = self.statements[key] = _Timing()
+            timing.add(elapsed)
+        if first and self.explain and not executemany:
+            self._capture_plan(conn, key, statement, parameters)
+
+    def _capture_plan(
+        self, conn: Any, key: str, statement: str, parameters: Any
+    ) -> None:
+        """"""
+        if conn.dialect.name != "sqlite" or not key.upper().startswith(
+            ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+        ):
+            return
+        # A cursor of its own: the statement's results have not been fetched yet,
+        # and raw DB-API calls do not fire these events again
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        except Exception as err:
+            plan = [f"unavailable: {err}"]
+        finally:
+            cursor.close()
+        with self._lock:
+            self.plans[key] = plan
+
+    def to_dict(self) -> dict[str, Any]:
+        """"""
+        with self._lock:
+            return {
+                "stages": {
+                    name: timing.to_dict() for name, timing in self.stages.items()
+                },
+                "sql": {
+                    "count": sum(t.count for t in self.statements.values()),
+                    "total_ms": round(
+                        sum(t.total for t in self.statements.values()) * 1e3, 3
+                    ),
+                    "statements": [
+                        {
+                            "statement": statement,
+                            **timing.to_dict(),
+                            **(
+                                {"plan": self.plans[statement]}
+                                if statement in self.plans
+                                else {}
+                            ),
+                        }
+                        for statement, timing in sorted(
+                            self.statements.items(), key=lambda item: -item[1].total
+                        )
+                    ],
+                },
+            }
+
+    def to_json(self) -> str:
+        """"""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def format_table(self) -> str:
+        """"""
+        report = self.to_dict()
+        lines = [f"{'Stage':<24}{'Count':>8}{'Total ms':>12}{'Mean ms':>12}"]
+        for name, timing in report["stages"].items():
+            lines.append(
+                f"{name:<24}{timing['count']:>8,}{timing['total_ms']:>12,.3f}"
+                f"{timing['mean_ms']:>12,.3f}"
+            )
+        sql = report["sql"]
+        lines.append("")
+        lines.append(
+            f"SQL: {sql['count']:,} executions of {len(sql['statements']):,} "
+            f"statements, {sql['total_ms']:,.3f} ms"
+        )
+        for statement in sql["statements"]:
+            text = statement["statement"]
+            if len(text) > _STATEMENT_WIDTH:
+                text = f"{text[:_STATEMENT_WIDTH - 3]}..."
+            lines.append(
+                f"{statement['count']:>8,}{statement['total_ms']:>12,.3f}  {text}"
+            )
+            for step in statement.get("plan", ()):
+                lines.append(f"{'':>22}{step}")
+        return "\n".join(lines)
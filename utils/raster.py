@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import math as m
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .distance import distance_km_array, haversine
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from pathlib import Path
+    from typing import Any, Optional
+
+    from numpy.typing import NDArray
+
+__all__ = ["StationRaster", "build_raster", "raster_fingerprint", "open_raster"]
+
+RASTER_VERSION = 1
+# Default bounds: the bounding box of the stations, widened by this many degrees
+_PAD_DEGREES = 1.0
+# Stations within this relative margin of the bound stay candidates, so that rounding
+# never drops the station SQL would pick
+_MARGIN = 1e-9
+# Cells per side of the tiles stations are first narrowed to
+_TILE_CELLS = 32
+
+
+def raster_fingerprint(
+    stations: Sequence[tuple[str, float, float]],
+    *,
+    cell_degrees: float,
+    bounds: Optional[Sequence[float]] = None,
+) -> str:
+    """
+    Hash of everything a raster is built from, naming its folder
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([RASTER_VERSION, cell_degrees, bounds]).encode())
+    for station_id, lat, lon in stations:
+        digest.update(f"{station_id}\t{lat!r}\t{lon!r}\n".encode())
+    return digest.hexdigest()
+
+
+def _reach(lats: Any, height: float, width: float) -> Any:
+    """
+    Kilometres from the center of `height` x `width` degree boxes centered on `lats`
+    to their furthest point, one of their corners
+    """
+    return np.maximum(
+        distance_km_array(lats, 0, lats + height / 2, width / 2),
+        distance_km_array(lats, 0, lats - height / 2, width / 2),
+    )
+
+
+def build_raster(
+    stations: Sequence[tuple[str, float, float]],
+    directory: Path,
+    *,
+    cell_degrees: float,
+    bounds: Optional[Sequence[float]] = None,
+) -> dict[str, Any]:
+    """
+    Write the nearest-station partition of `stations` over a `cell_degrees` grid
+    covering `bounds` (south, north, west, east). A cell keeps every station within
+    the distance of its nearest one from the cell center plus twice the reach of the
+    cell, which by the triangle inequality holds the nearest station of every point
+    of the cell. Return the metadata also written to `meta.json`
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    station_ids = np.array([row[0] for row in stations], dtype="S12")
+    lats = np.array([row[1] for row in stations], dtype=np.float64)
+    lons = np.array([row[2] for row in stations], dtype=np.float64)
+    if bounds is not None:
+        south, north, west, east = map(float, bounds)
+    elif len(stations):
+        south = max(float(lats.min()) - _PAD_DEGREES, -90.0)
+        north = min(float(lats.max()) + _PAD_DEGREES, 90.0)
+        west = max(float(lons.min()) - _PAD_DEGREES, -180.0)
+        east = min(float(lons.max()) + _PAD_DEGREES, 180.0)
+    else:
+        south = north = west = east = 0.0
+    rows = max(m.ceil((north - south) / cell_degrees), 1)
+    cols = max(m.ceil((east - west) / cell_degrees), 1)
+
+    center_lats = south + (np.arange(rows) + 0.5) * cell_degrees
+    center_lons = west + (np.arange(cols) + 0.5) * cell_degrees
+    reach = _reach(center_lats, cell_degrees, cell_degrees)
+    cell_ids: list[NDArray[np.int64]] = []
+    cell_candidates: list[NDArray[np.int32]] = []
+    # The same bound, first from the center of a tile of cells, leaves only the
+    # stations that can be nearest to some point of the tile
+    for top in range(0, rows if len(stations) else 0, _TILE_CELLS):
+        tile_lats = center_lats[top : top + _TILE_CELLS]
+        tile_height = len(tile_lats) * cell_degrees
+        tile_lat = south + top * cell_degrees + tile_height / 2
+        for left in range(0, cols, _TILE_CELLS):
+            tile_lons = center_lons[left : left + _TILE_CELLS]
+            tile_width = len(tile_lons) * cell_degrees
+            tile_lon = west + left * cell_degrees + tile_width / 2
+            distances = distance_km_array(tile_lat, tile_lon, lats, lons)
+            limit = distances.min() + 2 * _reach(tile_lat, tile_height, tile_width)
+            near = np.flatnonzero(distances <= limit * (1 + _MARGIN))
+
+            distances = distance_km_array(
+                np.repeat(tile_lats, len(tile_lons))[:, None],
+                np.tile(tile_lons, len(tile_lats))[:, None],
+                lats[near][None, :],
+                lons[near][None, :],
+            )
+            limit = distances.min(axis=1) + 2 * np.repeat(
+                reach[top : top + _TILE_CELLS], len(tile_lons)
+            )
+            cells, candidates = np.nonzero(
+                distances <= (limit * (1 + _MARGIN))[:, None]
+            )
+            cell_ids.append(
+                (top + cells // len(tile_lons)) * cols + left + cells % len(tile_lons)
+            )
+            cell_candidates.append(near[candidates].astype(np.int32))
+    all_ids = np.concatenate(cell_ids) if cell_ids else np.empty(0, dtype=np.int64)
+    order = np.argsort(all_ids, kind="stable")
+    counts = np.bincount(all_ids, minlength=rows * cols)
+    offsets = np.zeros(rows * cols + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    np.save(directory / "station_id.npy", station_ids)
+    np.save(directory / "station_lat.npy", lats)
+    np.save(directory / "station_lon.npy", lons)
+    np.save(directory / "offsets.npy", offsets)
+    np.save(
+        directory / "candidates.npy",
+        (
+            np.concatenate(cell_candidates)[order]
+            if cell_candidates
+            else np.empty(0, dtype=np.int32)
+        ),
+    )
+    meta = {
+        "version": RASTER_VERSION,
+        "fingerprint": raster_fingerprint(
+            stations, cell_degrees=cell_degrees, bounds=bounds
+        ),
+        "stations": len(stations),
+        "south": south,
+        "west": west,
+        "cell_degrees": cell_degrees,
+        "rows": rows,
+        "cols": cols,
+        "max_candidates": int(counts.max()),
+        "single_candidate_cells": int((counts == 1).sum()),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    # Written last: a folder without it is an interrupted build
+    with (directory / "meta.json").open("wt", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def open_raster(
+    directory: Path,
+    stations: Sequence[tuple[str, float, float]],
+    *,
+    cell_degrees: float,
+    bounds: Optional[Sequence[float]] = None,
+) -> StationRaster:
+    """
+    The raster of `stations` under `directory`, built first if they, the cell size or
+    the bounds changed since the last build. Each build goes to its own folder named
+    by fingerprint, so processes still mapping an older one are left alone
+    """
+    fingerprint = raster_fingerprint(stations, cell_degrees=cell_degrees, bounds=bounds)
+    path = directory / fingerprint[:16]
+    if not (path / "meta.json").is_file():
+        temp_path = directory / f".{fingerprint[:16]}.{os.getpid()}.tmp"
+        build_raster(stations, temp_path, cell_degrees=cell_degrees, bounds=bounds)
+        try:
+            temp_path.rename(path)
+        # Built concurrently by another process
+        except OSError:
+            for child in temp_path.iterdir():
+                child.unlink()
+            temp_path.rmdir()
+    return StationRaster(path)
+
+
+class StationRaster:
+    """
+    Read-only view of a built raster. The stations of cell `i = row * cols + col`
+    are `candidates[offsets[i]:offsets[i + 1]]`, a single one away from the borders
+    between stations
+    """
+
+    directory: Path
+    meta: dict[str, Any]
+    south: float
+    west: float
+    cell_degrees: float
+    rows: int
+    cols: int
+    station_ids: NDArray[np.bytes_]
+    latitudes: NDArray[np.float64]
+    longitudes: NDArray[np.float64]
+    offsets: NDArray[np.int64]
+    candidates: NDArray[np.int32]
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        with (directory / "meta.json").open("rt", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != RASTER_VERSION:
+            raise ValueError(f"Unsupported raster version in {directory}")
+        self.south = self.meta["south"]
+        self.west = self.meta["west"]
+        self.cell_degrees = self.meta["cell_degrees"]
+        self.rows = self.meta["rows"]
+        self.cols = self.meta["cols"]
+        self.station_ids = self._load("station_id")
+        self.latitudes = self._load("station_lat")
+        self.longitudes = self._load("station_lon")
+        self.offsets = self._load("offsets")
+        self.candidates = self._load("candidates")
+
+    def _load(self, name: str) -> Any:
+        """"""
+        return np.load(self.directory / f"{name}.npy", mmap_mode="r")
+
+    def nearest(self, lat: float, lon: float) -> Optional[str]:
+        """
+        Nearest station, ties broken by station id like `StationIndex.nearest`, or
+        `None` outside of the raster
+        """
+        row = m.floor((lat - self.south) / self.cell_degrees)
+        col = m.floor((lon - self.west) / self.cell_degrees)
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        cell = row * self.cols + col
+        start, end = int(self.offsets[cell]), int(self.offsets[cell + 1])
+        if start == end:
+            return None
+        if end - start == 1:
+            return self.station_ids[self.candidates[start]].decode()
+        best = min(
+            self.candidates[start:end].tolist(),
+            key=lambda i: (
+                haversine(self.latitudes[i], self.longitudes[i], lat, lon),
+                self.station_ids[i],
+            ),
+        )
+        return self.station_ids[best].decode()
@@ -0,0 +1,55 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from .config import CONFIG
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from sqlalchemy.sql.elements import ColumnElement
+
+    from utils.models_base import StationInfoMixin
+
+__all__ = ["Region"]
+
+
+@dataclass(frozen=True)
+class Region:
+    """
+    Stations searched by the engines: those in any of `countries` and any of
+    `provinces`, an empty tuple leaving that column unrestricted. `Region()` searches
+    every station
+    """
+
+    countries: tuple[str, ...] = ()
+    provinces: tuple[str, ...] = ()
+
+    @classmethod
+    def from_config(cls) -> Region:
+        """"""
+        config = CONFIG.region
+        return cls(tuple(config.countries), tuple(config.provinces))
+
+    def __str__(self) -> str:
+        if not self.countries and not self.provinces:
+            return "global"
+        return "/".join(
+            ",".join(names) or "*" for names in (self.countries, self.provinces)
+        )
+
+    def get_filters(
+        self, StationInfoModel: type[StationInfoMixin[Any]]
+    ) -> tuple[ColumnElement[bool], ...]:
+        """
+        `info` filters of the region, served by the partial `ix_info_region` index
+        """
+        filters: list[ColumnElement[bool]] = []
+        if self.countries:
+            filters.append(StationInfoModel.country.in_(self.countries))
+        if self.provinces:
+            filters.append(StationInfoModel.province.in_(self.provinces))
+        return tuple(filters)
@@ -0,0 +1,137 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+from argparse import Namespace
+from typing import TYPE_CHECKING
+
+from .config import BASE_DIR
+from .coverage import COVERAGE_DDL, COVERAGE_FILL
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine.base import Connection
+
+__all__ = [
+    "DATA_DDL",
+    "FLOAT_COLUMNS",
+    "apply_non_spatial_migrations",
+    "create_tables",
+    "has_table",
+    "table_columns",
+    "upgrade_database",
+]
+
+# `data` columns besides `station`, `date` and `frshtt`, in table order
+FLOAT_COLUMNS = (
+    "temp",
+    "dewp",
+    "slp",
+    "stp",
+    "visib",
+    "wdsp",
+    "mxspd",
+    "gust",
+    "max",
+    "min",
+    "prcp",
+    "sndp",
+)
+
+# The tables as shipped in `noaa.db`, before any migration
+_INFO_DDL = """
+CREATE TABLE info (
+    station_id VARCHAR(12) NOT NULL PRIMARY KEY,
+    name VARCHAR(50),
+    latitude FLOAT,
+    longitude FLOAT,
+    country VARCHAR(20),
+    province VARCHAR(20),
+    city VARCHAR(20),
+    district VARCHAR(20)
+)
+"""
+DATA_DDL = f"""
+CREATE TABLE data (
+    station VARCHAR(12) NOT NULL REFERENCES info (station_id),
+    date DATE NOT NULL,
+    {", ".join(f"{column} FLOAT" for column in FLOAT_COLUMNS)},
+    frshtt INTEGER,
+    PRIMARY KEY (station, date)
+)
+"""
+# What migrations 4b1f3c9e7a2d, 2c7e9b40d5a1, 9d4e6b2f8a13, 5f2a8c1d7e94 and
+# 7c3e1a9b4d52 add, minus the SpatiaLite geometry
+_NON_SPATIAL_DDL = (
+    "ALTER TABLE info ADD COLUMN unit_x FLOAT",
+    "ALTER TABLE info ADD COLUMN unit_y FLOAT",
+    "ALTER TABLE info ADD COLUMN unit_z FLOAT",
+    "CREATE INDEX ix_info_latitude ON info (latitude)",
+    "CREATE INDEX ix_info_longitude ON info (longitude)",
+    "UPDATE info SET "
+    "unit_x = cos(radians(latitude)) * cos(radians(longitude)), "
+    "unit_y = cos(radians(latitude)) * sin(radians(longitude)), "
+    "unit_z = sin(radians(latitude)) "
+    "WHERE latitude IS NOT NULL AND longitude IS NOT NULL",
+    "CREATE INDEX ix_data_station_date_wdsp ON data (station, date) "
+    "WHERE wdsp IS NOT NULL",
+    "CREATE TABLE ingest_log ("
+    "station VARCHAR(12) NOT NULL, "
+    "year INTEGER NOT NULL, "
+    "size INTEGER NOT NULL, "
+    "mtime INTEGER NOT NULL, "
+    "rows INTEGER NOT NULL, "
+    "loaded_at DATETIME NOT NULL, "
+    "PRIMARY KEY (station, year))",
+    COVERAGE_DDL,
+    COVERAGE_FILL,
+    "CREATE INDEX ix_info_region ON info (country, province) "
+    "WHERE latitude IS NOT NULL AND longitude IS NOT NULL",
+    "ANALYZE info",
+)
+
+
+def has_table(connection: Connection, name: str) -> bool:
+    """"""
+    return (
+        connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).first()
+        is not None
+    )
+
+
+def table_columns(connection: Connection, name: str) -> list[str]:
+    """"""
+    return [row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({name})")]
+
+
+def create_tables(connection: Connection) -> None:
+    """
+    Create `info` and `data` in an empty SQLite database, as they were before the
+    first migration
+    """
+    connection.exec_driver_sql(_INFO_DDL)
+    connection.exec_driver_sql(DATA_DDL)
+
+
+def apply_non_spatial_migrations(connection: Connection) -> None:
+    """
+    Add what the migrations add without SpatiaLite to the tables of `create_tables`,
+    which is enough for every engine but GIS. Run it after bulk loads, as it builds
+    indexes and fills `unit_x/y/z` and `coverage` of the stations already there
+    """
+    for statement in _NON_SPATIAL_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def upgrade_database(url: str) -> None:
+    """
+    `alembic upgrade head` on the database at `url`, which needs SpatiaLite
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "alembic"))
+    config.cmd_opts = Namespace(x=[f"db_url={url}"])
+    command.upgrade(config, "head")
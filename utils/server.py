@@ -0,0 +1,295 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import os
+import socketserver
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import Photo
+from .pipeline import to_row
+
+if TYPE_CHECKING:
+    from typing import Optional, Union
+
+    from utils.base import BaseSearchEngine
+    from utils.lookup_cache import LookupCache
+    from utils.models_base import DataMixin, StationInfoMixin
+
+    _SearchEngineClass = type[BaseSearchEngine[DataMixin[Any], StationInfoMixin[Any]]]
+
+
+logger = logging.getLogger(__name__)
+
+
+class _BadRequest(Exception):
+    """"""
+
+
+def _get_param(params: dict[str, list[str]], name: str) -> str:
+    """"""
+    values = params.get(name)
+    if not values:
+        raise _BadRequest(f"Missing parameter {name}")
+    return values[-1]
+
+
+def _get_flag(params: dict[str, list[str]], name: str) -> bool:
+    """"""
+    return params.get(name, ["false"])[-1].lower() in ("1", "true", "yes")
+
+
+def _get_int(params: dict[str, list[str]], name: str, *, minimum: int) -> Optional[int]:
+    """"""
+    values = params.get(name)
+    if not values:
+        return None
+    value = int(values[-1])
+    if value < minimum:
+        raise _BadRequest(f"Parameter {name} must be at least {minimum}")
+    return value
+
+
+class LookupService:
+    """
+    Everything kept warm between requests: the search engine class with its shared
+    database engine and station index, and the lookup cache
+    """
+
+    SearchEngineClass: _SearchEngineClass
+    lookup_cache: Optional[LookupCache]
+    fast_exif: bool
+
+    def __init__(
+        self,
+        SearchEngineClass: _SearchEngineClass,
+        *,
+        lookup_cache: Optional[LookupCache] = None,
+        fast_exif: bool = True,
+    ) -> None:
+        self.SearchEngineClass = SearchEngineClass
+        self.lookup_cache = lookup_cache
+        self.fast_exif = fast_exif
+
+    def warm_up(self) -> None:
+        """"""
+        # Opens the first connection and builds whatever the engine keeps in memory
+        search_engine = self.SearchEngineClass(lat=0, lon=0)
+        with search_engine.get_connection() as connection:
+            try:
+                search_engine.search_station(connection)
+            except ValueError:
+                pass
+
+    def lookup(
+        self,
+        lat: float,
+        lon: float,
+        date: Optional[datetime.date],
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """"""
+        photo = Photo(Path(), datetime=None, lat=lat, lon=lon)
+        row = self._search(
+            photo,
+            date,
+            include_null_wdsp=include_null_wdsp,
+            k=k,
+            max_days_gap=max_days_gap,
+        )
+        del row["path"], row["datetime"]
+        return row
+
+    def lookup_photo(
+        self,
+        path: Path,
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """"""
+        photo = Photo.from_path(path, fast_exif=self.fast_exif)
+        return self._search(
+            photo,
+            photo.date,
+            include_null_wdsp=include_null_wdsp,
+            k=k,
+            max_days_gap=max_days_gap,
+        )
+
+    def _search(
+        self,
+        photo: Photo,
+        date: Optional[datetime.date],
+        *,
+        include_null_wdsp: bool = False,
+        k: int = 1,
+        max_days_gap: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """"""
+        if photo.lat is None or photo.lon is None:
+            return to_row(photo, None)
+        search_engine = self.SearchEngineClass(
+            lat=photo.lat, lon=photo.lon, date=date, cache=self.lookup_cache
+        )
+        with search_engine.get_connection() as connection:
+            try:
+                record = search_engine.lookup(
+                    connection,
+                    include_null_wdsp=include_null_wdsp,
+                    k=k,
+                    max_days_gap=max_days_gap,
+                )
+            except ValueError as err:
+                row = to_row(photo, None)
+                row["error"] = str(err)
+                return row
+        return to_row(photo, record)
+
+    def stats(self) -> dict[str, Any]:
+        """"""
+        stats: dict[str, Any] = {
+            "engine": self.SearchEngineClass.__name__,
+            "region": str(self.SearchEngineClass.get_region()),
+        }
+        if self.lookup_cache is not None:
+            stats["lookup_cache"] = {
+                "station_hits": self.lookup_cache.station_hits,
+                "station_misses": self.lookup_cache.station_misses,
+                "data_hits": self.lookup_cache.data_hits,
+                "data_misses": self.lookup_cache.data_misses,
+            }
+        return stats
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """
+    `GET /lookup?lat=&lon=[&date=]`, `GET /photo?path=` and `GET /stats`, answered
+    with JSON. `include_null_wdsp=1`, `k=` and `max_days_gap=` may be added to both
+    lookups
+    """
+
+    # Keep-alive, so that a client pays for the connection once
+    protocol_version = "HTTP/1.1"
+    # Buffered, so that headers and body leave in one segment instead of waiting on
+    # Nagle's algorithm and the client's delayed acknowledgement
+    wbufsize = -1
+    server: Union[LookupHTTPServer, LookupUnixServer]
+
+    def do_GET(self) -> None:
+        """"""
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        service = self.server.service
+        try:
+            options: dict[str, Any] = {
+                "include_null_wdsp": _get_flag(params, "include_null_wdsp"),
+                "k": _get_int(params, "k", minimum=1) or 1,
+                "max_days_gap": _get_int(params, "max_days_gap", minimum=0),
+            }
+            if url.path == "/lookup":
+                date_str = params.get("date", [None])[-1]
+                lat = float(_get_param(params, "lat"))
+                lon = float(_get_param(params, "lon"))
+                if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+                    raise _BadRequest(f"Invalid position lat={lat}, lon={lon}")
+                body = service.lookup(
+                    lat,
+                    lon,
+                    None if date_str is None else datetime.date.fromisoformat(date_str),
+                    **options,
+                )
+            elif url.path == "/photo":
+                body = service.lookup_photo(Path(_get_param(params, "path")), **options)
+            elif url.path == "/stats":
+                body = service.stats()
+            else:
+                self._send(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+                return
+        except (_BadRequest, ValueError) as err:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(err)})
+            return
+        # Anything else, such as a locked database or a missing shard, still gets an
+        # answer instead of a dropped connection
+        except Exception as err:
+            logger.exception("Failed to handle %s", self.path)
+            self._send(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                {"error": f"{type(err).__name__}: {err}"},
+            )
+            return
+        self._send(HTTPStatus.OK, body)
+
+    def _send(self, status: HTTPStatus, body: dict[str, Any]) -> None:
+        """"""
+        content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """"""
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class LookupHTTPServer(ThreadingHTTPServer):
+    """"""
+
+    daemon_threads = True
+    service: LookupService
+    quiet: bool
+
+    def __init__(
+        self, address: tuple[str, int], service: LookupService, *, quiet: bool = False
+    ) -> None:
+        super().__init__(address, LookupRequestHandler)
+        self.service = service
+        self.quiet = quiet
+
+
+class LookupUnixServer(socketserver.ThreadingUnixStreamServer):
+    """
+    The same HTTP protocol over a Unix socket, which skips the TCP stack and is only
+    reachable through file system permissions
+    """
+
+    daemon_threads = True
+    service: LookupService
+    quiet: bool
+
+    def __init__(
+        self, path: Path, service: LookupService, *, quiet: bool = False
+    ) -> None:
+        if path.is_socket():
+            path.unlink()
+        super().__init__(str(path), LookupRequestHandler)
+        self.service = service
+        self.quiet = quiet
+
+    def server_close(self) -> None:
+        """"""
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+    def get_request(self) -> tuple[Any, Any]:
+        """"""
+        # `BaseHTTPRequestHandler` expects a (host, port) client address
+        request, _ = super().get_request()
+        return request, ("unix", 0)
@@ -0,0 +1,332 @@
+# pyright: reportMissingTypeStubs=false
+
+from __future__ import annotations
+
+import datetime
+import math as m
+import re
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, ClassVar, NamedTuple
+
+from .config import BASE_DIR, CONFIG
+from .profiling import stage
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Any, Optional
+
+    from sqlalchemy.engine.base import Connection
+
+__all__ = ["MAX_ATTACHED", "Shard", "ShardSet", "merge_shards", "split_data"]
+
+_SHARD_NAME = re.compile(r"^data_(\d{4})(?:-(\d{4}))?\.db$")
+# SQLite's default SQLITE_MAX_ATTACHED
+MAX_ATTACHED = 10
+# Shards attached on each side of the one holding the date
+NEIGHBOURS = 1
+# Configured pragmas that SQLite applies per schema rather than per connection
+_SCHEMA_PRAGMAS = ("cache_size", "mmap_size")
+
+
+class Shard(NamedTuple):
+    """
+    One file holding the `data` rows of the years `first_year` to `last_year`
+    """
+
+    first_year: int
+    last_year: int
+    path: Path
+
+    @property
+    def schema(self) -> str:
+        """"""
+        return f"shard_{self.first_year}"
+
+    @property
+    def first_date(self) -> datetime.date:
+        """"""
+        return datetime.date(self.first_year, 1, 1)
+
+    @property
+    def last_date(self) -> datetime.date:
+        """"""
+        return datetime.date(self.last_year, 12, 31)
+
+
+def _shard_name(first_year: int, last_year: int) -> str:
+    """"""
+    if first_year == last_year:
+        return f"data_{first_year}.db"
+    return f"data_{first_year}-{last_year}.db"
+
+
+class ShardSet:
+    """
+    The shard files of a folder, in date order. Lookups attach the shard holding
+    their date and its neighbours, and read them through a temporary `data` view
+    """
+
+    directory: Path
+    shards: tuple[Shard, ...]
+
+    _loaded: ClassVar[dict[Path, ShardSet]] = {}
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        shards: list[Shard] = []
+        for path in directory.iterdir():
+            match = _SHARD_NAME.match(path.name)
+            if match is None:
+                continue
+            first_year = int(match[1])
+            last_year = first_year if match[2] is None else int(match[2])
+            shards.append(Shard(first_year, last_year, path.resolve()))
+        shards.sort()
+        if not shards:
+            raise FileNotFoundError(f"No data shards in {directory}")
+        for previous, shard in zip(shards, shards[1:]):
+            if shard.first_year <= previous.last_year:
+                raise ValueError(f"{previous.path} and {shard.path} overlap")
+        self.shards = tuple(shards)
+
+    @classmethod
+    def from_config(cls) -> Optional[ShardSet]:
+        """
+        Shards of `CONFIG.shards.path`, scanned once per process, or `None` when
+        `data` is read from the main database
+        """
+        if CONFIG.shards.path is None:
+            return None
+        directory = BASE_DIR / CONFIG.shards.path
+        shard_set = cls._loaded.get(directory)
+        if shard_set is None:
+            shard_set = cls._loaded[directory] = cls(directory)
+        return shard_set
+
+    def home(self, date: datetime.date) -> int:
+        """
+        Index of the shard holding `date`, or of the nearest one
+        """
+        for i, shard in enumerate(self.shards):
+            if date <= shard.last_date:
+                if date >= shard.first_date or i == 0:
+                    return i
+                previous = self.shards[i - 1]
+                if (shard.first_date - date) < (date - previous.last_date):
+                    return i
+                return i - 1
+        return len(self.shards) - 1
+
+    def window(self, date: datetime.date) -> tuple[Shard, ...]:
+        """
+        The shard holding `date` and its neighbours
+        """
+        return self.around(self.home(date))
+
+    def around(self, home: int) -> tuple[Shard, ...]:
+        """"""
+        return self.shards[max(home - NEIGHBOURS, 0) : home + NEIGHBOURS + 1]
+
+    def chunks(self, date: datetime.date) -> list[tuple[Shard, ...]]:
+        """
+        Every shard, as runs of consecutive shards that can be attached together,
+        nearest to `date` first
+        """
+        chunks = [
+            self.shards[i : i + MAX_ATTACHED]
+            for i in range(0, len(self.shards), MAX_ATTACHED)
+        ]
+        return sorted(chunks, key=lambda chunk: self.distance_days(chunk, date))
+
+    def bound_days(self, window: Sequence[Shard], date: datetime.date) -> float:
+        """
+        Days from `date` within which every row is in `window`: rows outside it are
+        further away than that
+        """
+        bound = m.inf
+        if window[0] != self.shards[0]:
+            bound = min(bound, (date - window[0].first_date).days)
+        if window[-1] != self.shards[-1]:
+            bound = min(bound, (window[-1].last_date - date).days)
+        return bound
+
+    @staticmethod
+    def distance_days(window: Sequence[Shard], date: datetime.date) -> int:
+        """
+        Days from `date` to the nearest date `window` can hold
+        """
+        if date < window[0].first_date:
+            return (window[0].first_date - date).days
+        if date > window[-1].last_date:
+            return (date - window[-1].last_date).days
+        return 0
+
+    def attach(self, connection: Connection, window: Sequence[Shard]) -> None:
+        """
+        Attach exactly the shards of `window` to `connection`, detaching the others,
+        and point the temporary `data` view at them. Needs no transaction to be open
+        on the connection
+        """
+        wanted = tuple(shard.path for shard in window)
+        info = connection.info
+        if info.get("shards") == wanted:
+            return
+        with stage("attach"):
+            attached: dict[Path, Shard] = info.get("attached_shards", {})
+            connection.exec_driver_sql("DROP VIEW IF EXISTS temp.data")
+            for path, shard in list(attached.items()):
+                if path not in wanted:
+                    connection.exec_driver_sql(f"DETACH DATABASE {shard.schema}")
+                    del attached[path]
+            for shard in window:
+                if shard.path not in attached:
+                    self._attach_one(connection, shard)
+                    attached[shard.path] = shard
+            connection.exec_driver_sql(
+                "CREATE TEMP VIEW data AS "
+                + " UNION ALL ".join(
+                    f"SELECT * FROM {shard.schema}.data" for shard in window
+                )
+            )
+            info["attached_shards"] = attached
+            info["shards"] = wanted
+
+    @staticmethod
+    def _attach_one(connection: Connection, shard: Shard) -> None:
+        """"""
+        if CONFIG.sqlite.immutable:
+            # The main database is then opened as a URI too
+            target = f"file:{shard.path}?immutable=1"
+        else:
+            target = str(shard.path)
+        connection.exec_driver_sql(f"ATTACH DATABASE ? AS {shard.schema}", (target,))
+        for name in _SCHEMA_PRAGMAS:
+            value = CONFIG.sqlite.pragmas.get(name)
+            if value is not None:
+                connection.exec_driver_sql(
+                    f"PRAGMA {shard.schema}.{name} = {int(value)}"
+                )
+
+
+def _data_schema(source: sqlite3.Connection) -> tuple[str, list[str]]:
+    """
+    SQL of the `data` table and of its secondary indexes
+    """
+    table = source.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'data'"
+    ).fetchone()
+    if table is None:
+        raise ValueError("No data table")
+    indexes = [
+        sql
+        for (sql,) in source.execute(
+            "SELECT sql FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = 'data' AND sql IS NOT NULL"
+        )
+    ]
+    return table[0], indexes
+
+
+def split_data(
+    database: sqlite3.Connection, directory: Path, *, span: int = 1
+) -> dict[str, Any]:
+    """
+    Copy `data` of `database` into one new shard per `span` years in `directory`.
+    Each shard is filled by one `INSERT ... SELECT` on the attached file, which
+    scans the table once per shard but keeps every row out of Python. The main
+    database is not modified
+    """
+    table_sql, index_sqls = _data_schema(database)
+    directory.mkdir(parents=True, exist_ok=True)
+    if any(_SHARD_NAME.match(path.name) for path in directory.iterdir()):
+        raise FileExistsError(f"{directory} already holds data shards")
+    (first, last) = database.execute("SELECT MIN(date), MAX(date) FROM data").fetchone()
+    if first is None:
+        raise ValueError("No data rows")
+
+    starts = range(int(first[:4]) // span * span, int(last[:4]) + 1, span)
+    rows = 0
+    for start in starts:
+        shard = Shard(
+            start, start + span - 1, directory / _shard_name(start, start + span - 1)
+        )
+        target = sqlite3.connect(shard.path)
+        try:
+            target.execute(table_sql)
+            target.commit()
+        finally:
+            target.close()
+        database.execute(f"ATTACH DATABASE ? AS {shard.schema}", (str(shard.path),))
+        try:
+            # A new file: nothing to protect if the split fails half-way
+            database.execute(f"PRAGMA {shard.schema}.journal_mode = OFF")
+            database.execute(f"PRAGMA {shard.schema}.synchronous = OFF")
+            cursor = database.execute(
+                f"INSERT INTO {shard.schema}.data "
+                "SELECT * FROM main.data WHERE date >= ? AND date < ?",
+                (shard.first_date.isoformat(), f"{shard.last_year + 1:04d}-01-01"),
+            )
+            rows += cursor.rowcount
+            database.commit()
+        finally:
+            database.execute(f"DETACH DATABASE {shard.schema}")
+        target = sqlite3.connect(shard.path)
+        try:
+            for index_sql in index_sqls:
+                target.execute(index_sql)
+            target.execute("PRAGMA optimize")
+            target.commit()
+        finally:
+            target.close()
+    return {
+        "shards": len(starts),
+        "rows": rows,
+        "span": span,
+        "first_year": starts[0],
+        "last_year": starts[-1] + span - 1,
+    }
+
+
+def merge_shards(database: sqlite3.Connection, shard_set: ShardSet) -> dict[str, Any]:
+    """
+    Copy the rows of every shard back into `data` of `database`, creating the table
+    if it was dropped after the split. Rows already there are replaced
+    """
+    has_data = (
+        database.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data'"
+        ).fetchone()
+        is not None
+    )
+    if has_data:
+        _, index_sqls = _data_schema(database)
+    else:
+        source = sqlite3.connect(shard_set.shards[0].path)
+        try:
+            table_sql, index_sqls = _data_schema(source)
+        finally:
+            source.close()
+        database.execute(table_sql)
+    # Indexes are rebuilt once at the end rather than updated row by row
+    for (name,) in database.execute(
+        "SELECT name FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = 'data' AND sql IS NOT NULL"
+    ).fetchall():
+        database.execute(f'DROP INDEX "{name}"')
+    database.commit()
+    rows = 0
+    try:
+        for shard in shard_set.shards:
+            database.execute(f"ATTACH DATABASE ? AS {shard.schema}", (str(shard.path),))
+            cursor = database.execute(
+                f"INSERT OR REPLACE INTO main.data SELECT * FROM {shard.schema}.data"
+            )
+            rows += cursor.rowcount
+            database.commit()
+            database.execute(f"DETACH DATABASE {shard.schema}")
+    finally:
+        for index_sql in index_sqls:
+            database.execute(index_sql)
+        database.commit()
+    return {"shards": len(shard_set.shards), "rows": rows}
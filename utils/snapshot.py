@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import datetime
+import json
+import math as m
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .distance import haversine, to_unit_vector, top_k
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Any, Optional
+
+    from numpy.typing import NDArray
+    from sqlalchemy.engine.base import Connection
+
+    from utils.region import Region
+
+__all__ = ["FLOAT_COLUMNS", "Snapshot", "export_snapshot"]
+
+SNAPSHOT_VERSION = 3
+# `DataMixin` value columns kept as float32, NaN standing for NULL
+FLOAT_COLUMNS = (
+    "temp",
+    "dewp",
+    "slp",
+    "stp",
+    "visib",
+    "wdsp",
+    "mxspd",
+    "gust",
+    "max",
+    "min",
+    "prcp",
+    "sndp",
+)
+# `frshtt` is kept as int16, -1 standing for NULL
+_FRSHTT_NULL = -1
+_EPOCH = datetime.date(1970, 1, 1)
+# First and last days of stations without rows, so that `first <= last` is false and
+# every day is further than any gap from them
+_NO_FIRST_DAY = 2**30
+_NO_LAST_DAY = -(2**30)
+_FETCH_SIZE = 100_000
+# Same re-ranking margin as `StationIndex`
+_TIE_MARGIN = 1e-9
+
+
+def _to_days(dates: list[Any]) -> NDArray[np.int32]:
+    """"""
+    # SQLite returns ISO strings from the raw DB-API cursor
+    return np.array(dates, dtype="datetime64[D]").astype(np.int32)
+
+
+def export_snapshot(connection: Connection, directory: Path) -> dict[str, Any]:
+    """
+    Write `info` and `data` as memory-mappable `.npy` columns: stations sorted by id,
+    and their rows sorted by date, the rows of station `i` being
+    `offsets[i]:offsets[i + 1]`. Return the metadata also written to `meta.json`
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    stations = connection.exec_driver_sql(
+        "SELECT station_id, name, country, province, latitude, longitude FROM info "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL ORDER BY station_id"
+    ).all()
+    station_ids = np.array([row[0] for row in stations], dtype="S12")
+    latitudes = np.array([row[4] for row in stations], dtype=np.float64)
+    longitudes = np.array([row[5] for row in stations], dtype=np.float64)
+    unit = np.array(
+        [to_unit_vector(row[4], row[5]) for row in stations], dtype=np.float64
+    ).reshape(-1, 3)
+    np.save(directory / "station_id.npy", station_ids)
+    np.save(
+        directory / "station_name.npy",
+        np.array([row[1] or "" for row in stations], dtype=str),
+    )
+    np.save(
+        directory / "station_country.npy",
+        np.array([row[2] or "" for row in stations], dtype=str),
+    )
+    np.save(
+        directory / "station_province.npy",
+        np.array([row[3] or "" for row in stations], dtype=str),
+    )
+    np.save(directory / "station_lat.npy", latitudes)
+    np.save(directory / "station_lon.npy", longitudes)
+    np.save(directory / "station_unit.npy", unit)
+
+    # Rows of stations without coordinates can never be looked up
+    rows_filter = (
+        "FROM data JOIN info ON info.station_id = data.station "
+        "WHERE info.latitude IS NOT NULL AND info.longitude IS NOT NULL"
+    )
+    (row_count,) = connection.exec_driver_sql(f"SELECT COUNT(*) {rows_filter}").one()
+    # Filled chunk by chunk straight into the files, so memory stays flat
+    dates = np.lib.format.open_memmap(
+        directory / "date.npy", mode="w+", dtype=np.int32, shape=(row_count,)
+    )
+    values = {
+        column: np.lib.format.open_memmap(
+            directory / f"{column}.npy",
+            mode="w+",
+            dtype=np.float32,
+            shape=(row_count,),
+        )
+        for column in FLOAT_COLUMNS
+    }
+    frshtt = np.lib.format.open_memmap(
+        directory / "frshtt.npy", mode="w+", dtype=np.int16, shape=(row_count,)
+    )
+    counts = np.zeros(len(stations), dtype=np.int64)
+    # First and last days of every station, of any row and of rows with `wdsp`
+    coverage = np.empty((len(stations), 4), dtype=np.int32)
+    coverage[:, 0::2] = _NO_FIRST_DAY
+    coverage[:, 1::2] = _NO_LAST_DAY
+    result = connection.exec_driver_sql(
+        f"SELECT data.station, data.date, {', '.join(f'data.{c}' for c in FLOAT_COLUMNS)}, "
+        f"data.frshtt {rows_filter} ORDER BY data.station, data.date"
+    )
+    start = 0
+    while chunk := result.fetchmany(_FETCH_SIZE):
+        end = start + len(chunk)
+        columns = list(zip(*chunk))
+        station_index = np.searchsorted(station_ids, np.array(columns[0], dtype="S12"))
+        counts += np.bincount(station_index, minlength=len(stations))
+        dates[start:end] = _to_days(list(columns[1]))
+        wdsp = np.array(columns[2 + FLOAT_COLUMNS.index("wdsp")], dtype=np.float64)
+        _update_coverage(coverage[:, :2], station_index, dates[start:end], slice(None))
+        _update_coverage(
+            coverage[:, 2:], station_index, dates[start:end], ~np.isnan(wdsp)
+        )
+        for i, column in enumerate(FLOAT_COLUMNS, 2):
+            values[column][start:end] = np.array(columns[i], dtype=np.float64)
+        frshtt[start:end] = np.array(
+            [_FRSHTT_NULL if v is None else v for v in columns[-1]], dtype=np.int16
+        )
+        start = end
+    for array in (dates, frshtt, *values.values()):
+        array.flush()
+    offsets = np.zeros(len(stations) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    np.save(directory / "offsets.npy", offsets)
+    np.save(directory / "station_coverage.npy", coverage)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "stations": len(stations),
+        "rows": row_count,
+        "columns": [*FLOAT_COLUMNS, "frshtt"],
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    with (directory / "meta.json").open("wt", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _update_coverage(
+    coverage: NDArray[np.int32],
+    station_index: NDArray[np.intp],
+    days: NDArray[np.int32],
+    rows: Any,
+) -> None:
+    """
+    Widen the (first, last) days of `coverage` with the selected `rows` of a chunk
+    sorted by station and date
+    """
+    station_index, days = station_index[rows], days[rows]
+    if len(days) == 0:
+        return
+    stations, first = np.unique(station_index, return_index=True)
+    last = np.r_[first[1:], len(days)] - 1
+    np.minimum.at(coverage[:, 0], stations, days[first])
+    np.maximum.at(coverage[:, 1], stations, days[last])
+
+
+class Snapshot:
+    """
+    Read-only view of an exported snapshot. Every column is memory-mapped, so opening
+    one copies nothing and worker processes share the same pages
+    """
+
+    directory: Path
+    meta: dict[str, Any]
+    station_ids: NDArray[np.bytes_]
+    station_names: NDArray[np.str_]
+    station_countries: NDArray[np.str_]
+    station_provinces: NDArray[np.str_]
+    latitudes: NDArray[np.float64]
+    longitudes: NDArray[np.float64]
+    unit: NDArray[np.float64]
+    offsets: NDArray[np.int64]
+    coverage: NDArray[np.int32]
+    dates: NDArray[np.int32]
+    values: dict[str, NDArray[np.float32]]
+    frshtt: NDArray[np.int16]
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        with (directory / "meta.json").open("rt", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version in {directory}")
+        self.station_ids = self._load("station_id")
+        self.station_names = self._load("station_name")
+        self.station_countries = self._load("station_country")
+        self.station_provinces = self._load("station_province")
+        self.latitudes = self._load("station_lat")
+        self.longitudes = self._load("station_lon")
+        self.unit = self._load("station_unit")
+        self.offsets = self._load("offsets")
+        self.coverage = self._load("station_coverage")
+        self.dates = self._load("date")
+        self.values = {column: self._load(column) for column in FLOAT_COLUMNS}
+        self.frshtt = self._load("frshtt")
+
+    def _load(self, name: str) -> Any:
+        """"""
+        return np.load(self.directory / f"{name}.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.station_ids)
+
+    def nearest_station(
+        self, lat: float, lon: float, candidates: NDArray[np.intp]
+    ) -> Optional[int]:
+        """
+        Index of the station among `candidates` closest to (lat, lon), ties broken by
+        haversine distance and then station id like `StationIndex.nearest`
+        """
+        if len(candidates) == 0:
+            return None
+        diff = self.unit[candidates] - np.array(to_unit_vector(lat, lon))
+        chord_sq = np.einsum("ij,ij->i", diff, diff)
+        best = chord_sq.min()
+        ties = candidates[chord_sq <= best * (1 + _TIE_MARGIN)]
+        if len(ties) == 1:
+            return int(ties[0])
+        return int(
+            min(
+                ties,
+                key=lambda i: (
+                    haversine(self.latitudes[i], self.longitudes[i], lat, lon),
+                    self.station_ids[i],
+                ),
+            )
+        )
+
+    def nearest_stations(
+        self,
+        lats: NDArray[np.float64],
+        lons: NDArray[np.float64],
+        candidates: NDArray[np.intp],
+        k: int = 1,
+    ) -> NDArray[np.intp]:
+        """
+        The `k` nearest stations among `candidates` of many points at once, N x k,
+        ranked by haversine distance with ties going to the lower station id
+        """
+        nearest, _ = top_k(
+            lats, lons, self.latitudes[candidates], self.longitudes[candidates], k
+        )
+        return candidates[nearest]
+
+    def in_region(self, region: Region) -> NDArray[np.intp]:
+        """
+        Indexes of the stations of `region`, like its `info` filters
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if region.countries:
+            mask &= np.isin(self.station_countries, region.countries)
+        if region.provinces:
+            mask &= np.isin(self.station_provinces, region.provinces)
+        return np.flatnonzero(mask)
+
+    def covered(
+        self,
+        stations: NDArray[np.intp],
+        *,
+        include_null_wdsp: bool = False,
+        date: Optional[datetime.date] = None,
+        max_days_gap: Optional[int] = None,
+    ) -> NDArray[np.intp]:
+        """
+        The `stations` having a usable row and, with `date` and `max_days_gap`, one
+        within `max_days_gap` days of `date`, like the `coverage` table filter
+        """
+        coverage = self.coverage[stations]
+        first, last = (
+            (coverage[:, 0], coverage[:, 1])
+            if include_null_wdsp
+            else (coverage[:, 2], coverage[:, 3])
+        )
+        if date is None or max_days_gap is None:
+            return stations[first <= last]
+        day = (date - _EPOCH).days
+        return stations[(first - day <= max_days_gap) & (day - last <= max_days_gap)]
+
+    def nearest_row(
+        self, station: int, date: datetime.date, *, include_null_wdsp: bool = False
+    ) -> Optional[int]:
+        """
+        Row of `station` closest to `date`, the earlier one on ties, skipping rows
+        without `wdsp` unless `include_null_wdsp`
+        """
+        start, end = int(self.offsets[station]), int(self.offsets[station + 1])
+        dates = self.dates[start:end]
+        wdsp = self.values["wdsp"]
+        day = (date - _EPOCH).days
+        split = start + int(np.searchsorted(dates, day, side="right"))
+        before = split - 1
+        while before >= start and not include_null_wdsp and m.isnan(wdsp[before]):
+            before -= 1
+        after = split
+        while after < end and not include_null_wdsp and m.isnan(wdsp[after]):
+            after += 1
+        if before < start:
+            return None if after >= end else after
+        if after >= end or day - self.dates[before] <= self.dates[after] - day:
+            return before
+        return after
+
+    def get_date(self, row: int) -> datetime.date:
+        """"""
+        return _EPOCH + datetime.timedelta(days=int(self.dates[row]))
+
+    def get_value(self, column: str, row: int) -> Optional[float]:
+        """"""
+        value = self.values[column][row]
+        # The shortest repr of the float32, rather than its widened binary value
+        return None if m.isnan(value) else float(str(value))
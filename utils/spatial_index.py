@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math as m
+from typing import TYPE_CHECKING
+
+from .distance import haversine, to_unit_vector
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from typing import Optional
+
+_Point = tuple[float, float, float, int]
+
+_LEAF_SIZE = 8
+# Chord lengths within this relative margin of the best one are re-ranked by
+# haversine distance, so that rounding never picks a different station than SQL
+_TIE_MARGIN = 1e-9
+
+
+class StationIndex:
+    """
+    Static 3D KD-tree over station unit vectors. The nearest station by chord length
+    is the nearest by great-circle distance, so lookups need no trigonometry beyond
+    converting the query point.
+    """
+
+    __slots__ = ("station_ids", "latitudes", "longitudes", "_points")
+
+    station_ids: list[str]
+    latitudes: list[float]
+    longitudes: list[float]
+    _points: list[_Point]
+
+    def __init__(self, stations: Iterable[tuple[str, float, float]]) -> None:
+        self.station_ids = []
+        self.latitudes = []
+        self.longitudes = []
+        points: list[_Point] = []
+        for i, (station_id, lat, lon) in enumerate(stations):
+            self.station_ids.append(station_id)
+            self.latitudes.append(lat)
+            self.longitudes.append(lon)
+            points.append((*to_unit_vector(lat, lon), i))
+        self._build(points, 0, len(points), 0)
+        self._points = points
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    @classmethod
+    def _build(cls, points: list[_Point], start: int, end: int, depth: int) -> None:
+        """"""
+        if end - start <= _LEAF_SIZE:
+            return
+        axis = depth % 3
+        points[start:end] = sorted(points[start:end], key=lambda p: p[axis])
+        mid = (start + end) // 2
+        cls._build(points, start, mid, depth + 1)
+        cls._build(points, mid + 1, end, depth + 1)
+
+    def nearest(self, lat: float, lon: float) -> Optional[str]:
+        """"""
+        if not self._points:
+            return None
+        query = to_unit_vector(lat, lon)
+        candidates: list[tuple[float, int]] = []
+        best = [m.inf]
+        self._search(query, 0, len(self._points), 0, best, candidates)
+        limit = best[0] * (1 + _TIE_MARGIN)
+        ties = [i for dist_sq, i in candidates if dist_sq <= limit]
+        if len(ties) == 1:
+            return self.station_ids[ties[0]]
+        return self.station_ids[
+            min(
+                ties,
+                key=lambda i: (
+                    haversine(self.latitudes[i], self.longitudes[i], lat, lon),
+                    self.station_ids[i],
+                ),
+            )
+        ]
+
+    def _search(
+        self,
+        query: tuple[float, float, float],
+        start: int,
+        end: int,
+        depth: int,
+        best: list[float],
+        candidates: list[tuple[float, int]],
+    ) -> None:
+        """"""
+        points = self._points
+        qx, qy, qz = query
+        if end - start <= _LEAF_SIZE:
+            for x, y, z, i in points[start:end]:
+                dist_sq = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                if dist_sq <= best[0] * (1 + _TIE_MARGIN):
+                    best[0] = min(best[0], dist_sq)
+                    candidates.append((dist_sq, i))
+            return
+        mid = (start + end) // 2
+        point = points[mid]
+        x, y, z, i = point
+        dist_sq = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+        if dist_sq <= best[0] * (1 + _TIE_MARGIN):
+            best[0] = min(best[0], dist_sq)
+            candidates.append((dist_sq, i))
+        axis = depth % 3
+        diff = query[axis] - point[axis]
+        near, far = (
+            ((start, mid), (mid + 1, end))
+            if diff < 0
+            else ((mid + 1, end), (start, mid))
+        )
+        self._search(query, *near, depth + 1, best, candidates)
+        if diff * diff <= best[0] * (1 + _TIE_MARGIN):
+            self._search(query, *far, depth + 1, best, candidates)